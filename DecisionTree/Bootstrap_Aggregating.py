@@ -3,6 +3,8 @@ if __name__ == "__main__":
 
 from collections import defaultdict
 from .Ruleset import Ruleset
+from .CompiledTree import as_array
+import numpy as np
 import pickle
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
@@ -51,6 +53,31 @@ class Bagging:
         winner = max(votes.items(), key=lambda x: x[1])
         return winner[0], winner[1] / len(self.classifiers)  # Return the prediction and average confidence.
 
+    def predict_batch(self, X):
+        """
+        Makes a prediction for every row, combining the classifiers as predict does.
+
+        :param X: Rows laid out like the training data.
+        :return: Array of predictions and array of average confidences.
+        """
+        # Every classifier predicts all the rows at once, the votes are then combined row by row.
+        results = [clf.predict_batch(X) for clf in self.classifiers]
+        results = [(predictions.tolist(), accuracies.tolist()) for predictions, accuracies in results]
+        predictions, confidences = [], []
+        for i in range(len(X)):
+            votes = defaultdict(float)
+            for preds, accs in results:
+                if preds[i]:
+                    votes[preds[i]] += accs[i]
+            if not votes:
+                predictions.append(self.default)
+                confidences.append(0.0)
+                continue
+            winner = max(votes.items(), key=lambda x: x[1])
+            predictions.append(winner[0])
+            confidences.append(winner[1] / len(self.classifiers))
+        return as_array(predictions), np.array(confidences, dtype=float)
+
     def get_train_metrics(self):
         """
         Calculates and returns the training metrics for each classifier.
@@ -60,7 +87,7 @@ class Bagging:
         metrics = []
         for clf in self.classifiers:
             y_true = [row[-1] for row in self.data]
-            y_pred = [clf.predict(row)[0] for row in self.data]
+            y_pred = clf.predict_batch(self.data)[0].tolist()
             accuracy = accuracy_score(y_true, y_pred)
             precision = precision_score(y_true, y_pred, average='weighted', zero_division=0)
             recall = recall_score(y_true, y_pred, average='weighted', zero_division=0)
@@ -0,0 +1,116 @@
+if __name__ == "__main__":
+    raise Exception("This script is not meant to be run directly")
+
+import numpy as np
+
+GREATER_EQUAL, EQUAL = 0, 1  # Tests of an internal node
+
+
+def as_array(values):
+    """
+    Convert values to an array, keeping them as Python objects unless they are all numbers.
+    - values: List of values.
+    """
+    array = np.asarray(values)
+    if array.dtype.kind not in 'biuf':
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+    return array
+
+
+def as_matrix(rows):
+    """
+    Convert rows to a 2-D array, keeping them as Python objects unless they are all numbers.
+    - rows: List of rows, or an array.
+    """
+    X = np.asarray(rows)
+    if X.dtype.kind not in 'biuf':
+        X = np.empty((len(rows), len(rows[0]) if len(rows) else 0), dtype=object)
+        X[:] = rows
+    return X
+
+
+class CompiledTree:
+    def __init__(self, tree, attributes, default):
+        """
+        Flatten a trained ID3 tree into arrays for batch prediction.
+        Every internal node becomes a binary test of one attribute: 'value >= threshold'
+        for a continuous node, and a chain of 'value == branch value' tests for a
+        discrete one, the last test falling through to the default.
+        - tree: The nested dict tree of an ID3Tree.
+        - attributes: List of attribute names, in column order.
+        - default: Prediction for a value that has no branch.
+        """
+        self.source = tree  # The tree this was compiled from
+        index = {attr: i for i, attr in enumerate(attributes)}
+        feature, threshold, op, yes, no, leaf = [], [], [], [], [], []
+        classes, codes = [], {}
+
+        def slot():
+            feature.append(-1)
+            threshold.append(0)
+            op.append(GREATER_EQUAL)
+            yes.append(-1)
+            no.append(-1)
+            leaf.append(-1)
+            return len(feature) - 1
+
+        pending = [(slot(), tree)]
+        while pending:
+            at, subtree = pending.pop()
+            if not isinstance(subtree, dict):
+                # Leaf: the index of its class
+                if subtree not in codes:
+                    codes[subtree] = len(classes)
+                    classes.append(subtree)
+                leaf[at] = codes[subtree]
+                continue
+            node, branches = next(iter(subtree.items()))
+            column = index[node.attribute]
+            if node.threshold is not None:
+                feature[at], threshold[at], op[at] = column, node.threshold, GREATER_EQUAL
+                yes[at], no[at] = slot(), slot()
+                pending.append((yes[at], branches['>=']))
+                pending.append((no[at], branches['<']))
+                continue
+            items = list(branches.items())
+            if not items:
+                pending.append((at, default))
+                continue
+            for i, (value, child) in enumerate(items):
+                feature[at], threshold[at], op[at] = column, value, EQUAL
+                yes[at], no[at] = slot(), slot()
+                pending.append((yes[at], child))
+                if i == len(items) - 1:
+                    pending.append((no[at], default))
+                at = no[at]
+
+        self.feature = np.array(feature, dtype=np.intp)
+        self.threshold = as_array(threshold)
+        self.op = np.array(op, dtype=np.int8)
+        self.yes = np.array(yes, dtype=np.intp)
+        self.no = np.array(no, dtype=np.intp)
+        self.leaf = np.array(leaf, dtype=np.intp)
+        self.classes = as_array(classes)
+
+    def predict_batch(self, X):
+        """
+        Predict the class of every row.
+        All the rows start at the root and every step moves the rows still at
+        an internal node one level down, so each step is a few array operations.
+        - X: Rows laid out like the training data; columns after the attributes, such as the class, are ignored.
+        """
+        X = as_matrix(X)
+        node = np.zeros(len(X), dtype=np.intp)
+        active = np.flatnonzero(self.feature[node] >= 0)
+        while active.size:
+            current = node[active]
+            values = X[active, self.feature[current]]
+            thresholds = self.threshold[current]
+            ge = self.op[current] == GREATER_EQUAL
+            passed = np.empty(len(active), dtype=bool)
+            passed[ge] = values[ge] >= thresholds[ge]
+            passed[~ge] = values[~ge] == thresholds[~ge]
+            node[active] = np.where(passed, self.yes[current], self.no[current])
+            active = active[self.feature[node[active]] >= 0]
+        return self.classes[self.leaf[node]]
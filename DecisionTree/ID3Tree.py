@@ -2,12 +2,29 @@ if __name__ == "__main__":
     raise Exception("This script is not meant to be run directly")
 
 import math
+from bisect import bisect_left
 from collections import Counter
+from operator import itemgetter
 from .Rule import Rule  
 from .Node import Node  
+from .CompiledTree import CompiledTree
 import pickle  
+import numpy as np
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
+GAIN_BLOCK = 1 << 14  # Largest (rows x attributes) block scored at once by columnar_gains
+GAIN_TOLERANCE = 1e-9  # Attributes this close to the best approximate gain are scored exactly
+
+
+def plogp(p):
+    """
+    Return p * log2(p) elementwise, 0 where p is 0.
+    """
+    out = np.zeros_like(p, dtype=float)
+    np.log2(p, out=out, where=p > 0)
+    return p * out
+
+
 class ID3Tree:
     def __init__(self, attributes, data, default, type_map):
         """
@@ -22,6 +39,7 @@ class ID3Tree:
         self.default = default
         self.type_map = type_map
         self.tree = None  # Placeholder for the trained decision tree
+        self.compiled = None  # Flat-array form of the tree, built by compile
 
     def entropy(self, labels):
         """
@@ -32,12 +50,57 @@ class ID3Tree:
         counter = Counter(labels)  # Count occurrences of each label
         return -sum((count / total) * math.log2(count / total) for count in counter.values())
 
+    def entropy_counts(self, counts, total):
+        """
+        Calculate the entropy of a set of labels from its class counts.
+        - counts: Number of labels of each class present.
+        - total: Number of labels.
+        """
+        return -sum((count / total) * math.log2(count / total) for count in counts)
+
     def train(self):
         """
         Train the decision tree using the ID3 algorithm.
+        Numeric data is trained column-wise on a NumPy array (see id3_train_columnar),
+        data with non-numeric attribute values on the rows themselves.
+        """
+        columns = self.to_columns(self.data)
+        if columns is None:
+            self.tree = self.id3_train(self.data, self.attributes)
+        else:
+            X, y = columns
+            index = {attr: i for i, attr in enumerate(self.attributes)}
+            rows = np.arange(len(self.data), dtype=np.min_scalar_type(len(self.data)))
+            self.tree = self.id3_train_columnar(X, y, rows, self.attributes, index)
+
+    def to_columns(self, data):
+        """
+        Convert the data to an attribute matrix and label codes, or None if an attribute value is not a number.
+        Integer attributes are stored in the smallest integer type holding them all.
+        - data: Training data (list of lists).
         """
-            
-        self.tree = self.id3_train(self.data, self.attributes)
+        if not data or len(set(map(len, data))) != 1:
+            return None
+        columns = []
+        for i in range(len(data[0]) - 1):
+            column = np.asarray(list(map(itemgetter(i), data)))
+            if column.dtype.kind not in 'biuf':
+                return None
+            if column.dtype.kind in 'biu':
+                column = column.astype(np.result_type(np.min_scalar_type(column.min()),
+                                                      np.min_scalar_type(column.max())))
+            columns.append(column)
+        dtype = np.result_type(*columns)
+        if dtype.kind in 'biu':
+            low, high = min(c.min() for c in columns), max(c.max() for c in columns)
+            dtype = next(t for t in (np.int8, np.int16, np.int32, np.int64)
+                         if np.iinfo(t).min <= low and high <= np.iinfo(t).max)
+        X = np.empty((len(data), len(columns)), dtype=dtype)
+        for i, column in enumerate(columns):
+            X[:, i] = column
+        codes = {}
+        y = np.fromiter((codes.setdefault(row[-1], len(codes)) for row in data), dtype=np.intp, count=len(data))
+        return X, y.astype(np.min_scalar_type(len(codes)))
 
     def majority_class(self, data):
         from collections import Counter
@@ -77,8 +140,9 @@ class ID3Tree:
                 # Fallback: retorna o valor majoritário da classe
                 return self.majority_class(data)
             node = Node(best_attr, threshold, best_gain[0], n_samples=n_samples)
-            above = [row for row in data if row[self.attributes.index(best_attr)] >= threshold]
-            below = [row for row in data if row[self.attributes.index(best_attr)] < threshold]
+            index = self.attributes.index(best_attr)
+            above = [row for row in data if row[index] >= threshold]
+            below = [row for row in data if row[index] < threshold]
             return {node: {
                 '>=': self.id3_train(above, attributes),
                 '<': self.id3_train(below, attributes)
@@ -95,29 +159,271 @@ class ID3Tree:
             }}
 
 
+    def id3_train_columnar(self, X, y, rows, attributes, index):
+        """
+        Recursively build the decision tree like id3_train, on a NumPy array.
+        Nodes hold the indices of their rows instead of copies of them. Attributes
+        with a single value at the node are scored without looking at the labels,
+        the gains of the others are approximated at once by columnar_gains, then
+        the attributes close to the best one are scored exactly on their column by
+        id3_discrete_column or id3_continuous_column, so the tree is the same as
+        id3_train's.
+        - X: Attribute values, one row per training row.
+        - y: Label codes of the training rows.
+        - rows: Indices of the rows reaching the node.
+        - attributes: List of attributes to consider.
+        - index: Column of each attribute in X.
+        """
+        if len(rows) == 0:
+            return self.default
+        labels = y[rows]
+        if labels.min() == labels.max():
+            return self.data[rows[0]][-1]
+
+        # An attribute with one value at the node has a known exact score: no gain for a
+        # discrete one, which entropy() computes as exactly 0, and no split for a continuous one
+        block = X[rows]
+        constant = dict(zip(self.attributes, (block.min(axis=0) == block.max(axis=0)).tolist()))
+        del block
+        exact = {attr: 0.0 if self.type_map[attr] == 'discrete' else -1 for attr in attributes if constant[attr]}
+        discrete = [attr for attr in attributes if self.type_map[attr] == 'discrete' and not constant[attr]]
+        continuous = [attr for attr in attributes if self.type_map[attr] != 'discrete' and not constant[attr]]
+        approx = dict(zip(continuous, self.columnar_gains(X, labels, rows, [index[a] for a in continuous])))
+        approx.update(zip(discrete, self.columnar_gains(X, labels, rows, [index[a] for a in discrete],
+                                                        discrete=True)))
+        top = max(list(approx.values()) + list(exact.values()), default=-1)
+        labels = labels.tolist()
+        scores = []
+        for attr in attributes:
+            if attr in exact:
+                scores.append(((exact[attr], None), attr))
+            elif approx[attr] >= top - GAIN_TOLERANCE:
+                column = X[rows, index[attr]].tolist()
+                if self.type_map[attr] == 'discrete':
+                    scores.append((self.id3_discrete_column(column, labels), attr))
+                else:
+                    scores.append((self.id3_continuous_column(column, labels), attr))
+            else:
+                scores.append(((approx[attr], None), attr))
+        del labels
+        best_gain, best_attr = max(scores, key=lambda x: x[0][0])
+
+        n_samples = len(rows)
+        idx = index[best_attr]
+        column = X[rows, idx]
+
+        if self.type_map[best_attr] == 'continuous':
+            threshold = best_gain[1]
+            if threshold is None:
+                # Fallback: retorna o valor majoritário da classe
+                return self.majority_class([self.data[i] for i in rows.tolist()])
+            node = Node(best_attr, threshold, best_gain[0], n_samples=n_samples)
+            above, below = rows[column >= threshold], rows[column < threshold]
+            del column, rows
+            return {node: {
+                '>=': self.id3_train_columnar(X, y, above, attributes, index),
+                '<': self.id3_train_columnar(X, y, below, attributes, index)
+            }}
+        else:
+            # Branch values as they appear in the data, taken from the first row holding each
+            first = np.unique(column, return_index=True)[1]
+            values = set(self.data[i][idx] for i in rows[np.sort(first)].tolist())
+            subsets = {val: rows[column == val] for val in values}
+            del column, rows
+            node = Node(best_attr, None, best_gain[0], n_samples=n_samples)
+            return {node: {
+                val: self.id3_train_columnar(
+                    X, y, subsets.pop(val),
+                    [a for a in attributes if a != best_attr], index
+                ) for val in list(subsets)
+            }}
+
+    def columnar_gains(self, X, labels, rows, columns, discrete=False):
+        """
+        Approximate the information gain of each attribute, -1 where a continuous one has no split.
+        The columns are scored a block at a time with array operations: discrete
+        attributes by discrete_gains, continuous ones by binned_gains for integers
+        of a small range and by sorted_gains otherwise.
+        - X: Attribute values of all training rows.
+        - labels: Label codes of the rows.
+        - rows: Indices of the rows in X.
+        - columns: Columns of X to score.
+        - discrete: True to score the columns as discrete attributes.
+        """
+        m = len(rows)
+        gains = np.full(len(columns), -1.0)
+        if not columns or (m < 2 and not discrete):
+            return gains
+        totals = np.bincount(labels)
+        classes = np.flatnonzero(totals)
+        totals = totals[classes]
+        codes = np.searchsorted(classes, labels)  # Labels numbered among the classes present
+        base_entropy = -plogp(totals / m).sum()
+        step = max(1, GAIN_BLOCK // (m * len(classes)))
+        for start in range(0, len(columns), step):
+            block = X[np.ix_(rows, columns[start:start + step])]
+            bins = span = None
+            if block.dtype.kind in 'iu':
+                low, high = int(block.min()), int(block.max())
+                if (high - low + 1) * block.shape[1] * len(classes) <= GAIN_BLOCK:
+                    bins, span = block.astype(np.intp) - low, high - low + 1
+            if discrete:
+                if bins is None:
+                    # Values numbered among those present in each column
+                    bins = np.empty(block.shape, dtype=np.intp)
+                    for j in range(block.shape[1]):
+                        bins[:, j] = np.unique(block[:, j], return_inverse=True)[1].ravel()
+                    span = int(bins.max()) + 1
+                gains[start:start + step] = self.discrete_gains(bins, span, codes, totals, base_entropy)
+            elif bins is not None:
+                gains[start:start + step] = self.binned_gains(bins, span, codes, totals, base_entropy)
+            else:
+                gains[start:start + step] = self.sorted_gains(block, codes, totals, base_entropy)
+        return gains
+
+    def value_table(self, bins, span, codes, k):
+        """
+        Return the rows of every (column, value, class) as a (columns x values x classes) array.
+        - bins: Attribute values, from 0 to span - 1, one column per attribute.
+        - span: Number of possible values.
+        - codes: Class of each row, from 0 to k - 1.
+        - k: Number of classes.
+        """
+        n_columns = bins.shape[1]
+        keys = (np.arange(n_columns) * span + bins) * k + codes[:, None]
+        return np.bincount(keys.ravel(), minlength=n_columns * span * k).reshape(n_columns, span, k)
+
+    def discrete_gains(self, bins, span, codes, totals, base_entropy):
+        """
+        Information gain of each column of small non-negative integers split on every value.
+        - bins: Attribute values, from 0 to span - 1, one column per attribute.
+        - span: Number of possible values.
+        - codes: Class of each row, numbered among the classes present.
+        - totals: Rows of each class.
+        - base_entropy: Entropy of all the rows.
+        """
+        table = self.value_table(bins, span, codes, len(totals))
+        n_value = table.sum(axis=2)
+        h_value = -plogp(table / np.maximum(n_value, 1)[..., None]).sum(axis=2)
+        return base_entropy - (n_value / len(bins) * h_value).sum(axis=1)
+
+    def binned_gains(self, bins, span, codes, totals, base_entropy):
+        """
+        Best information gain of each column of small non-negative integers, -1 where no split is possible.
+        One bincount gives the rows of every (column, value, class), and running
+        sums over the values give the class counts below every threshold.
+        - bins: Attribute values, from 0 to span - 1, one column per attribute.
+        - span: Number of possible values.
+        - codes: Class of each row, numbered among the classes present.
+        - totals: Rows of each class.
+        - base_entropy: Entropy of all the rows.
+        """
+        m = len(bins)
+        table = self.value_table(bins, span, codes, len(totals))
+        below = np.cumsum(table, axis=1)[:, :-1]  # Rows of each class at or below every value
+        n_below = below.sum(axis=2)
+        n_above = m - n_below
+        # A threshold follows every value present, except the last one
+        valid = (table[:, :-1].sum(axis=2) > 0) & (n_above > 0)
+        h_below = -plogp(below / np.maximum(n_below, 1)[..., None]).sum(axis=2)
+        h_above = -plogp((totals - below) / np.maximum(n_above, 1)[..., None]).sum(axis=2)
+        gain = base_entropy - (n_above / m) * h_above - (n_below / m) * h_below
+        gain[~valid] = -np.inf
+        best = gain.max(axis=1, initial=-np.inf)
+        return np.where(np.isfinite(best), best, -1.0)
+
+    def sorted_gains(self, block, codes, totals, base_entropy):
+        """
+        Best information gain of each column, -1 where no split is possible.
+        Every column is sorted, and the class counts below each split position
+        are running sums of the sorted labels.
+        - block: Attribute values, one column per attribute.
+        - codes: Class of each row, numbered among the classes present.
+        - totals: Rows of each class.
+        - base_entropy: Entropy of all the rows.
+        """
+        m = len(block)
+        order = np.argsort(block, axis=0, kind='stable')
+        block = np.take_along_axis(block, order, axis=0)
+        boundary = block[1:] != block[:-1]  # Split positions between two different values
+        del block
+        n_below = np.arange(1, m)[:, None]
+        n_above = m - n_below
+        # Class counts below every split position, (positions x attributes x classes)
+        below = np.cumsum(codes[order[:-1]][..., None] == np.arange(len(totals)), axis=0)
+        del order
+        h_below = -plogp(below / n_below[..., None]).sum(axis=2)
+        h_above = -plogp((totals - below) / n_above[..., None]).sum(axis=2)
+        gain = base_entropy - (n_above / m) * h_above - (n_below / m) * h_below
+        gain[~boundary] = -np.inf
+        best = gain.max(axis=0)
+        return np.where(np.isfinite(best), best, -1.0)
+
     def id3_continuous(self, data, attribute):
         """
         Calculate the information gain for a continuous attribute.
+        The data is scanned once to count the rows of each class per attribute
+        value, then the thresholds are swept in increasing order keeping running
+        class counts below them, instead of splitting the data again for every
+        threshold.
         - data: Training data.
         - attribute: The attribute to evaluate.
         """
         idx = self.attributes.index(attribute)
-        values = sorted(set(row[idx] for row in data))  # Unique sorted values of the attribute
+        return self.id3_continuous_column(list(map(itemgetter(idx), data)), list(map(itemgetter(-1), data)))
+
+    def id3_continuous_column(self, column, labels):
+        """
+        Calculate the information gain for a continuous attribute from its values, as id3_continuous does.
+        - column: Value of the attribute in every row.
+        - labels: Class label of every row.
+        """
+        values = sorted(set(column))  # Unique sorted values of the attribute
         if len(values) == 1:
             return -1, None  # No split possible if only one unique value
 
+        # Rows of each (value, class) pair, ranked by the first row of the pair in data
+        per_value = {v: [] for v in values}
+        for rank, ((v, label), count) in enumerate(Counter(zip(column, labels)).items()):
+            per_value[v].append((label, count, rank))
+
+        # The entropies sum their terms in order of the first row of each class,
+        # as entropy() does on the split lists, so the gains come out the same
+        total = len(column)
+        totals, first = {}, {}
+        above_first = []  # First rank of each class at or above every value
+        for v in reversed(values):
+            for label, count, rank in per_value[v]:
+                totals[label] = totals.get(label, 0) + count
+                if rank < first.get(label, rank + 1):
+                    first[label] = rank
+            above_first.append(dict(first))
+        above_first.reverse()
+        base_entropy = self.entropy_counts([totals[c] for c in sorted(first, key=first.get)], total)
+
         # Calculate potential thresholds
         thresholds = [(values[i] + values[i + 1]) / 2 for i in range(len(values) - 1)]
-        base_entropy = self.entropy([row[-1] for row in data])  # Entropy of the entire dataset
+        below, below_first = {}, {}
+        n_below = moved = 0
 
         best_gain, best_thresh = -1, None
         for t in thresholds:
-            # Split data into above and below threshold
-            above = [row for row in data if row[idx] >= t]
-            below = [row for row in data if row[idx] < t]
-            p, n = len(above) / len(data), len(below) / len(data)
+            split = bisect_left(values, t)  # Values below the threshold
+            while moved < split:
+                for label, count, rank in per_value[values[moved]]:
+                    below[label] = below.get(label, 0) + count
+                    if rank < below_first.get(label, rank + 1):
+                        below_first[label] = rank
+                    n_below += count
+                moved += 1
+            n_above = total - n_below
+            p, n = n_above / total, n_below / total
+            classes_above = sorted(above_first[split], key=above_first[split].get)
+            classes_below = sorted(below_first, key=below_first.get)
             # Calculate information gain
-            gain = base_entropy - p * self.entropy([r[-1] for r in above]) - n * self.entropy([r[-1] for r in below])
+            gain = (base_entropy
+                    - p * self.entropy_counts([totals[c] - below.get(c, 0) for c in classes_above], n_above)
+                    - n * self.entropy_counts([below[c] for c in classes_below], n_below))
             if gain > best_gain:
                 best_gain, best_thresh = gain, t
         return best_gain, best_thresh
@@ -129,14 +435,30 @@ class ID3Tree:
         - attribute: The attribute to evaluate.
         """
         idx = self.attributes.index(attribute)
-        base_entropy = self.entropy([row[-1] for row in data])  # Entropy of the entire dataset
-        values = set(row[idx] for row in data)  # Unique values of the attribute
+        return self.id3_discrete_column(list(map(itemgetter(idx), data)), list(map(itemgetter(-1), data)))
+
+    def id3_discrete_column(self, column, labels):
+        """
+        Calculate the information gain for a discrete attribute from its values.
+        The rows of each (value, class) pair are counted in one pass instead of
+        splitting the data for every value; the entropy terms are summed in the
+        order entropy() would sum them on the subsets, so the gain is the same.
+        - column: Value of the attribute in every row.
+        - labels: Class label of every row.
+        """
+        base_entropy = self.entropy(labels)  # Entropy of the entire dataset
+        values = set(column)  # Unique values of the attribute
+
+        # Rows of each class per value, in order of the first row of the class among the value's rows
+        per_value = {}
+        for (val, _), count in Counter(zip(column, labels)).items():
+            per_value.setdefault(val, []).append(count)
 
         remainder = 0
         for val in values:
             # Subset of data where the attribute equals the current value
-            subset = [row for row in data if row[idx] == val]
-            remainder += (len(subset) / len(data)) * self.entropy([row[-1] for row in subset])
+            size = sum(per_value[val])
+            remainder += (size / len(column)) * self.entropy_counts(per_value[val], size)
 
         return base_entropy - remainder, None
 
@@ -162,29 +484,31 @@ class ID3Tree:
                     rules.append(Rule(self.attributes, new_premise, subtree))
         return rules
     
-    def get_train_metrics(self):
+    def compile(self):
         """
-        Get training metrics such as accuracy, precision, recall, and F1 score on the training data.
+        Flatten the trained tree into arrays for predict_batch (see CompiledTree).
         """
+        if self.tree is None:
+            raise ValueError("O modelo ainda não foi treinado.")
+        self.compiled = CompiledTree(self.tree, self.attributes, self.default)
+        return self.compiled
 
-        def predict_single(row):
-            node = self.tree
-            while isinstance(node, dict):
-                n = next(iter(node))
-                branches = node[n]
-                attr_idx = self.attributes.index(n.attribute)
-                if n.threshold is not None:
-                    if row[attr_idx] >= n.threshold:
-                        node = branches['>=']
-                    else:
-                        node = branches['<']
-                else:
-                    val = row[attr_idx]
-                    node = branches.get(val, self.default)
-            return node
+    def predict_batch(self, X):
+        """
+        Predict the class of every row with the compiled tree, compiling it first if needed.
+        - X: Rows laid out like the training data; columns after the attributes, such as the class, are ignored.
+        """
+        compiled = getattr(self, 'compiled', None)  # Models saved before compile have none
+        if compiled is None or compiled.source is not self.tree:
+            compiled = self.compile()
+        return compiled.predict_batch(X)
 
+    def get_train_metrics(self):
+        """
+        Get training metrics such as accuracy, precision, recall, and F1 score on the training data.
+        """
         y_true = [row[-1] for row in self.data]
-        y_pred = [predict_single(row) for row in self.data]
+        y_pred = self.predict_batch(self.data).tolist()
 
         metrics = {
             'accuracy': accuracy_score(y_true, y_pred),
@@ -7,11 +7,20 @@ class Rule:
         self.premises = premises or [] # List of premises (conditions) for the rule, each as (attribute, operator, value)
         self.conclusion = conclusion # The conclusion (predicted class or value) if all premises are satisfied
         self._accuracy = None # Cached accuracy value
+        self._index = None # Cached position of each attribute
+
+    def attribute_index(self):
+        # Map each attribute to its position, built once (rules saved before it was cached have none)
+        index = getattr(self, '_index', None)
+        if index is None:
+            index = self._index = {attr: i for i, attr in enumerate(self.attributes)}
+        return index
 
     def predict(self, test):
         # Check if the test instance satisfies all premises
+        index = self.attribute_index()
         for attr, op, value in self.premises:
-            idx = self.attributes.index(attr)  # Find the index of the attribute
+            idx = index[attr]  # Find the index of the attribute
             # Evaluate the condition based on the operator
             if op == '>=' and not test[idx] >= value:
                 return None  # Premise not satisfied
@@ -0,0 +1,158 @@
+if __name__ == "__main__":
+    raise Exception("This script is not meant to be run directly")
+
+from bisect import bisect_right
+import numpy as np
+from .CompiledTree import as_matrix
+
+BATCH_ROWS = 4096  # Rows matched at once by first_match_batch
+# Position of the lowest bit set in every byte
+LOWEST_BIT = np.array([(v & -v).bit_length() - 1 if v else 0 for v in range(256)], dtype=np.intp)
+
+
+class RuleIndex:
+    def __init__(self, rules, attributes):
+        """
+        Index an ordered list of rules for first-match prediction.
+        The premises are grouped by attribute. For every attribute the index holds,
+        as bitsets with one bit per rule, the rules whose premises on it pass for
+        each possible value: looked up by value for '=' premises, and by position
+        among the sorted thresholds for '>=' and '<' premises. A prediction ANDs the
+        bitsets of the row's values and takes the lowest bit left, the first rule
+        in order whose premises all hold.
+        - rules: List of rules, in the order they are tried.
+        - attributes: List of attribute names, in column order.
+        """
+        self.rules = rules
+        index = {attr: i for i, attr in enumerate(attributes)}
+        # A rule concluding None never predicts anything, as in Rule.predict
+        self.everything = sum(1 << i for i, rule in enumerate(rules) if rule.conclusion is not None)
+        self.premises = []  # Premises of each rule as (column, operator, value)
+        equal, at_least, below = {}, {}, {}
+        used = {}  # Rules with a premise on each attribute
+        never = {}  # Rules with '=' premises on an attribute that no single value passes
+        for i, rule in enumerate(rules):
+            premises = [(index[attr], op, value) for attr, op, value in rule.premises
+                        if op in ('=', '>=', '<')]
+            self.premises.append(premises)
+            required = {}  # Value of each attribute the rule's '=' premises ask for
+            for column, op, value in premises:
+                group = {'=': equal, '>=': at_least, '<': below}[op].setdefault(column, {})
+                group[value] = group.get(value, 0) | 1 << i
+                used[column] = used.get(column, 0) | 1 << i
+                if op == '=' and required.setdefault(column, value) != value:
+                    never[column] = never.get(column, 0) | 1 << i
+
+        self.columns = []
+        # Attributes with the most rules first, so misses are found sooner
+        for column in sorted(used, key=lambda c: -bin(used[c]).count('1')):
+            # Rules passing on a value with no '=' premise: those without one on this attribute
+            values = equal.get(column, {})
+            constrained = 0
+            for bits in values.values():
+                constrained |= bits
+            free = self.everything & ~constrained
+            passing = {value: (free | bits) & ~never.get(column, 0) for value, bits in values.items()}
+            # '>=' fails for the thresholds above the value, '<' for those up to it
+            ge_thresholds, ge_passing = self.threshold_bitsets(at_least.get(column, {}), suffix=True)
+            lt_thresholds, lt_passing = self.threshold_bitsets(below.get(column, {}), suffix=False)
+            self.columns.append((column, passing if values else None, free, ge_thresholds, ge_passing,
+                                 lt_thresholds, lt_passing))
+
+    def threshold_bitsets(self, thresholds, suffix):
+        """
+        Return the sorted thresholds and the bitset of the rules passing at each position among them.
+        - thresholds: The bitset of the rules using each threshold.
+        - suffix: True for '>=' premises, failing for the thresholds above the value;
+          False for '<' premises, failing for the thresholds up to the value.
+        """
+        ordered = sorted(thresholds)
+        failing = [0] * (len(ordered) + 1)
+        if suffix:
+            for i in range(len(ordered) - 1, -1, -1):
+                failing[i] = failing[i + 1] | thresholds[ordered[i]]
+        else:
+            for i, value in enumerate(ordered):
+                failing[i + 1] = failing[i] | thresholds[value]
+        return ordered, [self.everything & ~bits for bits in failing]
+
+    def first_match(self, row):
+        """
+        Return the position of the first rule whose premises all hold for the row, -1 if none does.
+        - row: The test instance.
+        """
+        alive = self.everything
+        for column, passing, free, ge_thresholds, ge_passing, lt_thresholds, lt_passing in self.columns:
+            value = row[column]
+            if passing is not None:
+                alive &= passing.get(value, free)
+            if ge_thresholds:
+                alive &= ge_passing[bisect_right(ge_thresholds, value)]
+            if lt_thresholds:
+                alive &= lt_passing[bisect_right(lt_thresholds, value)]
+            if not alive:
+                return -1
+        return (alive & -alive).bit_length() - 1
+
+    def first_match_batch(self, X):
+        """
+        Return the position of the first matching rule for every row, -1 where none does.
+        The bitsets are packed into byte arrays, one row per value or threshold
+        position, so a block of rows is matched with a lookup and an AND per
+        attribute. Rows or premises that are not numbers are matched one by one.
+        - X: Rows laid out like the training data.
+        """
+        X = as_matrix(X)
+        tables = self.packed_tables()
+        if X.dtype == object or tables is None:
+            return np.array([self.first_match(row) for row in X], dtype=np.intp)
+        everything, tables = tables
+        matches = np.empty(len(X), dtype=np.intp)
+        for start in range(0, len(X), BATCH_ROWS):
+            block = X[start:start + BATCH_ROWS]
+            alive = np.repeat(everything[None], len(block), axis=0)
+            for column, keys, passing, ge_thresholds, ge_passing, lt_thresholds, lt_passing in tables:
+                values = block[:, column]
+                if keys is not None:
+                    found = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+                    alive &= passing[np.where(keys[found] == values, found, len(keys))]
+                if ge_thresholds is not None:
+                    alive &= ge_passing[np.searchsorted(ge_thresholds, values, side='right')]
+                if lt_thresholds is not None:
+                    alive &= lt_passing[np.searchsorted(lt_thresholds, values, side='right')]
+            # The lowest bit set is the first rule matching
+            nonzero = alive != 0
+            first = nonzero.argmax(axis=1)
+            lowest = LOWEST_BIT[alive[np.arange(len(block)), first]]
+            matches[start:start + len(block)] = np.where(nonzero.any(axis=1), first * 8 + lowest, -1)
+        return matches
+
+    def packed_tables(self):
+        """
+        Return the bitsets of the index packed into byte arrays, None if a premise value is not a number.
+        """
+        if getattr(self, '_packed', None) is None:
+            size = (len(self.rules) + 7) // 8 or 1
+
+            def pack(bitsets):
+                return np.frombuffer(b''.join(bits.to_bytes(size, 'little') for bits in bitsets),
+                                     dtype=np.uint8).reshape(len(bitsets), size)
+
+            def numbers(values):
+                array = np.asarray(values)
+                return array if array.dtype.kind in 'biuf' else None
+
+            tables = []
+            for column, passing, free, ge_thresholds, ge_passing, lt_thresholds, lt_passing in self.columns:
+                keys = numbers(sorted(passing)) if passing is not None else None
+                ge = numbers(ge_thresholds) if ge_thresholds else None
+                lt = numbers(lt_thresholds) if lt_thresholds else None
+                if (passing is not None and keys is None) or (ge_thresholds and ge is None) \
+                        or (lt_thresholds and lt is None):
+                    self._packed = False
+                    return None
+                tables.append((column, keys, pack([passing[k] for k in keys.tolist()] + [free]) if keys is not None
+                               else None, ge, pack(ge_passing) if ge is not None else None,
+                               lt, pack(lt_passing) if lt is not None else None))
+            self._packed = (pack([self.everything])[0], tables)
+        return self._packed or None
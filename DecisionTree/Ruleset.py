@@ -3,6 +3,9 @@ if __name__ == "__main__":
 
 import random
 from .ID3Tree import ID3Tree
+from .RuleIndex import RuleIndex
+from .CompiledTree import as_array
+import numpy as np
 import pickle
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
@@ -16,6 +19,7 @@ class Ruleset:
         self.default = default
         self.type_map = type_map
         self.rules = []
+        self.rule_index = None  # Index of the rules for prediction, built by compile
         random.shuffle(data)  # Shuffle data for randomness
         split = int(len(data) * 0.67)  # Use 67% for training, rest for pruning
         self.train_data = data[:split]
@@ -33,6 +37,7 @@ class Ruleset:
         for rule in self.rules:
             rule.accuracy(self.train_data)  # Calculate accuracy on training data
         self.prune()  # Prune rules using the pruning set
+        self.compile()  # Index the final rules for prediction
 
     def prune(self):
         """
@@ -47,17 +52,46 @@ class Ruleset:
                     rule.premises.append(removed)  # Restore if accuracy drops
                     break
         self.rules.sort(key=lambda r: -r.accuracy(self.prune_data))  # Sort by accuracy descending
+        self.rule_index = None  # The rules changed, the index must be rebuilt
+
+    def compile(self):
+        """
+        Index the rules for prediction (see RuleIndex).
+        Must be called again after editing the rules or their premises by hand.
+        """
+        self.rule_index = RuleIndex(self.rules, self.attributes)
+        return self.rule_index
+
+    def index(self):
+        """
+        Return the rule index, building it if needed (models saved before it existed have none).
+        """
+        rule_index = getattr(self, 'rule_index', None)
+        if rule_index is None or rule_index.rules is not self.rules:
+            rule_index = self.compile()
+        return rule_index
 
     def predict(self, test):
         """
         Predict the outcome for a given test instance using the rules.
         Returns the prediction and the rule's accuracy, or the default if no rule matches.
         """
-        for rule in self.rules:
-            prediction = rule.predict(test)
-            if prediction is not None:
-                return prediction, rule.accuracy()
-        return self.default, 0.0  # Return default if no rule matches
+        position = self.index().first_match(test)  # The first rule, in order, whose premises hold
+        if position < 0:
+            return self.default, 0.0  # Return default if no rule matches
+        rule = self.rules[position]
+        return rule.conclusion, rule.accuracy()
+
+    def predict_batch(self, X):
+        """
+        Predict the outcome of every row, as predict does for each one.
+        Returns an array of predictions and an array of the accuracies of the rules used.
+        """
+        positions = self.index().first_match_batch(X)
+        predictions = as_array([rule.conclusion for rule in self.rules] + [self.default])
+        accuracies = np.array([rule.accuracy() for rule in self.rules] + [0.0], dtype=float)
+        # Position -1, no rule matching, picks the default appended last
+        return predictions[positions], accuracies[positions]
     
     def feature_importance(self, normalize=True):
         """
@@ -88,7 +122,7 @@ class Ruleset:
         Returns a dictionary with accuracy, precision, recall, and F1 score.
         """
         y_true = [row[-1] for row in self.train_data]
-        y_pred = [self.predict(row)[0] for row in self.train_data]
+        y_pred = self.predict_batch(self.train_data)[0].tolist()
         accuracy = accuracy_score(y_true, y_pred)
         precision = precision_score(y_true, y_pred, average='weighted', zero_division=0)
         recall = recall_score(y_true, y_pred, average='weighted', zero_division=0)
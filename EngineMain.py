@@ -0,0 +1,270 @@
+"""
+Headless engine speaking a line-based text protocol on stdin/stdout, so the
+engines can be driven by external match runners without the pygame GUI.
+
+Commands
+--------
+engine single|mcts|auto|id3|ruleset|bagging
+    Select the engine (default: single).
+setoption workers N | exploration X | cache PATH|default|off | playout NAME|default
+          | seed N|none
+    Configure the MCTS engines. With a cache, searches start from the
+    statistics stored for their position by earlier searches. The playout is
+    a policy name from MCTS.playouts.PLAYOUTS or dt-<model>. With a seed,
+    every go with the same position and iterations gives the same result;
+    the mcts engine then searches in one round, so stop waits for it.
+position startpos [moves c1 c2 ...]
+position board <42 cells> [turn 1|-1] [moves c1 c2 ...]
+    Set the position. Cells are given row by row from the top, with 0 for an
+    empty cell, 1 for player 1 and 2 for player 2.
+go [iterations N] [movetime MS] [infinite]
+    Search the position. Replies with "info ..." lines and then "bestmove C".
+stop
+    End the current search, which then replies with its best move.
+isready
+    Replies "readyok".
+d
+    Print the board.
+quit
+    Exit.
+"""
+import contextlib
+import sys
+import threading
+
+import utils.config as config
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS import MonteCarlo_Single
+from MCTS.MCTS_optimized import MonteCarlo
+from MCTS.async_search import search_in_background
+from MCTS.node import Node
+from MCTS.playouts import get_playout
+from MCTS.position_cache import PositionCache
+from utils.model_input import DT_MODELS, load_dt_model, predict_move
+
+
+class EngineProtocol:
+    """
+    Reads protocol commands and writes replies.
+
+    Methods
+    -------
+    handle(line: str) -> bool
+        Execute one command, returning False on quit.
+    run() -> None
+        Process commands from the input stream until quit or end of input.
+    """
+
+    def __init__(self, input_stream=sys.stdin, output_stream=sys.stdout) -> None:
+        self.input = input_stream
+        self.output = output_stream
+        self.lock = threading.Lock()
+        self.engine_name = "single"
+        self.workers = None
+        self.exploration = config.EXPLORATION
+        self.models = {}
+        self.cache = None
+        self.playout = None
+        self.seed = config.MCTS_SEED
+        self.game = ConnectFour()
+        self.future = None
+        self.stop_event = None
+
+    def send(self, line: str) -> None:
+        with self.lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self) -> None:
+        for line in self.input:
+            if not self.handle(line):
+                break
+        self.stop()
+
+    def handle(self, line: str) -> bool:
+        """
+        Execute one command.
+
+        Parameters
+        ----------
+        line: the command line
+
+        Returns
+        -------
+        bool: False if the command was quit
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        try:
+            if command == "quit":
+                return False
+            elif command == "isready":
+                self.send("readyok")
+            elif command == "engine":
+                self.set_engine(args)
+            elif command == "setoption":
+                self.set_option(args)
+            elif command == "position":
+                self.set_position(args)
+            elif command == "go":
+                self.go(args)
+            elif command == "stop":
+                self.stop()
+            elif command == "d":
+                for row in self.game.board:
+                    self.send("info string " + " ".join(f"{cell:2d}" for cell in row))
+            else:
+                self.send(f"info string error unknown command {command}")
+        except (ValueError, IndexError) as exc:
+            self.send(f"info string error {exc}")
+        return True
+
+    def set_engine(self, args: list) -> None:
+        name = args[0].lower()
+        if name not in ("single", "mcts", "auto") and name not in DT_MODELS:
+            raise ValueError(f"unknown engine {name}")
+        if name in DT_MODELS and name not in self.models:
+            # The model loaders print to stdout, which belongs to the protocol
+            with contextlib.redirect_stdout(sys.stderr):
+                self.models[name] = load_dt_model(name)
+        self.engine_name = name
+
+    def set_option(self, args: list) -> None:
+        name, value = args[0].lower(), args[1]
+        if name == "workers":
+            self.workers = max(1, int(value))
+        elif name == "exploration":
+            self.exploration = float(value)
+        elif name == "cache":
+            self.stop()
+            if self.cache is not None:
+                self.cache.close()
+            if value == "off":
+                self.cache = None
+            else:
+                self.cache = PositionCache(config.POSITION_CACHE_PATH if value == "default" else value)
+        elif name == "playout":
+            self.playout = None if value == "default" else value
+            get_playout(self.playout)
+        elif name == "seed":
+            self.seed = None if value == "none" else int(value)
+        else:
+            raise ValueError(f"unknown option {name}")
+
+    def set_position(self, args: list) -> None:
+        self.stop()
+        if args[0] == "startpos":
+            game = ConnectFour()
+            rest = args[1:]
+        elif args[0] == "board":
+            cells = args[1]
+            if len(cells) != config.ROW * config.COLUMN or any(c not in "012" for c in cells):
+                raise ValueError(f"board must be {config.ROW * config.COLUMN} cells of 0, 1 or 2")
+            turn = None
+            rest = args[2:]
+            if rest and rest[0] == "turn":
+                turn = int(rest[1])
+                rest = rest[2:]
+            game = ConnectFour.from_board([{"0": 0, "1": 1, "2": -1}[c] for c in cells], turn)
+        else:
+            raise ValueError(f"unknown position type {args[0]}")
+        if rest:
+            if rest[0] != "moves":
+                raise ValueError(f"unexpected {rest[0]}")
+            for move in rest[1:]:
+                game.play(int(move))
+        self.game = game
+
+    def make_engine(self, iterations: int):
+        if self.engine_name == "single":
+            return MonteCarlo_Single(iteration=iterations, exploration=self.exploration, cache=self.cache,
+                                     playout=self.playout, seed=self.seed)
+        if self.engine_name == "mcts":
+            return MonteCarlo(iteration=iterations, exploration=self.exploration, workers=self.workers,
+                              cache=self.cache, playout=self.playout, seed=self.seed)
+        from MCTS.autotune import choose_engine
+        engine = choose_engine(iterations, exploration=self.exploration, seed=self.seed)
+        engine.cache = self.cache
+        if self.playout is not None:
+            engine.playout = get_playout(self.playout) if isinstance(engine, MonteCarlo_Single) else self.playout
+        return engine
+
+    def go(self, args: list) -> None:
+        self.stop()
+        if self.game.is_over():
+            self.send("bestmove none")
+            return
+        if self.engine_name in DT_MODELS:
+            model, rules = self.models[self.engine_name]
+            self.send(f"bestmove {predict_move(model, rules, self.game)}")
+            return
+
+        iterations, movetime, infinite = None, None, False
+        i = 0
+        while i < len(args):
+            if args[i] == "iterations":
+                iterations = int(args[i + 1])
+                i += 2
+            elif args[i] == "movetime":
+                movetime = int(args[i + 1]) / 1000
+                i += 2
+            elif args[i] == "infinite":
+                infinite = True
+                i += 1
+            else:
+                raise ValueError(f"unknown go argument {args[i]}")
+        if iterations is None:
+            iterations = 0 if movetime is not None or infinite else config.ITERATION
+
+        engine = self.make_engine(max(1, iterations))
+        root = Node(self.game.copy())
+        self.stop_event = threading.Event()
+
+        reported = [0]
+
+        def progress(snapshot) -> None:
+            # A search ended by stop or movetime repeats its last round as the final snapshot
+            if snapshot.iterations == reported[0]:
+                return
+            reported[0] = snapshot.iterations
+            # The snapshot follows the order of the root children, the reply has one share per column
+            shares = [0.0] * config.COLUMN
+            for child, share in zip(root.children, snapshot.prob):
+                shares[child.move] = share
+            probs = " ".join(f"{p:.4f}" for p in shares)
+            self.send(f"info iterations {snapshot.iterations} move {snapshot.move} probs {probs}")
+
+        def finished(future) -> None:
+            if future.cancelled():
+                return
+            try:
+                move, _ = future.result()
+            except Exception as exc:
+                self.send(f"info string error {exc}")
+                self.send("bestmove none")
+                return
+            self.send(f"bestmove {move}")
+
+        self.future = search_in_background(engine, root, progress, stop=self.stop_event, time_limit=movetime,
+                                           iterations=iterations)
+        self.future.add_done_callback(finished)
+
+    def stop(self) -> None:
+        if self.stop_event is not None:
+            self.stop_event.set()
+        self.wait()
+
+    def wait(self) -> None:
+        if self.future is not None:
+            try:
+                self.future.result()
+            except Exception:
+                pass
+            self.future = None
+            self.stop_event = None
+
+
+if __name__ == "__main__":
+    EngineProtocol().run()
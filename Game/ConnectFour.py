@@ -22,6 +22,10 @@ class ConnectFour(object):
         Check if the game is over.
     print_board() -> None
         Print the board.
+    key() -> bytes
+        Return a compact key identifying the position.
+    from_board(board, turn: int = None) -> ConnectFour
+        Create a game from a board position.
     """
 
     def __init__(self) -> None:
@@ -46,6 +50,7 @@ class ConnectFour(object):
         self.win = 0
         self.board = np.zeros((config.ROW, config.COLUMN), dtype=np.int8)
         self.last_move = []
+        self.pieces = 0
 
     def copy(self) -> "ConnectFour":
         """
@@ -168,4 +173,40 @@ class ConnectFour(object):
         -------
         none
         """
-        print(self.board)
\ No newline at end of file
+        print(self.board)
+
+    def key(self) -> bytes:
+        """
+        Return a compact key identifying the position: the 42 cells and the
+        player to move.
+
+        Returns
+        -------
+        bytes: the position key
+        """
+        board = self.board if self.board.dtype == np.int8 else self.board.astype(np.int8)
+        return board.tobytes() + (b"\x01" if self.turn == 1 else b"\xff")
+
+    @classmethod
+    def from_board(cls, board, turn: int = None) -> "ConnectFour":
+        """
+        Create a game from a board position.
+
+        Parameters
+        ----------
+        board: the 6x7 board, or its 42 cells row by row, with 1, -1 and 0
+        turn: the player to move, inferred from the piece counts if None
+
+        Returns
+        -------
+        game: the game in that position
+        """
+        game = cls()
+        game.board = np.array(board, dtype=np.int8).reshape(config.ROW, config.COLUMN)
+        game.pieces = int(np.count_nonzero(game.board))
+        if turn is None:
+            turn = 1 if np.sum(game.board == 1) == np.sum(game.board == -1) else -1
+        game.turn = turn
+        game.win = game.check_win()
+        return game
+
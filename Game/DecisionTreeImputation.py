@@ -17,7 +17,8 @@ with open(os.devnull, 'w') as f, contextlib.redirect_stdout(f):
 class BoardEditor:
     """
     A class to provide a graphical board editor for Connect Four using pygame.
-    Allows users to manually set up the board, erase pieces, and run decision tree models.
+    Allows users to manually set up the board, erase pieces, run decision tree models,
+    and analyse the position with MCTS until stopped.
     """
 
     def __init__(self):
@@ -31,6 +32,7 @@ class BoardEditor:
         pygame.display.set_caption("Connect Four Board Editor")
         self.font = pygame.font.SysFont("Arial", 30)
         self.dragging_piece = None  # Keeps track of the piece being dragged (1 for red, -1 for yellow)
+        self.analysis = None  # Running MCTS analysis of the board, if any
 
     def draw_board(self):
         """
@@ -88,6 +90,7 @@ class BoardEditor:
                     row = (y // self.square_size) - 1
                     if event.button == 3:  # Right-click to erase
                         if 0 <= row < config.ROW and 0 <= col < config.COLUMN:
+                            self.stop_analysis()
                             self.game.board[row][col] = 0
             if event.type == pygame.MOUSEBUTTONUP:
                 # Place the dragged piece on the board
@@ -96,6 +99,7 @@ class BoardEditor:
                     col = x // self.square_size
                     row = (y // self.square_size) - 1
                     if 0 <= row < config.ROW and 0 <= col < config.COLUMN and self.game.board[row][col] == 0:
+                        self.stop_analysis()
                         self.game.board[row][col] = self.dragging_piece
                 self.dragging_piece = None
             if event.type == pygame.MOUSEMOTION and self.dragging_piece is not None:
@@ -113,6 +117,11 @@ class BoardEditor:
                         self.run_model(debug=debug)
                     else:
                         print(f"Invalid board: {message}")
+                elif event.key == pygame.K_a:  # Start or stop the MCTS analysis
+                    if self.analysis is not None:
+                        self.stop_analysis()
+                    else:
+                        self.start_analysis()
 
     def is_valid_board(self):
         """
@@ -237,6 +246,32 @@ class BoardEditor:
         else:
             print(f"{selected} Prediction: Column {model_pred} (0-6)")
         
+    def start_analysis(self):
+        """
+        Analyses the board with MCTS in the background until stopped, printing
+        the principal variation, visit shares and values as the search goes.
+        """
+        valid, message = self.is_valid_board()
+        if not valid:
+            print(f"Invalid board: {message}")
+            return
+        from MCTS.analysis import Analysis
+        p1_count = np.sum(self.game.board == 1)
+        p2_count = np.sum(self.game.board == -1)
+        turn = 1 if p1_count <= p2_count else -1
+        self.analysis = Analysis(ConnectFour.from_board(self.game.board, turn))
+        print(f"Analysing with {'Red' if turn == 1 else 'Yellow'} to move, press A to stop")
+        self.analysis.start(lambda info: print(f"Analysis: {info}"))
+
+    def stop_analysis(self):
+        """
+        Stops the running analysis, if any, and prints its result.
+        """
+        if self.analysis is not None:
+            info = self.analysis.stop()
+            self.analysis = None
+            print(f"Analysis stopped: best move {info.move}, {info}")
+
     def run_editor(self, debug=False): 
         """
         Main loop for the board editor. Continuously draws the board and handles user input.
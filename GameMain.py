@@ -2,14 +2,17 @@ from Game.ConnectFour import ConnectFour
 from MCTS.MCTS_optimized import MonteCarlo
 from MCTS.node import Node
 from MCTS.MCTS import MonteCarlo_Single
+from MCTS.ponder import Ponderer, advance
+from MCTS.autotune import choose_engine
+from MCTS.async_search import search_in_background
+from MCTS.time_manager import TimeManager
 import utils.config as config
 import timeit
 from utils.Visualize_MCtree import Drawer
+from utils.model_input import predict_move
 from Game.DecisionTreeImputation import BoardEditor
 import contextlib
 import os
-import random
-import numpy as np
 from DecisionTree.ID3Tree import ID3Tree
 from DecisionTree.Ruleset import Ruleset
 from DecisionTree.Bootstrap_Aggregating import Bagging
@@ -34,6 +37,7 @@ class ConnectFourGUI:
         self.screen = pygame.display.set_mode((self.width, self.height))
         pygame.display.set_caption("Connect Four")
         self.font = pygame.font.SysFont("Arial", 40)
+        self.ponderer = None
 
     def check_escape(self):
         """
@@ -83,6 +87,8 @@ class ConnectFourGUI:
                     pygame.quit()
                     exit()
                 if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    if self.ponderer is not None:
+                        self.ponderer.stop()
                     self.game.reset_game()
                     self.screen.fill(config.BLACK)
                     self.mainMenu()
@@ -101,6 +107,29 @@ class ConnectFourGUI:
                     if col in self.game.legal_moves():
                         return col
 
+    def wait_for_search(self, monte_carlo, root, clock=None):
+        """
+        Runs a search in the background while keeping the window responsive.
+        With a TimeManager clock, the search time is taken from the game clock
+        instead of running the engine's iteration budget.
+        Returns the (move, scores) pair, or None if escape was pressed.
+        """
+        future = clock.think(monte_carlo, root) if clock is not None else search_in_background(monte_carlo, root)
+        while not future.done():
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    future.cancel()
+                    pygame.quit()
+                    exit()
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    future.cancel()
+                    self.game.reset_game()
+                    self.screen.fill(config.BLACK)
+                    self.mainMenu()
+                    return None
+            pygame.time.wait(10)
+        return future.result()
+
     def end_game_message(self):
         """
         Displays the end game message and resets the game.
@@ -132,35 +161,56 @@ class ConnectFourGUI:
             self.draw_board()
         self.end_game_message()
 
-    def run_pva(self, iterations, debug):
+    def run_pva(self, iterations, debug, game_time=config.GAME_TIME):
         """
         Runs a Player vs AI game loop.
         The AI uses Monte Carlo Tree Search for its moves.
-        """
+        While the player thinks, the AI keeps searching the current position
+        and reuses that tree once the player has moved.
+        With a game_time in seconds, the AI spends that clock over the game
+        instead of searching a fixed budget per move.
+        """
+        clock = TimeManager(game_time) if game_time else None
+        root = None
+        self.ponderer = Ponderer() if config.PONDER else None
         while not self.game.is_over():
             if self.check_escape():
                 return
             self.draw_board()
+            if root is None:
+                root = Node(self.game.copy())
             if self.game.turn == 1:
                 # Player's turn
+                if self.ponderer is not None:
+                    self.ponderer.start(root)
                 player_move = self.get_player_move()
                 if player_move is None:
                     return
+                if self.ponderer is not None:
+                    self.ponderer.stop()
                 self.game.play(player_move)
+                root = advance(root, self.game, player_move)
             else:
-                # AI's turn
-                root = Node(self.game)
-                monte_carlo = MonteCarlo(iteration=iterations, debug=debug) if iterations >= config.MEDIUMLEVEL else MonteCarlo_Single(iteration=iterations, debug=debug)
+                # AI's turn, only the part of the budget not covered by pondering is searched
+                monte_carlo = choose_engine(max(1, iterations - root.visits), debug=debug, stats=debug)
                 start_time = timeit.default_timer()
-                best_child, scores = monte_carlo.search(root)
+                result = self.wait_for_search(monte_carlo, root, clock)
+                if result is None:
+                    return
+                best_child, scores = result
                 end_time = timeit.default_timer()
                 self.game.play(best_child)
                 if debug:
                     print(scores)
                     print(f"AI took {end_time - start_time:.2f} seconds to decide.")
+                    if clock is not None:
+                        print(f"AI clock: {clock.remaining:.1f} seconds left")
+                    print(monte_carlo.stats)
                     drawer = Drawer()
                     G = drawer.build_tree_graph(root, depth=2, max_nodes=100)
                     drawer.draw_tree(G)
+                root = advance(root, self.game, best_child)
+        self.ponderer = None
         self.draw_board()
         self.end_game_message()
 
@@ -180,38 +230,7 @@ class ConnectFourGUI:
                     return
                 self.game.play(player_move)
             else:
-                row = self.game.board.flatten()
-                number_of_pieces = np.count_nonzero(row)
-
-                player_1 = np.copy(row)
-                # Replace -1 with 0
-                player_1[player_1 == -1] = 0
-                player_2 = np.copy(row)
-                player_2[player_2 == 1] = 0
-                player_2[player_2 == -1] = 1
-
-                row = np.append(player_1, player_2)
-
-                row = np.append(row, number_of_pieces)
-                row = np.append(row, 0)
-                row = row.tolist()
-                model_pred = None
-
-                # Run the selected model and print the prediction
-                if rules is not None:
-                    for rule in rules:
-                        model_pred = rule.predict(row)
-                        if model_pred is not None:
-                            break
-                    if model_pred is None:
-                        model_pred = -1  # ERROR_CLASS
-                else:
-                    model_pred, _ = model.predict(row)
-                
-                legal_moves = self.game.legal_moves()
-                if model_pred not in legal_moves:
-                    model_pred = random.choice(self.game.legal_moves())
-                self.game.play(model_pred)
+                self.game.play(predict_move(model, rules, self.game))
         self.draw_board()
         self.end_game_message()
 
@@ -311,11 +330,15 @@ class ConnectFourGUI:
                     elif back_rect.collidepoint(x, y):
                         return
         
-    def run_ava(self, ai1_iter=config.ITERATION, ai2_iter=config.ITERATION, debug=False, save_path=None):
+    def run_ava(self, ai1_iter=config.ITERATION, ai2_iter=config.ITERATION, debug=False, save_path=None,
+                game_time=config.GAME_TIME):
         """
         Runs an AI vs AI game loop.
         Both sides use Monte Carlo Tree Search.
+        With a game_time in seconds, each side spends that clock over the game
+        instead of searching a fixed budget per move.
         """
+        clocks = {1: TimeManager(game_time), -1: TimeManager(game_time)} if game_time else None
         while not self.game.is_over():
             if self.check_escape():
                 return
@@ -323,12 +346,15 @@ class ConnectFourGUI:
             root = Node(self.game)
             
             if(self.game.turn == 1):
-                monte_carlo = MonteCarlo(iteration=ai1_iter, debug=debug) if ai1_iter >= config.MEDIUMLEVEL else MonteCarlo_Single(iteration=ai1_iter, debug=debug)
+                monte_carlo = choose_engine(ai1_iter, debug=debug, stats=debug)
             else:
-                monte_carlo = MonteCarlo(iteration=ai2_iter, debug=debug) if ai2_iter >= config.MEDIUMLEVEL else MonteCarlo_Single(iteration=ai2_iter, debug=debug)            
+                monte_carlo = choose_engine(ai2_iter, debug=debug, stats=debug)            
             
             start_time = timeit.default_timer()
-            best_child, scores = monte_carlo.search(root)
+            result = self.wait_for_search(monte_carlo, root, clocks[self.game.turn] if clocks else None)
+            if result is None:
+                return
+            best_child, scores = result
             end_time = timeit.default_timer()
 
             if save_path is not None:
@@ -341,6 +367,7 @@ class ConnectFourGUI:
             if debug:
                 print(scores)
                 print(f"AI {self.game.turn} took {end_time - start_time:.2f} seconds to decide.")
+                print(monte_carlo.stats)
                 drawer = Drawer()
                 G = drawer.build_tree_graph(root, depth=2, max_nodes=100)
                 drawer.draw_tree(G)
@@ -618,13 +645,17 @@ class ConnectFourGUI:
             if self.game.turn == 1:
                 # Monte Carlo's turn
                 root = Node(self.game)
-                monte_carlo = MonteCarlo(iteration=ai1_iter, debug=debug) if ai1_iter >= config.MEDIUMLEVEL else MonteCarlo_Single(iteration=ai1_iter, debug=debug)
+                monte_carlo = choose_engine(ai1_iter, debug=debug, stats=debug)
                 start_time = timeit.default_timer()
-                best_child, scores = monte_carlo.search(root)
+                result = self.wait_for_search(monte_carlo, root)
+                if result is None:
+                    return
+                best_child, scores = result
                 end_time = timeit.default_timer()
                 if debug:
                     print(scores)
                     print(f"AI {self.game.turn} took {end_time - start_time:.2f} seconds to decide.")
+                    print(monte_carlo.stats)
                     drawer = Drawer()
                     G = drawer.build_tree_graph(root, depth=2, max_nodes=100)
                     drawer.draw_tree(G)
@@ -632,31 +663,7 @@ class ConnectFourGUI:
                 self.game.play(best_child)
             else:
                 # Decision Tree's turn
-                row = self.game.board.flatten()
-                number_of_pieces = np.count_nonzero(row)
-                player_1 = np.copy(row)
-                player_1[player_1 == -1] = 0
-                player_2 = np.copy(row)
-                player_2[player_2 == 1] = 0
-                player_2[player_2 == -1] = 1
-                row = np.append(player_1, player_2)
-                row = np.append(row, number_of_pieces)
-                row = np.append(row, 0)
-                row = row.tolist()
-                model_pred = None
-                if rules is not None:
-                    for rule in rules:
-                        model_pred = rule.predict(row)
-                        if model_pred is not None:
-                            break
-                    if model_pred is None:
-                        model_pred = -1
-                else:
-                    model_pred, _ = dt_model.predict(row)
-                legal_moves = self.game.legal_moves()
-                if model_pred not in legal_moves:
-                    model_pred = random.choice(legal_moves)
-                self.game.play(model_pred)
+                self.game.play(predict_move(dt_model, rules, self.game))
         self.draw_board()
         self.end_game_message()
 
@@ -669,42 +676,10 @@ class ConnectFourGUI:
             if self.check_escape():
                 return
             self.draw_board()
-            row = self.game.board.flatten()
-            number_of_pieces = np.count_nonzero(row)
-            player_1 = np.copy(row)
-            player_1[player_1 == -1] = 0
-            player_2 = np.copy(row)
-            player_2[player_2 == 1] = 0
-            player_2[player_2 == -1] = 1
-            row = np.append(player_1, player_2)
-            row = np.append(row, number_of_pieces)
-            row = np.append(row, 0)
-            row = row.tolist()
-            model_pred = None
             if self.game.turn == 1:
-                if red_rules is not None:
-                    for rule in red_rules:
-                        model_pred = rule.predict(row)
-                        if model_pred is not None:
-                            break
-                    if model_pred is None:
-                        model_pred = -1
-                else:
-                    model_pred, _ = red_model.predict(row)
+                self.game.play(predict_move(red_model, red_rules, self.game))
             else:
-                if yellow_rules is not None:
-                    for rule in yellow_rules:
-                        model_pred = rule.predict(row)
-                        if model_pred is not None:
-                            break
-                    if model_pred is None:
-                        model_pred = -1
-                else:
-                    model_pred, _ = yellow_model.predict(row)
-            legal_moves = self.game.legal_moves()
-            if model_pred not in legal_moves:
-                model_pred = random.choice(legal_moves)
-            self.game.play(model_pred)
+                self.game.play(predict_move(yellow_model, yellow_rules, self.game))
             pygame.time.wait(500)
         self.draw_board()
         self.end_game_message()
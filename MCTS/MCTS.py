@@ -1,11 +1,16 @@
 import math
 import random
-from typing import Tuple, Any, List, Union
+from time import perf_counter
+from typing import Tuple, Any, List, Union, Optional
 
 import utils.config as config
 
 from Game.ConnectFour import ConnectFour
+from MCTS.halving import check_root_policy, halve, halving_rounds, round_iterations
+from MCTS.memory import TreeBudget
 from MCTS.node import Node
+from MCTS.playouts import get_playout, playout_depth
+from MCTS.stats import SearchStats, timed_expansion
 
 
 class MonteCarlo_Single(object):
@@ -14,53 +19,240 @@ class MonteCarlo_Single(object):
 
     Methods
     -------
-    search(root: Node) -> int
+    search(root: Node, iterations: Optional[int] = None) -> int
         Search the best move from the root node.
-     selection(node: Node, turn: int) -> (Node, int)
+    iterate(root: Node, iterations: int) -> None
+        Run search iterations without picking a move.
+    sequential_halving(root: Node, iterations: int, stats: Optional[SearchStats] = None) -> Node
+        Spend the budget on the root moves by sequential halving.
+    selection(node: Node, turn: int, state: ConnectFour) -> (Node, int)
         Select the best node to expand.
-    expansion(node: Node) -> Node
+    puct_selection(node: Node, turn: int, state: ConnectFour) -> (Node, int)
+        Select the node to expand with PUCT scores from the prior.
+    expansion(node: Node, state: ConnectFour) -> Node
         Expand the node by adding a new child.
     simulation(state_init: ConnectFour, turn: int) -> float
-        Simulate a random game from the initial state.
+        Simulate a random game from the initial state, or score it with the evaluator.
     backpropagation(node: Node, reward: float, turn: int) -> None
         Backpropagate the reward of the simulation to the root node.
     best_child(node: Node) -> Node
         Return the best child of the node.
+
+    When created with stats=True, every search leaves a SearchStats object
+    in the stats attribute. When created with max_nodes or max_bytes, the tree
+    is kept under that size by evicting subtrees (see TreeBudget). When
+    given a PositionCache, every search starts from the statistics stored
+    for its root position and adds its own to them. When given an
+    evaluator (see LinearEvaluator), rollouts stop after rollout_depth moves
+    and the evaluator scores the position reached, rollout_depth = 0 scoring
+    the new leaf directly. When given a prior (see DTPrior), selection uses
+    PUCT scores and a node can be searched before all its moves are tried.
+    When given a playout policy (see MCTS.playouts), by name or as a
+    callable, rollouts play its moves instead of uniformly random ones.
+    When given a seed, the search draws from its own random stream, so the
+    same seed, position and budget always give the same tree; without one
+    it draws from the random module. With root_policy="halving", search
+    allocates the root visits by sequential halving instead of UCB.
     """
-    def __init__(self, iteration: int = config.ITERATION, exploration: float = config.EXPLORATION, debug: bool = False) -> None:
+    def __init__(self, iteration: int = config.ITERATION, exploration: float = config.EXPLORATION, debug: bool = False,
+                 stats: bool = False, max_nodes: Optional[int] = config.MCTS_MAX_NODES,
+                 max_bytes: Optional[int] = config.MCTS_MAX_BYTES, eviction: str = config.EVICTION_POLICY,
+                 cache=None, evaluator=None, rollout_depth: int = config.EVAL_ROLLOUT_DEPTH, prior=None,
+                 c_puct: float = config.PUCT_C, playout=None, seed: Optional[int] = config.MCTS_SEED,
+                 root_policy: str = config.ROOT_POLICY) -> None:
         """
         Initialize the Monte Carlo Tree Search algorithm.
         """
         self.iteration = iteration
         self.exploration = exploration
+        self.collect_stats = stats
+        self.stats = None
+        self.budget = TreeBudget(max_nodes, max_bytes, eviction) if max_nodes or max_bytes else None
+        self.cache = cache
+        self.evaluator = evaluator
+        self.rollout_depth = rollout_depth
+        self.prior = prior
+        self.c_puct = c_puct
+        self.playout = get_playout(playout)
+        self.seed = seed
+        self.rng = random.Random(seed) if seed is not None else random
+        self.root_policy = check_root_policy(root_policy)
         if debug:
             print(f"Monte Carlo Tree Search: iteration={iteration}, exploration={exploration}")
 
-    def search(self, root: Node) -> tuple[Any, list[Any]]:
+    def search(self, root: Node, iterations: Optional[int] = None) -> tuple[Any, list[Any]]:
         """
         Search the best move from the root node.
 
         Parameters
         ----------
-        root: the root node of the search tree
+        root: the root node of the search tree, possibly already searched
+        iterations: the number of iterations to run, defaults to self.iteration
 
         Returns
         -------
         int: the best move
         """
-        for _ in range(self.iteration):
-            node, turn = self.selection(root, -1)
-            reward = self.simulation(node.state, turn)
-            self.backpropagation(node, reward, turn)
+        iterations = self.iteration if iterations is None else iterations
+        baseline = self.cache.warm_start(root) if self.cache is not None else None
+        ans = None
+        if self.root_policy == "halving":
+            self.stats = SearchStats() if self.collect_stats else None
+            ans = self.sequential_halving(root, iterations, self.stats)
+        elif self.collect_stats:
+            self.stats = SearchStats()
+            self.search_with_stats(root, self.stats, iterations)
+        else:
+            self.stats = None
+            self.iterate(root, iterations)
+        if self.cache is not None:
+            self.cache.record(root, baseline)
 
         prob = []
         for child in root.children:
             prob.append(child.visits / root.visits)
 
-        ans = max(root.children, key=lambda c: c.visits)
-        return ans.state.last_move[1], prob
+        if ans is None:
+            ans = max(root.children, key=lambda c: c.visits)
+        return ans.move, prob
 
-    def selection(self, node: Node, turn: int) -> tuple[Node, int]:
+    def iterate(self, root: Node, iterations: int) -> None:
+        """
+        Run search iterations on the tree without picking a move.
+
+        Parameters
+        ----------
+        root: the root node of the search tree
+        iterations: the number of iterations to run
+
+        Returns
+        -------
+        none
+        """
+        budget = self.budget
+        if budget is not None:
+            budget.start(root)
+        for _ in range(iterations):
+            state = root.state.copy()
+            node, turn = self.selection(root, -1, state)
+            reward = self.simulation(state, turn)
+            if budget is not None:
+                budget.visit(node)
+            self.backpropagation(node, reward, turn)
+            if budget is not None:
+                budget.check(root)
+
+    def sequential_halving(self, root: Node, iterations: int, stats: Optional[SearchStats] = None) -> Node:
+        """
+        Spend the budget on the root moves by sequential halving.
+
+        The budget is split into rounds. Each round searches every remaining
+        root move with the same number of iterations, descending with the
+        usual selection below it, then drops the worse half by mean reward,
+        until one move is left. Unlike UCB at the root, no visits are spent
+        on moves already known to be bad, which lowers the simple regret of
+        a fixed budget.
+
+        Parameters
+        ----------
+        root: the root node of the search tree
+        iterations: the number of iterations to run
+        stats: the statistics object to fill, None to run untimed
+
+        Returns
+        -------
+        node: the root child of the chosen move
+        """
+        self.stats = stats
+        budget = self.budget
+        if budget is not None:
+            budget.start(root)
+        start = perf_counter()
+        tried = root.children_move
+        for move in root.state.legal_moves():
+            if move not in tried:
+                self.expand_move(root, root.state.copy(), move)
+        candidates = list(root.children)
+        rounds = halving_rounds(len(candidates))
+        while len(candidates) > 1:
+            per_candidate = round_iterations(iterations, len(candidates), rounds)
+            for child in candidates:
+                for _ in range(per_candidate):
+                    state = root.state.copy()
+                    state.play(child.move)
+                    if stats is not None:
+                        self.timed_iteration(root, child, 1, state, stats)
+                        continue
+                    node, turn = self.selection(child, 1, state)
+                    reward = self.simulation(state, turn)
+                    if budget is not None:
+                        budget.visit(node)
+                    self.backpropagation(node, reward, turn)
+                    if budget is not None:
+                        budget.check(root)
+            candidates = halve(candidates)
+        if stats is not None:
+            stats.total_time = perf_counter() - start
+        return candidates[0]
+
+    def search_with_stats(self, root: Node, stats: SearchStats, iterations: int) -> None:
+        """
+        Run the search iterations while timing each phase.
+
+        Parameters
+        ----------
+        root: the root node of the search tree
+        stats: the statistics object to fill
+        iterations: the number of iterations to run
+
+        Returns
+        -------
+        none
+        """
+        self.stats = stats
+        if self.budget is not None:
+            self.budget.start(root)
+        start = perf_counter()
+        for _ in range(iterations):
+            self.timed_iteration(root, root, -1, root.state.copy(), stats)
+        stats.total_time = perf_counter() - start
+
+    def timed_iteration(self, root: Node, node: Node, turn: int, state: ConnectFour, stats: SearchStats) -> None:
+        """
+        Run one search iteration from a node of the tree, timing each phase.
+
+        Parameters
+        ----------
+        root: the root node of the search tree, whose budget is checked
+        node: the node to start the selection from
+        turn: the turn of the player who played the move leading to node
+        state: a scratch copy of the node state
+        stats: the statistics object to fill
+
+        Returns
+        -------
+        none
+        """
+        budget = self.budget
+        t0 = perf_counter()
+        expansion_before = stats.expansion_time
+        node, turn = self.selection(node, turn, state)
+        t1 = perf_counter()
+        depth = state.pieces - root.state.pieces
+        reward = self.simulation(state, turn)
+        t2 = perf_counter()
+        if budget is not None:
+            budget.visit(node)
+        self.backpropagation(node, reward, turn)
+        if budget is not None:
+            budget.check(root, stats)
+        t3 = perf_counter()
+        stats.selection_time += t1 - t0 - (stats.expansion_time - expansion_before)
+        stats.simulation_time += t2 - t1
+        stats.backprop_time += t3 - t2
+        stats.record_iteration(depth, state.pieces - root.state.pieces - depth)
+
+    def selection(self, node: Node, turn: int, state: ConnectFour) -> tuple[Node, int]:
         """
         Select the best node to expand.
 
@@ -68,64 +260,154 @@ class MonteCarlo_Single(object):
         ----------
         node: the node to start the selection from
         turn: the turn of the player who played the move leading to this node
+        state: a scratch copy of the node state, advanced in place along the
+            selected path
 
         Returns
         -------
         node: the node to expand
         turn: the turn of the player who played the move leading to this node
         """
+        if self.prior is not None:
+            return self.puct_selection(node, turn, state)
         while not node.is_terminal():
             if not node.fully_explored():
-                return self.expansion(node), -1 * turn
+                return timed_expansion(self.expansion, self.stats, node, state), -1 * turn
             else:
                 node = self.best_child(node)
+                state.play(node.move)
                 turn *= -1
 
         return node, turn
 
+    def puct_selection(self, node: Node, turn: int, state: ConnectFour) -> tuple[Node, int]:
+        """
+        Select the node to expand with PUCT scores from the prior.
+
+        A child scores its mean reward plus c_puct * P * sqrt(N) / (1 + n).
+        A move not tried yet competes with the children with a mean reward of
+        0, so moves the prior rejects may never be expanded.
+
+        Parameters
+        ----------
+        node: the node to start the selection from
+        turn: the turn of the player who played the move leading to this node
+        state: a scratch copy of the node state, advanced in place along the
+            selected path
+
+        Returns
+        -------
+        node: the node to expand
+        turn: the turn of the player who played the move leading to this node
+        """
+        while not node.is_terminal():
+            priors = self.prior.priors(state)
+            scale = self.c_puct * math.sqrt(node.visits)
+            best_score = -float("inf")
+            best_child = None
+            for child in node.children:
+                score = child.reward / child.visits + scale * priors[child.move] / (1 + child.visits)
+                if score > best_score:
+                    best_score = score
+                    best_child = child
+            best_move = None
+            if not node.fully_explored():
+                tried = node.children_move
+                for move in state.legal_moves():
+                    if move not in tried and scale * priors[move] > best_score:
+                        best_score = scale * priors[move]
+                        best_move = move
+            if best_move is not None:
+                expand = lambda n, s: self.expand_move(n, s, best_move)
+                return timed_expansion(expand, self.stats, node, state), -1 * turn
+            node = best_child
+            state.play(node.move)
+            turn *= -1
+
+        return node, turn
+
+    @staticmethod
+    def expand_move(node: Node, state: ConnectFour, move: int) -> Node:
+        """
+        Expand the node with a given move.
+
+        Parameters
+        ----------
+        node: the node to expand
+        state: the state of the node, advanced in place to the new child
+        move: the move to play
+
+        Returns
+        -------
+        node: the new child
+        """
+        state.play(move)
+        return node.add_child(state, move)
+
     @staticmethod
-    def expansion(node: Node) -> Node:
+    def expansion(node: Node, state: ConnectFour) -> Node:
         """
         Expand the node by adding a new child.
 
         Parameters
         ----------
         node: the node to expand
+        state: the state of the node, advanced in place to the new child
 
         Returns
         -------
         node: the new child
         """
-        free_cols = node.state.legal_moves()
+        free_cols = state.legal_moves()
 
         for col in free_cols:
             if col not in node.children_move:
-                new_state = node.state.copy()
-                new_state.play(col)
-                node.add_child(new_state, col)
+                state.play(col)
+                node.add_child(state, col)
                 break
 
         return node.children[-1]
 
-    @staticmethod
-    def simulation(state_init: ConnectFour, turn: int) -> float:
+    def simulation(self, state_init: ConnectFour, turn: int) -> float:
         """
         Simulate a random game from the initial state.
 
+        With an evaluator, the game is only played for rollout_depth moves
+        and the evaluator's value of the position reached is returned. A
+        depth-capped playout policy also cuts the game, scoring it 0 without
+        an evaluator.
+
         Parameters
         ----------
-        state_init: the initial state of the game
+        state_init: the initial state of the game, played out in place
         turn: the turn of the player who played the move leading to this node
 
         Returns
         -------
         reward: the reward of the simulated game
         """
-        state = state_init.copy()
+        state = state_init
+        evaluator = self.evaluator
+        playout = self.playout
+        max_depth = self.rollout_depth if evaluator is not None else None
+        cap = playout_depth(playout)
+        if cap is not None and (max_depth is None or cap < max_depth):
+            max_depth = cap
+        depth = 0
 
         while not state.is_over():
-            state.play(random.choice(state.legal_moves()))
+            if max_depth is not None and depth >= max_depth:
+                if evaluator is None:
+                    return 0.0
+                # The value is for the player to move, who did not play last
+                value = evaluator.evaluate(state)
+                return value if turn == 1 else -value
+            if playout is not None:
+                state.play(playout(state, self.rng))
+            else:
+                state.play(self.rng.choice(state.legal_moves()))
             turn *= -1
+            depth += 1
 
         reward_bool = state.is_over()
 
@@ -1,52 +1,128 @@
 import math
 import random
 import os
-from concurrent.futures import ProcessPoolExecutor
-from typing import Tuple, Any, Dict
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from time import perf_counter
+from typing import Tuple, Any, Dict, Hashable, Iterable, Iterator, List, Optional
 
 import utils.config as config
 from Game.ConnectFour import ConnectFour
+from MCTS.halving import check_root_policy, halve, halving_rounds, round_iterations
+from MCTS.memory import TreeBudget
 from MCTS.node import Node
+from MCTS.playouts import PLAYOUTS, get_playout, playout_depth
+from MCTS.stats import SearchStats, timed_expansion
 
 
-def worker_mcts(state: ConnectFour, iterations: int, exploration: float) -> Dict[int, Tuple[float, int]]:
+# Trees kept by this worker process for searches run in rounds, by tree key
+_worker_trees = OrderedDict()
+
+
+def worker_mcts(state: ConnectFour, iterations: int, exploration: float, collect_stats: bool = False,
+                max_nodes: Optional[int] = None, max_bytes: Optional[int] = None,
+                eviction: str = config.EVICTION_POLICY, evaluator=None, rollout_depth: Optional[int] = None,
+                prior=None, c_puct: float = config.PUCT_C, playout=None, seed: Optional[int] = None,
+                tree_key: Optional[Hashable] = None) -> Tuple[Dict[int, Tuple[float, int]], Optional[dict]]:
     """
-    Each worker runs its own mini-MCTS rooted at the same state.
-    Returns: {move: (total_reward, total_visits)}
+    Each worker runs its own mini-MCTS rooted at the same state, its tree
+    capped by max_nodes or max_bytes when given. Rollouts follow the playout
+    policy, a name or a callable, "column3" by default. They stop after
+    rollout_depth moves (EVAL_ROLLOUT_DEPTH with an evaluator) or at the
+    policy's depth cap, and score the position with the evaluator, or 0
+    without one. With a prior, selection uses PUCT scores as in
+    MonteCarlo_Single.puct_selection.
+    The rollouts draw from a random stream of their own, seeded with seed,
+    or from fresh entropy if seed is None, so forked workers never share
+    the random state of the parent.
+    With a tree_key, the process keeps its tree under that key and a later
+    call with the same key goes on growing it, so a search run in rounds
+    reaches the depth of a single call; the stats returned are then those
+    added since the last call. Each process keeps WORKER_TREES such trees.
+    Returns: ({move: (total_reward, total_visits)}, stats dict or None)
     """
-    root = Node(state.copy())
+    kept = _worker_trees.get(tree_key) if tree_key is not None else None
+    if kept is None:
+        rng = random.Random(seed)
+        root = Node(state.copy())
+        budget = TreeBudget(max_nodes, max_bytes, eviction) if max_nodes or max_bytes else None
+        reported = {}  # Root child statistics returned by the previous calls
+        if tree_key is not None:
+            _worker_trees[tree_key] = (root, rng, budget, reported)
+            while len(_worker_trees) > config.WORKER_TREES:
+                _worker_trees.popitem(last=False)
+    else:
+        root, rng, budget, reported = kept
+        _worker_trees.move_to_end(tree_key)
+    stats = SearchStats() if collect_stats else None
+    if budget is not None:
+        budget.start(root)
+    playout = get_playout(playout) if playout is not None else PLAYOUTS["column3"]
+    cap = playout_depth(playout)
+    if rollout_depth is None:
+        rollout_depth = config.EVAL_ROLLOUT_DEPTH if evaluator is not None else cap
+    if cap is not None and rollout_depth is not None:
+        rollout_depth = min(rollout_depth, cap)
 
-    def selection(node: Node, turn: int) -> Tuple[Node, int]:
+    def selection(node: Node, turn: int, state: ConnectFour) -> Tuple[Node, int]:
+        if prior is not None:
+            return puct_selection(node, turn, state)
         while not node.is_terminal():
             if not node.fully_explored():
-                return expansion(node), -1 * turn
+                return timed_expansion(expansion, stats, node, state), -1 * turn
             node = best_child(node)
+            state.play(node.move)
+            turn *= -1
+        return node, turn
+
+    def puct_selection(node: Node, turn: int, state: ConnectFour) -> Tuple[Node, int]:
+        while not node.is_terminal():
+            priors = prior.priors(state)
+            scale = c_puct * math.sqrt(node.visits)
+            best_score = -float("inf")
+            best_node = None
+            for child in node.children:
+                score = child.reward / child.visits + scale * priors[child.move] / (1 + child.visits)
+                if score > best_score:
+                    best_score = score
+                    best_node = child
+            best_move = None
+            if not node.fully_explored():
+                tried = node.children_move
+                for move in state.legal_moves():
+                    if move not in tried and scale * priors[move] > best_score:
+                        best_score = scale * priors[move]
+                        best_move = move
+            if best_move is not None:
+                def expand(node: Node, state: ConnectFour) -> Node:
+                    state.play(best_move)
+                    return node.add_child(state, best_move)
+                return timed_expansion(expand, stats, node, state), -1 * turn
+            node = best_node
+            state.play(node.move)
             turn *= -1
         return node, turn
 
-    def expansion(node: Node) -> Node:
-        for col in node.state.legal_moves():
+    def expansion(node: Node, state: ConnectFour) -> Node:
+        for col in state.legal_moves():
             if col not in node.children_move:
-                new_state = node.state.copy()
-                new_state.play(col)
-                node.add_child(new_state, col)
+                state.play(col)
+                node.add_child(state, col)
                 break
         return node.children[-1]
 
-    def simulation(state: ConnectFour, turn: int, max_depth: int = 20) -> float:
-        state = state.copy()
+    def simulation(state: ConnectFour, turn: int, max_depth: Optional[int] = rollout_depth) -> float:
         moves = 0
-        while not state.is_over() and moves < max_depth:
-            legal = state.legal_moves()
-            if 3 in legal:
-                state.play(3)
-            else:
-                state.play(random.choice(legal))
+        while not state.is_over() and (max_depth is None or moves < max_depth):
+            state.play(playout(state, rng))
             turn *= -1
             moves += 1
 
         if state.is_over():
             return 1.0 if turn == -1 else -1.0
+        if evaluator is not None:
+            value = evaluator.evaluate(state)
+            return value if turn == 1 else -value
         return 0.0
 
     def backpropagation(node: Node, reward: float, turn: int) -> None:
@@ -73,28 +149,113 @@ def worker_mcts(state: ConnectFour, iterations: int, exploration: float) -> Dict
                 best_node = child
         return best_node
 
-    for _ in range(iterations):
-        node, turn = selection(root, -1)
-        reward = simulation(node.state, turn)
-        backpropagation(node, reward, turn)
+    if stats is None:
+        for _ in range(iterations):
+            state = root.state.copy()
+            node, turn = selection(root, -1, state)
+            reward = simulation(state, turn)
+            if budget is not None:
+                budget.visit(node)
+            backpropagation(node, reward, turn)
+            if budget is not None:
+                budget.check(root)
+    else:
+        root_pieces = root.state.pieces
+        start = perf_counter()
+        for _ in range(iterations):
+            t0 = perf_counter()
+            expansion_before = stats.expansion_time
+            state = root.state.copy()
+            node, turn = selection(root, -1, state)
+            t1 = perf_counter()
+            depth = state.pieces - root_pieces
+            reward = simulation(state, turn)
+            t2 = perf_counter()
+            if budget is not None:
+                budget.visit(node)
+            backpropagation(node, reward, turn)
+            if budget is not None:
+                budget.check(root, stats)
+            t3 = perf_counter()
+            stats.selection_time += t1 - t0 - (stats.expansion_time - expansion_before)
+            stats.simulation_time += t2 - t1
+            stats.backprop_time += t3 - t2
+            stats.record_iteration(depth, state.pieces - root_pieces - depth)
+        stats.total_time = perf_counter() - start
 
     move_stats = {}
     for _, child in enumerate(root.children):
-        move = child.state.last_move[1]
-        move_stats[move] = (child.reward, child.visits)
+        reward, visits = reported.get(child.move, (0.0, 0))
+        if child.visits > visits:
+            move_stats[child.move] = (child.reward - reward, child.visits - visits)
+            reported[child.move] = (child.reward, child.visits)
+
+    return move_stats, stats.as_dict() if stats is not None else None
 
-    return move_stats
+
+def worker_batch(tasks: List[Tuple[ConnectFour, int, float, Optional[int]]],
+                 options: Optional[dict] = None) -> List[Dict[int, Tuple[float, int]]]:
+    """
+    Runs several small searches in one worker call, saving a round trip per search.
+    options holds extra worker_mcts keyword arguments shared by every task.
+    Returns: the move statistics of each (state, iterations, exploration, seed) task, in order
+    """
+    options = options or {}
+    return [worker_mcts(state, iterations, exploration, seed=seed, **options)[0]
+            for state, iterations, exploration, seed in tasks]
+
+
+_shared_executor = None
+
+
+def shared_executor() -> ProcessPoolExecutor:
+    """
+    Return a process pool with one worker per core, created on first use and
+    kept for the life of the program so searches do not pay the pool startup.
+    """
+    global _shared_executor
+    if _shared_executor is None:
+        _shared_executor = ProcessPoolExecutor(max_workers=max(1, os.cpu_count() or 1))
+    return _shared_executor
 
 
 class MonteCarlo:
 
 
-    def __init__(self, iteration: int = config.ITERATION, exploration: float = config.EXPLORATION, debug: bool = False):
+    def __init__(self, iteration: int = config.ITERATION, exploration: float = config.EXPLORATION, debug: bool = False,
+                 stats: bool = False, workers: Optional[int] = None, executor: Optional[Executor] = None,
+                 max_nodes: Optional[int] = config.MCTS_MAX_NODES, max_bytes: Optional[int] = config.MCTS_MAX_BYTES,
+                 eviction: str = config.EVICTION_POLICY, cache=None, evaluator=None,
+                 rollout_depth: Optional[int] = None, prior=None, c_puct: float = config.PUCT_C, playout=None,
+                 seed: Optional[int] = config.MCTS_SEED, root_policy: str = config.ROOT_POLICY):
         
         self.iteration = iteration
         self.exploration = exploration
-        self.cpu_cores = max(1, os.cpu_count() or 1)
+        self.cpu_cores = workers if workers is not None else max(1, os.cpu_count() or 1)
         self.debug = debug
+        self.collect_stats = stats
+        self.stats = None
+        self.executor = executor
+        # Each worker caps its own tree
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        # Optional PositionCache seeding the root children before each search
+        self.cache = cache
+        # Optional LinearEvaluator scoring the rollouts cut after rollout_depth moves
+        self.evaluator = evaluator
+        self.rollout_depth = rollout_depth
+        # Optional DTPrior switching the workers to PUCT selection
+        self.prior = prior
+        self.c_puct = c_puct
+        # Playout policy of the workers, a name or a picklable callable
+        self.playout = playout
+        # With a seed, every worker task gets its own seed drawn from one stream,
+        # so a search is reproducible for a given seed, position and budget
+        self.seed = seed
+        self.rng = random.Random(seed) if seed is not None else None
+        # "halving" spreads the surviving root moves of each round over the workers
+        self.root_policy = check_root_policy(root_policy)
 
         
         if self.debug:
@@ -106,18 +267,212 @@ class MonteCarlo:
 
         
 
-    def search(self, root: Node) -> tuple[Any, list[Any]]:
-        iterations_per_worker = self.iteration // self.cpu_cores
+    def search(self, root: Node, iterations: Optional[int] = None,
+               tree_key: Optional[Hashable] = None) -> tuple[Any, list[Any]]:
+        """
+        Search the best move from the root node. With a tree_key, the worker
+        processes go on growing the trees they kept under it (see worker_mcts).
+        Returns: the best move and the visit share of every root child
+        """
+        iterations = self.iteration if iterations is None else iterations
+        start = perf_counter()
+        baseline = self.cache.warm_start(root) if self.cache is not None else None
 
-        with ProcessPoolExecutor(max_workers=self.cpu_cores) as executor:
-            futures = [executor.submit(worker_mcts, root.state, iterations_per_worker, self.exploration)
-                       for _ in range(self.cpu_cores)]
+        if self.root_policy == "halving":
+            self.stats = SearchStats() if self.collect_stats else None
+            if self.executor is not None:
+                best = self.sequential_halving(root, iterations, self.executor, self.stats)
+            else:
+                with ProcessPoolExecutor(max_workers=self.cpu_cores) as executor:
+                    best = self.sequential_halving(root, iterations, executor, self.stats)
+            if self.stats is not None:
+                self.stats.total_time = perf_counter() - start
+            if self.cache is not None:
+                self.cache.record(root, baseline)
+            _, prob = self.best_move(root)
+            return best.move, prob
+
+        if self.executor is not None:
+            results = [f.result() for f in self.submit(self.executor, root.state, iterations, tree_key)]
+        else:
+            with ProcessPoolExecutor(max_workers=self.cpu_cores) as executor:
+                results = [f.result() for f in self.submit(executor, root.state, iterations, tree_key)]
+
+        if self.collect_stats:
+            self.stats = SearchStats()
+            self.add_stats(self.stats, results)
+            self.stats.total_time = perf_counter() - start
+            self.stats.overhead_time = self.stats.total_time - max(w["time"] for w in self.stats.workers)
+        else:
+            self.stats = None
+
+        self.merge(root, results)
+        if self.cache is not None:
+            self.cache.record(root, baseline)
+        return self.best_move(root)
+
+    def submit(self, executor: Executor, state: ConnectFour, iterations: int,
+               tree_key: Optional[Hashable] = None) -> List[Future]:
+        """
+        Split a budget across the workers and submit it to a process pool.
+        With a tree_key, the worker processes go on growing the trees they
+        kept under it (see worker_mcts).
+        Returns: one future per worker, each resolving to a worker_mcts result
+        """
+        iterations_per_worker = max(1, iterations // self.cpu_cores)
+        return [executor.submit(worker_mcts, state, iterations_per_worker, self.exploration, self.collect_stats,
+                                self.max_nodes, self.max_bytes, self.eviction, self.evaluator, self.rollout_depth,
+                                self.prior, self.c_puct, self.playout, self.next_seed(), tree_key)
+                for _ in range(self.cpu_cores)]
+
+    def next_seed(self) -> Optional[int]:
+        """
+        Return the seed of the next worker task, None without an engine seed.
+        """
+        return self.rng.getrandbits(64) if self.rng is not None else None
+
+    def sequential_halving(self, root: Node, iterations: int, executor: Executor,
+                           stats: Optional[SearchStats] = None) -> Node:
+        """
+        Spend the budget on the root moves by sequential halving, as in
+        MonteCarlo_Single.sequential_halving.
+
+        In every round the remaining moves are spread over the workers: each
+        move is searched by its own worker tasks rooted after the move,
+        several per move when there are fewer moves than workers, and their
+        statistics are added to the root child of the move, and their
+        search statistics to stats when given.
+        Returns: the root child of the chosen move
+        """
+        tried = root.children_move
+        for move in root.state.legal_moves():
+            if move not in tried:
+                state = root.state.copy()
+                state.play(move)
+                root.add_child(state, move)
+        candidates = list(root.children)
+        rounds = halving_rounds(len(candidates))
+        options = self.worker_options()
+        while len(candidates) > 1:
+            per_candidate = round_iterations(iterations, len(candidates), rounds)
+            tasks = max(1, self.cpu_cores // len(candidates))
+            per_task = max(1, per_candidate // tasks)
+            pending = []
+            for child in candidates:
+                state = root.state.copy()
+                state.play(child.move)
+                if state.is_over():
+                    # A winning or drawing move needs no search, its value is known
+                    reward = per_candidate if state.win != 0 else 0.0
+                    child.reward += reward
+                    child.visits += per_candidate
+                    root.visits += per_candidate
+                    continue
+                for _ in range(tasks):
+                    pending.append((child, executor.submit(worker_mcts, state, per_task, self.exploration,
+                                                           stats is not None, seed=self.next_seed(), **options)))
+            for child, future in pending:
+                move_stats, worker_stats = future.result()
+                if worker_stats is not None:
+                    stats.add_worker(worker_stats)
+                # The worker children are the opponent's replies, valued for the opponent
+                visits = sum(v for _, v in move_stats.values())
+                child.reward -= sum(r for r, _ in move_stats.values())
+                child.visits += visits
+                root.visits += visits
+            candidates = halve(candidates)
+        return candidates[0]
+
+    def worker_options(self) -> dict:
+        """
+        Return the worker_mcts keyword arguments of this engine's settings.
+        """
+        return {"max_nodes": self.max_nodes, "max_bytes": self.max_bytes, "eviction": self.eviction,
+                "evaluator": self.evaluator, "rollout_depth": self.rollout_depth, "prior": self.prior,
+                "c_puct": self.c_puct, "playout": self.playout}
 
-            all_stats = [f.result() for f in futures]
+    def search_many(self, positions: Iterable[ConnectFour], iterations: Optional[int] = None, slices: int = 1,
+                    batch: int = config.BULK_BATCH) -> Iterator[Tuple[ConnectFour, Optional[int], List[float]]]:
+        """
+        Search many positions on one process pool, yielding each result as it completes.
 
+        Every position is split into slices searched by separate workers and
+        merged at the root, as in search. Slices of several positions are
+        packed batch at a time into one pool task, and twice as many tasks as
+        workers are kept queued, so the pool never waits for the merges or
+        for the caller. Positions are read from the iterable only as the pool
+        needs them.
+
+        Parameters
+        ----------
+        positions: the positions to search
+        iterations: the budget of each position, defaults to self.iteration
+        slices: the number of workers sharing the budget of a position
+        batch: the slices per pool task
+
+        Returns
+        -------
+        iterator: (position, move, visit share of every column) tuples in
+            completion order, the move None for finished games
+        """
+        iterations = self.iteration if iterations is None else iterations
+        per_slice = max(1, iterations // slices)
+        executor = self.executor if self.executor is not None else shared_executor()
+        options = self.worker_options()
+        capacity = 2 * self.cpu_cores
+        positions = iter(positions)
+        queued = []
+        inflight = {}
+        exhausted = False
+        while True:
+            while len(inflight) < capacity:
+                while len(queued) < batch and not exhausted:
+                    state = next(positions, None)
+                    if state is None:
+                        exhausted = True
+                    elif state.is_over():
+                        yield state, None, [0.0] * config.COLUMN
+                    else:
+                        search = _BulkSearch(state, slices)
+                        if self.cache is not None:
+                            search.baseline = self.cache.warm_start(search.root)
+                        queued.extend([search] * slices)
+                if not queued:
+                    break
+                tasks, queued = queued[:batch], queued[batch:]
+                future = executor.submit(worker_batch,
+                                         [(s.state, per_slice, self.exploration, self.next_seed()) for s in tasks],
+                                         options)
+                inflight[future] = tasks
+            if not inflight:
+                return
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for future in done:
+                for search, stats in zip(inflight.pop(future), future.result()):
+                    self.merge(search.root, [(stats, None)])
+                    search.remaining -= 1
+                    if search.remaining == 0:
+                        if self.cache is not None:
+                            self.cache.record(search.root, search.baseline)
+                        yield search.result()
+
+    @staticmethod
+    def add_stats(stats: SearchStats, results: List[tuple]) -> None:
+        """
+        Add the statistics of a batch of worker results to stats.
+        """
+        for _, worker_stats in results:
+            if worker_stats is not None:
+                stats.add_worker(worker_stats)
+
+    @staticmethod
+    def merge(root: Node, results: List[tuple]) -> None:
+        """
+        Add the per-move statistics of a batch of worker results to the root children.
+        """
         merged_stats: Dict[int, Tuple[float, int]] = {}
 
-        for stat in all_stats:
+        for stat, _ in results:
             for move, (reward, visits) in stat.items():
                 if move not in merged_stats:
                     merged_stats[move] = (reward, visits)
@@ -128,7 +483,7 @@ class MonteCarlo:
         for move, (reward, visits) in merged_stats.items():
             found = False
             for child in root.children:
-                if child.state.last_move[1] == move:
+                if child.move == move:
                     child.reward += reward
                     child.visits += visits
                     found = True
@@ -136,17 +491,20 @@ class MonteCarlo:
             if not found:
                 new_state = root.state.copy()
                 new_state.play(move)
-                new_child = Node(new_state, root)
+                new_child = root.add_child(new_state, move)
                 new_child.reward = reward
                 new_child.visits = visits
-                root.children.append(new_child)
-                root.children_move.append(move)
             root.visits += visits
 
+    @staticmethod
+    def best_move(root: Node) -> tuple[Any, list[Any]]:
+        """
+        Return the most visited move of the root and the visit share of every child.
+        """
         prob = [child.visits / root.visits for child in root.children]
 
         ans = max(root.children, key=lambda c: c.visits)
-        return ans.state.last_move[1], prob
+        return ans.move, prob
 
     def best_child(self, node: Node) -> Node:
         best_score = -float("inf")
@@ -165,4 +523,22 @@ class MonteCarlo:
                 best_score = score
                 best_children = child
 
-        return best_children
\ No newline at end of file
+        return best_children
+
+
+class _BulkSearch:
+    # One position of MonteCarlo.search_many, waiting for its slices
+
+    def __init__(self, state: ConnectFour, slices: int) -> None:
+        self.state = state
+        self.root = Node(state.copy())
+        self.remaining = slices
+        self.baseline = None
+
+    def result(self) -> Tuple[ConnectFour, int, List[float]]:
+        move, _ = MonteCarlo.best_move(self.root)
+        total = sum(child.visits for child in self.root.children)
+        prob = [0.0] * config.COLUMN
+        for child in self.root.children:
+            prob[child.move] = child.visits / total
+        return self.state, move, prob
@@ -0,0 +1,315 @@
+import argparse
+import os
+import threading
+from time import perf_counter
+from typing import Callable, Iterator, List, Optional, Union
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS import MonteCarlo_Single
+from MCTS.memory import count_nodes
+from MCTS.node import Node
+from MCTS.ponder import advance
+from MCTS.serialize import TreeFile, load_tree, save_tree
+
+
+class AnalysisInfo:
+    """
+    A snapshot of a running analysis.
+
+    Attributes
+    ----------
+    iterations: the visits of the root, all analysis runs included
+    elapsed: the seconds spent analysing, all runs included
+    rate: the iterations per second of the current run
+    pv: the principal variation, following the most visited child
+    prob: the visit share of every column, 0 for unsearched columns
+    values: the mean value of every column for the side to move, from -1
+        to 1, None for unsearched columns
+    nodes: the nodes in the tree
+    done: True for the last snapshot of a run
+    """
+
+    def __init__(self, iterations: int, elapsed: float, rate: float, pv: List[int], prob: List[float],
+                 values: List[Optional[float]], nodes: int, done: bool = False) -> None:
+        self.iterations = iterations
+        self.elapsed = elapsed
+        self.rate = rate
+        self.pv = pv
+        self.prob = prob
+        self.values = values
+        self.nodes = nodes
+        self.done = done
+
+    @property
+    def move(self) -> Optional[int]:
+        return self.pv[0] if self.pv else None
+
+    def __str__(self) -> str:
+        values = " ".join("-" if v is None else f"{v:+.2f}" for v in self.values)
+        prob = " ".join(f"{p:.2f}" for p in self.prob)
+        return (f"iterations {self.iterations} it/s {self.rate:.0f} nodes {self.nodes} "
+                f"pv {' '.join(map(str, self.pv))} prob {prob} values {values}")
+
+    def __repr__(self) -> str:
+        return f"AnalysisInfo(pv={self.pv}, iterations={self.iterations}, done={self.done})"
+
+
+def principal_variation(root: Node, length: int = config.ANALYSIS_PV_LENGTH) -> List[int]:
+    """
+    Follow the most visited child from the root.
+
+    Parameters
+    ----------
+    root: the root of the search tree
+    length: the maximum number of moves
+
+    Returns
+    -------
+    list: the moves of the principal variation
+    """
+    pv = []
+    node = root
+    while node.children and len(pv) < length:
+        node = max(node.children, key=lambda c: c.visits)
+        pv.append(node.move)
+    return pv
+
+
+class Analysis:
+    """
+    Searches a position until stopped, reporting the principal variation as it goes.
+
+    The tree is kept between runs, so an analysis can be stopped and run
+    again, moved along the game with play, or saved and loaded to resume
+    it later. The default engine caps the tree at ANALYSIS_MAX_NODES nodes,
+    so an analysis left running keeps a bounded memory.
+
+    Methods
+    -------
+    run(iterations: int = None, time_limit: float = None) -> Iterator[AnalysisInfo]
+        Analyse, yielding a snapshot every interval, until stopped.
+    start(callback: Callable[[AnalysisInfo], None]) -> None
+        Run the analysis in a background thread.
+    stop() -> AnalysisInfo
+        Stop the analysis and return its last snapshot.
+    info(done: bool = False) -> AnalysisInfo
+        Return a snapshot of the analysis.
+    play(move: int) -> None
+        Move the analysis forward, keeping the subtree of the move.
+    save(path: str) -> int
+        Save the tree.
+    load(path: str, moves: list = ()) -> Analysis
+        Resume a saved analysis.
+    """
+
+    def __init__(self, root: Union[Node, ConnectFour], engine: Optional[MonteCarlo_Single] = None,
+                 max_nodes: Optional[int] = config.ANALYSIS_MAX_NODES, interval: float = config.ANALYSIS_INTERVAL,
+                 pv_length: int = config.ANALYSIS_PV_LENGTH) -> None:
+        """
+        Create an analysis.
+
+        Parameters
+        ----------
+        root: the position, or a search tree to continue
+        engine: the single-process engine used to search, as it shares the
+            tree with the caller; by default one capped at max_nodes
+        max_nodes: the tree size cap of the default engine, None for unbounded
+        interval: the seconds between two snapshots
+        pv_length: the maximum length of the principal variation
+        """
+        self.root = root if isinstance(root, Node) else Node(root.copy())
+        self.engine = engine if engine is not None else MonteCarlo_Single(max_nodes=max_nodes)
+        self.interval = interval
+        self.pv_length = pv_length
+        self.elapsed = 0.0
+        self.rate = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run(self, iterations: Optional[int] = None, time_limit: Optional[float] = None) -> Iterator[AnalysisInfo]:
+        """
+        Analyse, yielding a snapshot every interval, until stopped.
+
+        The run ends when stop is called, after iterations or time_limit if
+        given, or when the generator is closed. The last snapshot has done set.
+
+        Parameters
+        ----------
+        iterations: the iterations to add in this run, None for no limit
+        time_limit: the seconds this run may take, None for no limit
+
+        Returns
+        -------
+        iterator: the snapshots
+        """
+        self._stop.clear()
+        return self._analyse(iterations, time_limit)
+
+    def _analyse(self, iterations: Optional[int], time_limit: Optional[float]) -> Iterator[AnalysisInfo]:
+        if self.root.is_terminal():
+            yield self.info(done=True)
+            return
+        chunk = config.SEARCH_CHUNK
+        start = perf_counter()
+        last = start
+        elapsed = self.elapsed
+        done = 0
+        try:
+            while not self._stop.is_set() and (iterations is None or done < iterations):
+                now = perf_counter()
+                if time_limit is not None and now - start >= time_limit:
+                    break
+                step = chunk if iterations is None else min(chunk, iterations - done)
+                self.engine.iterate(self.root, step)
+                done += step
+                now = perf_counter()
+                self.elapsed = elapsed + now - start
+                self.rate = done / (now - start)
+                if now - last >= self.interval:
+                    last = now
+                    yield self.info()
+        finally:
+            self.elapsed = elapsed + perf_counter() - start
+        yield self.info(done=True)
+
+    def start(self, callback: Callable[[AnalysisInfo], None], iterations: Optional[int] = None,
+              time_limit: Optional[float] = None) -> None:
+        """
+        Run the analysis in a background thread.
+
+        Parameters
+        ----------
+        callback: called from the background thread with every snapshot
+        iterations: the iterations to add, None for no limit
+        time_limit: the seconds the analysis may take, None for no limit
+
+        Returns
+        -------
+        none
+        """
+        self.stop()
+        self._stop.clear()
+
+        def target() -> None:
+            for info in self._analyse(iterations, time_limit):
+                callback(info)
+
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> AnalysisInfo:
+        """
+        Stop the analysis and return its last snapshot.
+
+        Returns
+        -------
+        AnalysisInfo: the snapshot of the stopped analysis
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.info(done=True)
+
+    def info(self, done: bool = False) -> AnalysisInfo:
+        """
+        Return a snapshot of the analysis.
+
+        Parameters
+        ----------
+        done: mark the snapshot as the last one of a run
+
+        Returns
+        -------
+        AnalysisInfo: the snapshot
+        """
+        root = self.root
+        prob = [0.0] * config.COLUMN
+        values = [None] * config.COLUMN
+        total = sum(child.visits for child in root.children)
+        for child in root.children:
+            prob[child.move] = child.visits / total
+            values[child.move] = child.reward / child.visits
+        budget = self.engine.budget
+        nodes = budget.nodes if budget is not None and budget.root is root else count_nodes(root)
+        return AnalysisInfo(root.visits, self.elapsed, self.rate, principal_variation(root, self.pv_length), prob,
+                            values, nodes, done)
+
+    def play(self, move: int) -> None:
+        """
+        Move the analysis forward, keeping the subtree of the move.
+
+        Parameters
+        ----------
+        move: the column played
+
+        Returns
+        -------
+        none
+        """
+        self.stop()
+        state = self.root.state.copy()
+        state.play(move)
+        self.root = advance(self.root, state, move)
+
+    def save(self, path: str) -> int:
+        """
+        Save the tree, see MCTS.serialize.
+
+        Parameters
+        ----------
+        path: the tree file
+
+        Returns
+        -------
+        int: the number of nodes saved
+        """
+        return save_tree(self.root, path)
+
+    @classmethod
+    def load(cls, path: str, moves=(), **kwargs) -> "Analysis":
+        """
+        Resume a saved analysis.
+
+        Parameters
+        ----------
+        path: the tree file
+        moves: the columns played from the saved root to the position to analyse
+        kwargs: passed to Analysis
+
+        Returns
+        -------
+        Analysis: the analysis, a fresh one if the tree does not contain that line
+        """
+        root = load_tree(path, moves)
+        if root is None:
+            state = TreeFile(path).root_state()
+            for move in moves:
+                state.play(move)
+            root = Node(state)
+        return cls(root, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse a position until interrupted")
+    parser.add_argument("moves", nargs="*", type=int, help="the columns played from the empty board")
+    parser.add_argument("--tree", help="a tree file to resume from and save to")
+    parser.add_argument("--time", type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    if args.tree and os.path.exists(args.tree):
+        analysis = Analysis.load(args.tree, args.moves)
+    else:
+        game = ConnectFour()
+        for column in args.moves:
+            game.play(column)
+        analysis = Analysis(game)
+    try:
+        for snapshot in analysis.run(time_limit=args.time):
+            print(snapshot, flush=True)
+    except KeyboardInterrupt:
+        print(analysis.info(done=True))
+    if args.tree:
+        analysis.save(args.tree)
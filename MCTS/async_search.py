@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+import math
+import threading
+from concurrent.futures import Future, TimeoutError
+from time import perf_counter
+from typing import Callable, Optional, Union
+
+import utils.config as config
+
+from MCTS.MCTS import MonteCarlo_Single
+from MCTS.MCTS_optimized import MonteCarlo, shared_executor
+from MCTS.node import Node
+from MCTS.stats import SearchStats
+
+# Keys of the worker trees of MonteCarlo searches, one per search
+_tree_keys = itertools.count()
+
+
+class SearchProgress:
+    """
+    A snapshot of a running search.
+
+    Attributes
+    ----------
+    move: the most visited root move so far
+    prob: the visit share of every root child
+    iterations: the iterations completed so far
+    total: the iteration budget of the search
+    done: True for the last snapshot of a finished search
+    """
+
+    def __init__(self, move: int, prob: list, iterations: int, total: int, done: bool = False) -> None:
+        self.move = move
+        self.prob = prob
+        self.iterations = iterations
+        self.total = total
+        self.done = done
+
+    def __repr__(self) -> str:
+        return f"SearchProgress(move={self.move}, iterations={self.iterations}/{self.total}, done={self.done})"
+
+
+def search_in_background(engine: Union[MonteCarlo_Single, MonteCarlo], root: Node,
+                         progress: Optional[Callable[[SearchProgress], None]] = None,
+                         rounds: int = config.SEARCH_ROUNDS, stop: Optional[threading.Event] = None,
+                         time_limit: Optional[float] = None, iterations: Optional[int] = None) -> Future:
+    """
+    Start a search without blocking the caller.
+
+    The budget is searched in rounds. After every round the progress callback
+    receives the current best move, and a cancelled future stops the search.
+    Setting stop, or running out of time_limit, ends the search early but
+    still resolves the future with the best move found so far.
+    MonteCarlo rounds run on engine.executor or on the shared process pool,
+    each worker process going on with the tree it grew in the earlier rounds,
+    so the rounds search as deep as one engine.search call. A seeded
+    MonteCarlo search with an iteration budget runs in a single round, so it
+    gives the same result every time; stop and time_limit cannot end it early.
+    MonteCarlo_Single rounds run in the background thread itself.
+    An engine with the "halving" root policy plans its whole budget up
+    front, so it searches a fixed budget in one round; without an iteration
+    limit it falls back to UCB rounds.
+
+    Parameters
+    ----------
+    engine: the engine to search with
+    root: the root node of the search tree
+    progress: called from the background thread after every round
+    rounds: the number of rounds the budget is split into
+    stop: an event that ends the search early when set
+    time_limit: the maximum search time in seconds
+    iterations: the budget, defaults to engine.iteration, 0 means no
+        iteration limit and requires stop or time_limit
+
+    Returns
+    -------
+    future: resolves to the (move, prob) pair returned by engine.search,
+        future.cancel() abandons the search
+    """
+    future = Future()
+    total = engine.iteration if iterations is None else iterations
+    thread = threading.Thread(target=_drive, args=(engine, root, future, progress, rounds, total, stop, time_limit),
+                              daemon=True)
+    thread.start()
+    return future
+
+
+async def search_async(engine: Union[MonteCarlo_Single, MonteCarlo], root: Node,
+                       progress: Optional[Callable[[SearchProgress], None]] = None,
+                       rounds: int = config.SEARCH_ROUNDS) -> tuple:
+    """
+    Search as a coroutine. Cancelling the awaiting task cancels the search.
+
+    Parameters
+    ----------
+    engine: the engine to search with
+    root: the root node of the search tree
+    progress: called on the event loop after every round
+    rounds: the number of rounds the budget is split into
+
+    Returns
+    -------
+    tuple: the (move, prob) pair returned by engine.search
+    """
+    loop = asyncio.get_running_loop()
+    callback = None
+    if progress is not None:
+        def callback(snapshot: SearchProgress) -> None:
+            loop.call_soon_threadsafe(progress, snapshot)
+    return await asyncio.wrap_future(search_in_background(engine, root, callback, rounds), loop=loop)
+
+
+async def stream_search(engine: Union[MonteCarlo_Single, MonteCarlo], root: Node,
+                        rounds: int = config.SEARCH_ROUNDS):
+    """
+    Search as an async generator of SearchProgress snapshots, the last one
+    having done set. Closing the generator cancels the search.
+
+    Parameters
+    ----------
+    engine: the engine to search with
+    root: the root node of the search tree
+    rounds: the number of rounds the budget is split into
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    future = search_in_background(engine, root, lambda snapshot: loop.call_soon_threadsafe(queue.put_nowait, snapshot),
+                                  rounds)
+    try:
+        while True:
+            snapshot = await queue.get()
+            yield snapshot
+            if snapshot.done:
+                break
+        await asyncio.wrap_future(future, loop=loop)
+    finally:
+        future.cancel()
+
+
+def _drive(engine, root: Node, future: Future, progress, rounds: int, total: int, stop: Optional[threading.Event],
+           time_limit: Optional[float]) -> None:
+    # Worker trees kept across rounds depend on which process takes each task,
+    # so a seeded MonteCarlo search with a budget runs in one round of fresh trees
+    seeded = isinstance(engine, MonteCarlo) and engine.seed is not None and total > 0
+    if seeded:
+        chunk = total
+    elif total > 0 and stop is None and time_limit is None:
+        chunk = max(1, math.ceil(total / max(1, rounds)))
+    else:
+        chunk = config.SEARCH_CHUNK * (engine.cpu_cores if isinstance(engine, MonteCarlo) else 1)
+    stats = SearchStats() if engine.collect_stats else None
+    engine.stats = stats
+    start = perf_counter()
+    done = 0
+    best = None
+    tree_key = next(_tree_keys) if not seeded else None
+    try:
+        baseline = engine.cache.warm_start(root) if engine.cache is not None else None
+        if engine.root_policy == "halving" and total > 0:
+            if isinstance(engine, MonteCarlo):
+                executor = engine.executor if engine.executor is not None else shared_executor()
+                best = engine.sequential_halving(root, total, executor, stats)
+            else:
+                best = engine.sequential_halving(root, total, stats)
+            done = total
+            if progress is not None:
+                progress(SearchProgress(best.move, MonteCarlo.best_move(root)[1], done, total, True))
+        while total <= 0 or done < total:
+            if future.cancelled():
+                return
+            if done > 0 and ((stop is not None and stop.is_set()) or
+                             (time_limit is not None and perf_counter() - start >= time_limit)):
+                break
+            iterations = chunk if total <= 0 else min(chunk, total - done)
+            if isinstance(engine, MonteCarlo):
+                executor = engine.executor if engine.executor is not None else shared_executor()
+                pending = engine.submit(executor, root.state, iterations, tree_key)
+                results = []
+                for f in pending:
+                    while True:
+                        try:
+                            results.append(f.result(timeout=0.05))
+                            break
+                        except TimeoutError:
+                            if future.cancelled():
+                                for p in pending:
+                                    p.cancel()
+                                return
+                engine.merge(root, results)
+                if stats is not None:
+                    engine.add_stats(stats, results)
+            elif stats is not None:
+                engine.search_with_stats(root, stats, iterations)
+            else:
+                engine.iterate(root, iterations)
+            done += iterations
+            if progress is not None:
+                move, prob = MonteCarlo.best_move(root)
+                progress(SearchProgress(move, prob, done, total, 0 < total <= done))
+        if stats is not None:
+            stats.total_time = perf_counter() - start
+        engine.stats = stats
+        if engine.cache is not None:
+            engine.cache.record(root, baseline)
+        result = MonteCarlo.best_move(root)
+        if best is not None:
+            result = (best.move, result[1])
+        if progress is not None and not 0 < total <= done:
+            progress(SearchProgress(result[0], result[1], done, total, True))
+    except BaseException as exc:
+        if future.set_running_or_notify_cancel():
+            future.set_exception(exc)
+        return
+    if future.set_running_or_notify_cancel():
+        future.set_result(result)
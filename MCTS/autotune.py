@@ -0,0 +1,214 @@
+import json
+import os
+from time import perf_counter
+from typing import Optional, Union
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS import MonteCarlo_Single
+from MCTS.MCTS_optimized import MonteCarlo, shared_executor, worker_mcts
+from MCTS.node import Node
+
+CALIBRATION_VERSION = 2
+
+_calibration = None
+
+
+def measure_dispatch_overhead(workers: int, repeats: int = 5) -> float:
+    """
+    Measure the cost of one round of a search on the shared process pool:
+    submitting one trivial task per worker and collecting the results.
+
+    Parameters
+    ----------
+    workers: the number of worker tasks
+    repeats: the number of rounds averaged
+
+    Returns
+    -------
+    float: the overhead in seconds
+    """
+    state = ConnectFour()
+    executor = shared_executor()
+    start = perf_counter()
+    for _ in range(repeats):
+        futures = [executor.submit(worker_mcts, state, 1, config.EXPLORATION) for _ in range(workers)]
+        for f in futures:
+            f.result()
+    return (perf_counter() - start) / repeats
+
+
+def calibrate(iterations: int = config.CALIBRATION_ITERATIONS, path: Optional[str] = config.CALIBRATION_PATH,
+              debug: bool = False) -> dict:
+    """
+    Measure the engine throughput on this machine and cache it on disk.
+
+    The worker measurements run on the shared process pool that the
+    background searches use, so its startup is not part of them.
+
+    Parameters
+    ----------
+    iterations: the number of iterations each measurement runs
+    path: where to store the calibration, None to skip saving
+    debug: print the measurements
+
+    Returns
+    -------
+    dict: single-core and per-worker iterations per second and the dispatch overhead model
+    """
+    max_workers = max(1, os.cpu_count() or 1)
+    state = ConnectFour()
+
+    single = MonteCarlo_Single(iteration=iterations, stats=True)
+    single.search(Node(state.copy()))
+    single_ips = single.stats.iterations_per_second()
+
+    # Start the pool's processes before timing anything on it
+    measure_dispatch_overhead(max_workers, repeats=1)
+    overhead_one = measure_dispatch_overhead(1)
+    overhead_max = measure_dispatch_overhead(max_workers) if max_workers > 1 else overhead_one
+
+    def worker_ips(workers: int) -> float:
+        engine = MonteCarlo(iteration=iterations * workers, stats=True, workers=workers, executor=shared_executor())
+        engine.search(Node(state.copy()))
+        return sum(w["iterations_per_second"] for w in engine.stats.workers) / len(engine.stats.workers)
+
+    worker_ips_one = worker_ips(1)
+
+    calibration = {
+        "version": CALIBRATION_VERSION,
+        "cpu_count": max_workers,
+        "single_ips": single_ips,
+        "worker_ips_one": worker_ips_one,
+        "worker_ips_max": worker_ips(max_workers) if max_workers > 1 else worker_ips_one,
+        "overhead_base": overhead_one,
+        "overhead_per_worker": (overhead_max - overhead_one) / (max_workers - 1) if max_workers > 1 else 0.0,
+    }
+    if debug:
+        print(f"MCTS calibration: {calibration}")
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(calibration, f, indent=2)
+    return calibration
+
+
+def load_calibration(path: str = config.CALIBRATION_PATH) -> Optional[dict]:
+    """
+    Load a cached calibration if it was made for this machine.
+
+    Parameters
+    ----------
+    path: the calibration file
+
+    Returns
+    -------
+    dict: the calibration, or None if missing or stale
+    """
+    try:
+        with open(path) as f:
+            calibration = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if calibration.get("version") != CALIBRATION_VERSION or calibration.get("cpu_count") != (os.cpu_count() or 1):
+        return None
+    return calibration
+
+
+def get_calibration(path: str = config.CALIBRATION_PATH) -> dict:
+    """
+    Return the calibration of this machine, measuring it on first use.
+
+    Parameters
+    ----------
+    path: the calibration file
+
+    Returns
+    -------
+    dict: the calibration
+    """
+    global _calibration
+    if _calibration is None:
+        _calibration = load_calibration(path) or calibrate(path=path)
+    return _calibration
+
+
+def estimate_latency(calibration: dict, iterations: int, workers: int) -> float:
+    """
+    Estimate how long a background search takes with a given number of workers.
+
+    Workers = 0 stands for the single-process engine. The workers run on the
+    shared process pool, which is already up, so a search pays the dispatch
+    overhead of each of its SEARCH_ROUNDS rounds but no pool startup.
+    Per-worker throughput is interpolated between one worker and all cores,
+    since busy cores share caches and memory bandwidth.
+
+    Parameters
+    ----------
+    calibration: the machine calibration
+    iterations: the search budget
+    workers: the number of worker processes, 0 for MonteCarlo_Single
+
+    Returns
+    -------
+    float: the estimated latency in seconds
+    """
+    if workers == 0:
+        return iterations / calibration["single_ips"]
+    max_workers = calibration["cpu_count"]
+    share = (workers - 1) / (max_workers - 1) if max_workers > 1 else 0.0
+    worker_ips = calibration["worker_ips_one"] + share * (calibration["worker_ips_max"] - calibration["worker_ips_one"])
+    rounds = min(config.SEARCH_ROUNDS, max(1, iterations))
+    overhead = rounds * (calibration["overhead_base"] + (workers - 1) * calibration["overhead_per_worker"])
+    return overhead + (iterations / workers) / worker_ips
+
+
+def choose_workers(iterations: int, calibration: Optional[dict] = None) -> int:
+    """
+    Pick the number of workers that minimizes the estimated latency.
+
+    Parameters
+    ----------
+    iterations: the search budget
+    calibration: the machine calibration, loaded or measured if None
+
+    Returns
+    -------
+    int: the number of workers, 0 meaning the single-process engine
+    """
+    calibration = calibration if calibration is not None else get_calibration()
+    candidates = range(0, calibration["cpu_count"] + 1)
+    return min(candidates, key=lambda w: estimate_latency(calibration, iterations, w))
+
+
+def choose_engine(iterations: int, exploration: float = config.EXPLORATION, debug: bool = False, stats: bool = False,
+                  calibration: Optional[dict] = None,
+                  seed: Optional[int] = config.MCTS_SEED) -> Union[MonteCarlo_Single, MonteCarlo]:
+    """
+    Build the engine that answers a search of this size fastest on this machine.
+
+    Parameters
+    ----------
+    iterations: the search budget
+    exploration: the exploration constant
+    debug: passed to the engine
+    stats: passed to the engine
+    calibration: the machine calibration, loaded or measured if None
+    seed: the engine seed, None for an unseeded search
+
+    Returns
+    -------
+    engine: a MonteCarlo_Single or a MonteCarlo with the chosen worker count
+    """
+    workers = choose_workers(iterations, calibration)
+    if debug:
+        print(f"Auto-tuned engine: {'single process' if workers == 0 else f'{workers} workers'} for {iterations} iterations")
+    if workers == 0:
+        return MonteCarlo_Single(iteration=iterations, exploration=exploration, debug=debug, stats=stats, seed=seed)
+    return MonteCarlo(iteration=iterations, exploration=exploration, debug=debug, stats=stats, workers=workers,
+                      seed=seed)
+
+
+if __name__ == "__main__":
+    calibrate(debug=True)
@@ -0,0 +1,281 @@
+import os
+import random
+from typing import Optional, Tuple
+
+import numpy as np
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+
+
+def _build_windows() -> np.ndarray:
+    windows = []
+    for i in range(config.ROW):
+        for j in range(config.COLUMN):
+            for di, dj in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                cells = [(i + k * di, j + k * dj) for k in range(4)]
+                if all(0 <= r < config.ROW and 0 <= c < config.COLUMN for r, c in cells):
+                    windows.append([r * config.COLUMN + c for r, c in cells])
+    return np.array(windows, dtype=np.intp)
+
+
+# The 69 lines of four cells, as indices into the flattened board
+WINDOWS = _build_windows()
+_CENTER = np.array([r * config.COLUMN + config.COLUMN // 2 for r in range(config.ROW)], dtype=np.intp)
+_BELOW = np.arange(config.COLUMN, config.ROW * config.COLUMN)
+
+FEATURE_NAMES = (
+    "bias",
+    "own_1", "own_2", "own_3",
+    "opp_1", "opp_2", "opp_3",
+    "own_threats", "opp_threats",
+    "own_center", "opp_center",
+    "pieces",
+)
+
+
+def features(board: np.ndarray, turn: int) -> np.ndarray:
+    """
+    Compute the evaluation features of a position from the side to move.
+
+    own_k / opp_k count the windows of four cells holding k pieces of one
+    side and none of the other. A threat is a window with three pieces and
+    its empty cell playable right now.
+
+    Parameters
+    ----------
+    board: the 6x7 board with 1, -1 and 0
+    turn: the player to move
+
+    Returns
+    -------
+    np.ndarray: the feature vector, in FEATURE_NAMES order
+    """
+    cells = board.ravel() * turn
+    lines = cells[WINDOWS]
+    own = (lines == 1).sum(axis=1)
+    opp = (lines == -1).sum(axis=1)
+    own_only = own[opp == 0]
+    opp_only = opp[own == 0]
+
+    playable = cells == 0
+    playable[:-config.COLUMN] &= cells[_BELOW] != 0
+    open_cells = playable[WINDOWS].any(axis=1)
+
+    return np.array([
+        1.0,
+        np.count_nonzero(own_only == 1), np.count_nonzero(own_only == 2), np.count_nonzero(own_only == 3),
+        np.count_nonzero(opp_only == 1), np.count_nonzero(opp_only == 2), np.count_nonzero(opp_only == 3),
+        np.count_nonzero((own == 3) & (opp == 0) & open_cells),
+        np.count_nonzero((opp == 3) & (own == 0) & open_cells),
+        np.count_nonzero(cells[_CENTER] == 1), np.count_nonzero(cells[_CENTER] == -1),
+        np.count_nonzero(cells) / (config.ROW * config.COLUMN),
+    ], dtype=np.float64)
+
+
+class LinearEvaluator:
+    """
+    A linear value function over window and threat features.
+
+    Methods
+    -------
+    evaluate(state: ConnectFour) -> float
+        Return the value of a position for the player to move, in [-1, 1].
+    fit(X, y, ridge: float) -> LinearEvaluator
+        Fit the weights by ridge regression.
+    save(path: str) -> None
+        Save the weights.
+    load(path: str) -> LinearEvaluator
+        Load saved weights.
+    """
+
+    def __init__(self, weights: np.ndarray) -> None:
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+    def evaluate(self, state: ConnectFour) -> float:
+        """
+        Return the value of a position for the player to move.
+
+        Parameters
+        ----------
+        state: the position, finished games are scored exactly
+
+        Returns
+        -------
+        float: the value, from -1 (lost) to 1 (won)
+        """
+        if state.win != 0:
+            return 1.0 if state.win == state.turn else -1.0
+        if state.pieces == config.ROW * config.COLUMN:
+            return 0.0
+        value = float(features(state.board, state.turn) @ self.weights)
+        return max(-1.0, min(1.0, value))
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, ridge: float = 1.0) -> "LinearEvaluator":
+        """
+        Fit the weights by ridge regression.
+
+        Parameters
+        ----------
+        X: the feature rows
+        y: the outcomes for the player to move, from -1 to 1
+        ridge: the L2 penalty
+
+        Returns
+        -------
+        evaluator: the fitted evaluator
+        """
+        penalty = ridge * np.eye(X.shape[1])
+        penalty[0, 0] = 0.0
+        return cls(np.linalg.solve(X.T @ X + penalty, X.T @ y))
+
+    def save(self, path: str) -> None:
+        """
+        Save the weights.
+
+        Parameters
+        ----------
+        path: the .npz file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, weights=self.weights, features=np.array(FEATURE_NAMES))
+
+    @classmethod
+    def load(cls, path: str = config.VALUE_MODEL_PATH) -> "LinearEvaluator":
+        """
+        Load saved weights.
+
+        Parameters
+        ----------
+        path: the .npz file
+
+        Returns
+        -------
+        evaluator: the loaded evaluator
+        """
+        with np.load(path) as data:
+            if tuple(data["features"]) != FEATURE_NAMES:
+                raise ValueError(f"{path} was trained with different features")
+            return cls(data["weights"])
+
+
+def _load_csv(path: str) -> np.ndarray:
+    return np.loadtxt(path, delimiter=";", skiprows=1)
+
+
+def game_outcomes(path: str = "datasets/monte_carlo_AI_VS_AI.csv") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Label every position of recorded self-play games with the game result.
+
+    Rows hold the position before each move and the move played; a game
+    ends where the piece count goes back down, and its result is found by
+    replaying the last move.
+
+    Parameters
+    ----------
+    path: the self-play dataset
+
+    Returns
+    -------
+    X: the feature rows
+    y: the results for the player to move
+    """
+    data = _load_csv(path)
+    X, y = [], []
+    start = 0
+    for end in range(1, len(data) + 1):
+        if end < len(data) and data[end, 42] > data[end - 1, 42]:
+            continue
+        last = data[end - 1]
+        final = ConnectFour.from_board(last[:42], int(last[43]))
+        final.play(int(last[44]))
+        for row in data[start:end]:
+            turn = int(row[43])
+            X.append(features(row[:42].astype(np.int8).reshape(config.ROW, config.COLUMN), turn))
+            y.append(final.win * turn)
+        start = end
+    return np.array(X), np.array(y, dtype=np.float64)
+
+
+def rollout_outcomes(path: str = "datasets/monte_carlo_data.csv", positions: int = 3000, rollouts: int = 8,
+                     seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Label dataset positions with the mean result of random playouts.
+
+    Parameters
+    ----------
+    path: the position dataset
+    positions: the number of positions sampled
+    rollouts: the playouts per position
+    seed: the sampling seed
+
+    Returns
+    -------
+    X: the feature rows
+    y: the mean results for the player to move
+    """
+    data = _load_csv(path)
+    rng = random.Random(seed)
+    X, y = [], []
+    for row in rng.sample(list(data), min(positions, len(data))):
+        state = ConnectFour.from_board(row[:42], int(row[43]))
+        if state.is_over():
+            continue
+        total = 0
+        for _ in range(rollouts):
+            game = state.copy()
+            while not game.is_over():
+                game.play(rng.choice(game.legal_moves()))
+            total += game.win * state.turn
+        X.append(features(state.board, state.turn))
+        y.append(total / rollouts)
+    return np.array(X), np.array(y, dtype=np.float64)
+
+
+def train_evaluator(positions: int = 3000, rollouts: int = 8, ridge: float = 1.0, seed: int = 0,
+                    path: Optional[str] = config.VALUE_MODEL_PATH, debug: bool = False) -> LinearEvaluator:
+    """
+    Train the evaluator on self-play results and on playout-labelled dataset positions.
+
+    A fifth of the self-play games is held out to report how often the
+    evaluator predicts the winner.
+
+    Parameters
+    ----------
+    positions: the dataset positions labelled by playouts
+    rollouts: the playouts per position
+    ridge: the L2 penalty
+    seed: the sampling seed
+    path: where to save the weights, None to skip saving
+    debug: print the training report
+
+    Returns
+    -------
+    evaluator: the trained evaluator
+    """
+    X_games, y_games = game_outcomes()
+    X_rollouts, y_rollouts = rollout_outcomes(positions=positions, rollouts=rollouts, seed=seed)
+    held_out = np.arange(len(X_games)) >= int(0.8 * len(X_games))
+    X = np.vstack([X_games[~held_out], X_rollouts])
+    y = np.concatenate([y_games[~held_out], y_rollouts])
+    evaluator = LinearEvaluator.fit(X, y, ridge)
+
+    if debug:
+        predicted = np.clip(X_games[held_out] @ evaluator.weights, -1, 1)
+        decided = y_games[held_out] != 0
+        accuracy = np.mean(np.sign(predicted[decided]) == y_games[held_out][decided])
+        mse = np.mean((predicted - y_games[held_out]) ** 2)
+        print(f"Trained on {len(X)} positions, held-out winner accuracy {accuracy:.3f}, mse {mse:.3f}")
+        for name, weight in zip(FEATURE_NAMES, evaluator.weights):
+            print(f"  {name:12s} {weight:+.4f}")
+    if path is not None:
+        evaluator.save(path)
+    return evaluator
+
+
+if __name__ == "__main__":
+    train_evaluator(debug=True)
@@ -0,0 +1,47 @@
+import math
+from typing import List
+
+from MCTS.node import Node
+
+# "ucb" lets best_child spread the root visits, "halving" runs sequential halving at the root
+ROOT_POLICIES = ("ucb", "halving")
+
+
+def check_root_policy(policy: str) -> str:
+    """
+    Return the root policy, raising ValueError for an unknown one.
+    """
+    if policy not in ROOT_POLICIES:
+        raise ValueError(f"Unknown root policy: {policy}")
+    return policy
+
+
+def halving_rounds(candidates: int) -> int:
+    """
+    Return the number of rounds that halves candidates down to one.
+    """
+    return max(1, math.ceil(math.log2(max(1, candidates))))
+
+
+def round_iterations(iterations: int, candidates: int, rounds: int) -> int:
+    """
+    Return the iterations every candidate gets in one round: each round
+    spends an equal share of the budget, split evenly over the candidates left.
+    """
+    return max(1, iterations // (rounds * candidates))
+
+
+def halve(candidates: List[Node]) -> List[Node]:
+    """
+    Keep the better half of the candidates, rounded up, by mean reward.
+
+    Parameters
+    ----------
+    candidates: root children
+
+    Returns
+    -------
+    list: the kept candidates, best first
+    """
+    ranked = sorted(candidates, key=lambda c: (c.reward / c.visits, c.visits), reverse=True)
+    return ranked[:(len(ranked) + 1) // 2]
@@ -0,0 +1,205 @@
+import sys
+from typing import Optional
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.node import Node
+from MCTS.stats import SearchStats
+
+EVICTION_POLICIES = ("visits", "recent")
+
+_node_bytes = None
+
+
+def node_bytes() -> int:
+    """
+    Estimate the memory taken by one tree node: the node itself, its empty
+    children list, its reward float and its slot in the parent's list.
+
+    Returns
+    -------
+    int: the estimated size in bytes
+    """
+    global _node_bytes
+    if _node_bytes is None:
+        node = Node(ConnectFour())
+        _node_bytes = sys.getsizeof(node) + sys.getsizeof(node.children) + sys.getsizeof(0.5) + 8
+    return _node_bytes
+
+
+def count_nodes(root: Node) -> int:
+    """
+    Count the nodes of a tree.
+
+    Parameters
+    ----------
+    root: the root of the tree
+
+    Returns
+    -------
+    int: the number of nodes, root included
+    """
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+class TreeBudget:
+    """
+    Caps the size of a search tree by evicting subtrees.
+
+    When the tree grows past the limit, the children of the least valuable
+    nodes are dropped until the tree is back under the low-water mark. An
+    evicted node keeps its own visits and reward, which already aggregate its
+    subtree, so the search above it is unchanged and the subtree is simply
+    regrown if the search comes back to it.
+
+    Policies
+    --------
+    visits: evict the least-visited subtrees first
+    recent: evict the subtrees the search touched least recently first
+
+    Methods
+    -------
+    start(root: Node) -> None
+        Count the tree if it is not the one the budget last saw.
+    visit(leaf: Node) -> None
+        Account for the leaf reached by an iteration, before backpropagation.
+    check(root: Node, stats: SearchStats = None) -> None
+        Evict subtrees if the tree is over the limit.
+    evict(root: Node, stats: SearchStats = None) -> int
+        Evict subtrees until the tree is under the low-water mark.
+    """
+
+    def __init__(self, max_nodes: Optional[int] = None, max_bytes: Optional[int] = None,
+                 policy: str = config.EVICTION_POLICY, target: float = config.EVICTION_TARGET) -> None:
+        """
+        Create a budget.
+
+        Parameters
+        ----------
+        max_nodes: the maximum number of nodes
+        max_bytes: the maximum tree size in bytes, converted with node_bytes
+        policy: "visits" or "recent"
+        target: the fraction of the limit an eviction brings the tree down to
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        limits = [limit for limit in (max_nodes, max_bytes // node_bytes() if max_bytes else None) if limit]
+        if not limits:
+            raise ValueError("A tree budget needs max_nodes or max_bytes")
+        self.max_nodes = max(2, min(limits))
+        self.low_water = max(1, int(self.max_nodes * target))
+        self.policy = policy
+        self.root = None
+        self.nodes = 0
+        self.clock = 0
+        self.evictions = 0
+        self.evicted_nodes = 0
+
+    def visit(self, leaf: Node) -> None:
+        """
+        Account for the leaf reached by an iteration, before backpropagation.
+
+        A leaf that has not been backpropagated yet is a new node. With the
+        recent policy, the path to the leaf is stamped with the current time.
+
+        Parameters
+        ----------
+        leaf: the node returned by the selection
+
+        Returns
+        -------
+        none
+        """
+        if leaf.visits == 1:
+            self.nodes += 1
+        if self.policy == "recent":
+            self.clock += 1
+            node = leaf
+            while node is not None:
+                node.touched = self.clock
+                node = node.parent
+
+    def start(self, root: Node) -> None:
+        """
+        Count the tree if it is not the one the budget last saw.
+
+        Parameters
+        ----------
+        root: the root of the search tree
+
+        Returns
+        -------
+        none
+        """
+        if root is not self.root:
+            self.root = root
+            self.nodes = count_nodes(root)
+
+    def check(self, root: Node, stats: Optional[SearchStats] = None) -> None:
+        """
+        Evict subtrees if the tree is over the limit.
+
+        Parameters
+        ----------
+        root: the root of the search tree
+        stats: the statistics being collected, or None
+
+        Returns
+        -------
+        none
+        """
+        if self.nodes > self.max_nodes:
+            self.evict(root, stats)
+
+    def evict(self, root: Node, stats: Optional[SearchStats] = None) -> int:
+        """
+        Evict subtrees until the tree is under the low-water mark.
+
+        Candidates are sorted so a node always comes after its descendants,
+        which lets small subtrees go before the larger ones containing them.
+
+        Parameters
+        ----------
+        root: the root of the search tree, never evicted itself
+        stats: the statistics being collected, or None
+
+        Returns
+        -------
+        int: the number of nodes removed
+        """
+        candidates = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for child in node.children:
+                if child.children:
+                    candidates.append(child)
+                    stack.append(child)
+        if self.policy == "recent":
+            candidates.sort(key=lambda n: (n.touched, n.visits))
+        else:
+            candidates.sort(key=lambda n: n.visits)
+
+        removed = 0
+        evictions = 0
+        for node in candidates:
+            if self.nodes - removed <= self.low_water:
+                break
+            removed += count_nodes(node) - 1
+            node.children = []
+            evictions += 1
+
+        self.nodes -= removed
+        self.evictions += evictions
+        self.evicted_nodes += removed
+        if stats is not None:
+            stats.evictions += evictions
+            stats.evicted_nodes += removed
+        return removed
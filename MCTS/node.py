@@ -5,9 +5,13 @@ class Node:
     """
     A node for the MCTS tree.
 
+    Only the root keeps a full ConnectFour state. Every other node stores the
+    move that led to it and derives its state on demand by replaying the moves
+    from the root, so the search walks the tree with a single scratch state.
+
     Methods
     -------
-    add_child(child_state: ConnectFour, move: Optional[int] = None) -> None
+    add_child(child_state: ConnectFour, move: int) -> Node
         Add a child to the node.
     is_terminal() -> bool
         Check if the node is terminal.
@@ -15,40 +19,109 @@ class Node:
         Update the reward and visit count of the node.
     fully_explored() -> bool
         Check if all the children of the node have been explored.
+    path() -> list
+        Return the moves leading from the root to the node.
+    make_root() -> None
+        Detach the node from its parent and keep its state.
     """
 
-    def __init__(self, state: ConnectFour, parent=None) -> None:
+    __slots__ = ("visits", "reward", "move", "parent", "children", "terminal", "n_legal", "touched", "_state")
+
+    def __init__(self, state: ConnectFour, parent=None, move: Optional[int] = None) -> None:
         """
         Create a new node.
 
         Parameters
         ----------
-        state: the state of the node
+        state: the state of the node, only kept if the node is a root
         parent: the parent node of the node
+        move: the move that led to the node
         """
         self.visits = 1
         self.reward = 0.0
-        self.state = state
-        self.children = []
-        self.children_move = []
+        self.move = move
         self.parent = parent
+        self.children = []
+        self.terminal = state.is_over()
+        self.n_legal = len(state.legal_moves())
+        self.touched = 0
+        self._state = state if parent is None else None
+
+    @classmethod
+    def restore(cls, parent: "Node", move: int, visits: int, reward: float, terminal: bool, n_legal: int) -> "Node":
+        """
+        Recreate a saved child node without replaying its state.
+
+        Parameters
+        ----------
+        parent: the parent node, the child is appended to its children
+        move: the move that led to the node
+        visits: the visit count of the node
+        reward: the accumulated reward of the node
+        terminal: whether the node is a finished game
+        n_legal: the number of legal moves in the node
+
+        Returns
+        -------
+        node: the restored child
+        """
+        node = cls.__new__(cls)
+        node.visits = visits
+        node.reward = reward
+        node.move = move
+        node.parent = parent
+        node.children = []
+        node.terminal = terminal
+        node.n_legal = n_legal
+        node.touched = 0
+        node._state = None
+        parent.children.append(node)
+        return node
+
+    @property
+    def state(self) -> ConnectFour:
+        """
+        The state of the node.
+
+        The root returns its own state; any other node returns a fresh copy
+        rebuilt from the nearest ancestor that keeps a state.
+        """
+        if self._state is not None:
+            return self._state
+        moves = []
+        node = self
+        while node._state is None:
+            moves.append(node.move)
+            node = node.parent
+        state = node._state.copy()
+        for move in reversed(moves):
+            state.play(move)
+        return state
 
-    def add_child(self, child_state: ConnectFour, move: Optional[int] = None) -> None:
+    @property
+    def children_move(self) -> list:
+        """
+        The moves leading to each child, in the same order as the children.
+        """
+        return [child.move for child in self.children]
+
+    def add_child(self, child_state: ConnectFour, move: int) -> "Node":
         """
         Add a child to the node.
 
         Parameters
         ----------
-        child_state: the state of the child node
+        child_state: the state of the child node, used to flag terminal
+            positions and count legal moves but not stored
         move: the move that led to the child node
 
         Returns
         -------
-        none
+        node: the new child
         """
-        child = Node(child_state, self)
+        child = Node(child_state, self, move)
         self.children.append(child)
-        self.children_move.append(move)
+        return child
 
     def is_terminal(self) -> bool:
         """
@@ -58,7 +131,7 @@ class Node:
         -------
         bool: True if the node is terminal, False otherwise
         """
-        return self.state.is_over()
+        return self.terminal
 
     def update(self, reward: float) -> None:
         """
@@ -83,6 +156,36 @@ class Node:
         -------
         bool: True if all the children have been explored, False otherwise
         """
-        if len(self.children) == len(self.state.legal_moves()):
+        if len(self.children) == self.n_legal:
             return True
-        return False
\ No newline at end of file
+        return False
+
+    def path(self) -> list:
+        """
+        Return the moves leading from the root to the node.
+
+        Returns
+        -------
+        list: the moves, in the order they are played
+        """
+        moves = []
+        node = self
+        while node.parent is not None:
+            moves.append(node.move)
+            node = node.parent
+        moves.reverse()
+        return moves
+
+    def make_root(self) -> None:
+        """
+        Detach the node from its parent and keep its state, so the subtree
+        can be reused as a new search tree.
+
+        Returns
+        -------
+        none
+        """
+        if self.parent is None:
+            return
+        self._state = self.state
+        self.parent = None
@@ -0,0 +1,238 @@
+"""
+Playout policies for the MCTS rollouts.
+
+A playout policy is called as policy(state, rng) and returns the move to
+play, rng being the random module or a random.Random. A policy with a
+max_depth attribute stops the rollout after that many moves, the engine
+then scores the position with its evaluator, or as 0 without one.
+Policies are picked by name from PLAYOUTS with get_playout.
+"""
+import random
+from typing import Optional
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.priors import DTPrior
+
+
+_CENTER_WEIGHTS = [config.COLUMN // 2 + 1 - abs(col - config.COLUMN // 2) for col in range(config.COLUMN)]
+
+
+def uniform_playout(state: ConnectFour, rng=random) -> int:
+    """
+    Play a uniformly random legal move, the default rollout of MonteCarlo_Single.
+
+    Parameters
+    ----------
+    state: the position
+    rng: the random module or a random.Random
+
+    Returns
+    -------
+    int: the move
+    """
+    return rng.choice(state.legal_moves())
+
+
+def center_playout(state: ConnectFour, rng=random) -> int:
+    """
+    Play a random legal move, favouring the central columns 4:3:2:1.
+
+    Parameters
+    ----------
+    state: the position
+    rng: the random module or a random.Random
+
+    Returns
+    -------
+    int: the move
+    """
+    legal = state.legal_moves()
+    return rng.choices(legal, weights=[_CENTER_WEIGHTS[col] for col in legal])[0]
+
+
+def column3_playout(state: ConnectFour, rng=random) -> int:
+    """
+    Play the middle column while it is open, else a random legal move, the
+    original rollout of the MonteCarlo workers.
+
+    Parameters
+    ----------
+    state: the position
+    rng: the random module or a random.Random
+
+    Returns
+    -------
+    int: the move
+    """
+    legal = state.legal_moves()
+    if 3 in legal:
+        return 3
+    return rng.choice(legal)
+
+
+def _landing_row(board, col: int) -> int:
+    for row in range(config.ROW - 1, -1, -1):
+        if board[row][col] == 0:
+            return row
+    return -1
+
+
+def _connects(board, row: int, col: int, player: int) -> bool:
+    # Would a piece of player at (row, col) make four in a row?
+    for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        count = 1
+        for sign in (1, -1):
+            r, c = row + sign * dr, col + sign * dc
+            while 0 <= r < config.ROW and 0 <= c < config.COLUMN and board[r][c] == player:
+                count += 1
+                r += sign * dr
+                c += sign * dc
+        if count >= 4:
+            return True
+    return False
+
+
+def tactical_playout(state: ConnectFour, rng=random) -> int:
+    """
+    Play a winning move if there is one, else block the opponent's winning
+    move, else a random legal move.
+
+    Parameters
+    ----------
+    state: the position
+    rng: the random module or a random.Random
+
+    Returns
+    -------
+    int: the move
+    """
+    board = state.board.tolist()
+    legal = state.legal_moves()
+    block = None
+    for col in legal:
+        row = _landing_row(board, col)
+        if _connects(board, row, col, state.turn):
+            return col
+        if block is None and _connects(board, row, col, -state.turn):
+            block = col
+    if block is not None:
+        return block
+    return rng.choice(legal)
+
+
+class DepthCapped:
+    """
+    A playout policy cut after max_depth moves.
+    """
+
+    def __init__(self, policy, max_depth: int) -> None:
+        self.policy = policy
+        self.max_depth = max_depth
+
+    def __call__(self, state: ConnectFour, rng=random) -> int:
+        return self.policy(state, rng)
+
+    def __repr__(self) -> str:
+        return f"DepthCapped({getattr(self.policy, '__name__', self.policy)}, {self.max_depth})"
+
+
+class DTPlayout:
+    """
+    A playout policy following a decision-tree model.
+
+    With probability epsilon the move is uniformly random, otherwise it is
+    drawn from the model's prediction for the side to move (the vote shares
+    of a Bagging model). Predictions are memoized by position key, so
+    rollouts through the same positions do not run the model again.
+
+    A playout policy is called as policy(state, rng) and returns the move to
+    play; rng is the random module or a random.Random.
+
+    Attributes
+    ----------
+    hits, misses: memo hits and model calls
+    """
+
+    def __init__(self, dt_type: str = "ruleset", epsilon: float = config.DT_PLAYOUT_EPSILON,
+                 models_dir: str = "models", cache_size: int = config.PRIOR_CACHE_SIZE) -> None:
+        """
+        Load a model to play out with.
+
+        Parameters
+        ----------
+        dt_type: "id3", "ruleset" or "bagging"
+        epsilon: the probability of a uniformly random move
+        models_dir: the folder holding the pickled models
+        cache_size: the number of positions whose predictions are kept
+        """
+        self.dt_type = dt_type
+        self.epsilon = epsilon
+        self.model = DTPrior(dt_type, models_dir, uniform=0.0, cache_size=cache_size)
+
+    @property
+    def hits(self) -> int:
+        return self.model.hits
+
+    @property
+    def misses(self) -> int:
+        return self.model.misses
+
+    def __call__(self, state: ConnectFour, rng=random) -> int:
+        legal = state.legal_moves()
+        if rng.random() < self.epsilon:
+            return rng.choice(legal)
+        priors = self.model.priors(state)
+        return rng.choices(range(config.COLUMN), weights=priors)[0]
+
+    def __repr__(self) -> str:
+        return f"DTPlayout({self.dt_type!r}, epsilon={self.epsilon})"
+
+
+PLAYOUTS = {
+    "uniform": uniform_playout,
+    "center": center_playout,
+    "tactical": tactical_playout,
+    "capped": DepthCapped(uniform_playout, config.PLAYOUT_DEPTH_CAP),
+    "column3": DepthCapped(column3_playout, 20),
+}
+
+
+def get_playout(playout):
+    """
+    Resolve a playout policy.
+
+    Parameters
+    ----------
+    playout: a name from PLAYOUTS, "dt-<model>" for a DTPlayout
+        (e.g. "dt-ruleset"), a policy, or None
+
+    Returns
+    -------
+    policy: the policy, None if playout is None
+    """
+    if playout is None or callable(playout):
+        return playout
+    if playout in PLAYOUTS:
+        return PLAYOUTS[playout]
+    if playout.startswith("dt-"):
+        return _dt_playout(playout[3:])
+    raise ValueError(f"Unknown playout policy: {playout}")
+
+
+_dt_playouts = {}
+
+
+def _dt_playout(dt_type: str) -> DTPlayout:
+    # One DTPlayout per model and process, so its memo is shared by every search
+    if dt_type not in _dt_playouts:
+        _dt_playouts[dt_type] = DTPlayout(dt_type)
+    return _dt_playouts[dt_type]
+
+
+def playout_depth(playout) -> Optional[int]:
+    """
+    Return the depth a playout policy cuts rollouts at, None for no cut.
+    """
+    return getattr(playout, "max_depth", None)
@@ -0,0 +1,101 @@
+import threading
+from typing import Optional
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS import MonteCarlo_Single
+from MCTS.node import Node
+
+
+def advance(root: Optional[Node], state: ConnectFour, move: int) -> Node:
+    """
+    Move the search tree forward by one move, keeping the matching subtree.
+
+    Parameters
+    ----------
+    root: the current search tree, or None
+    state: the state after the move has been played
+    move: the move that was played
+
+    Returns
+    -------
+    node: the subtree of the move, detached as a new root, or a fresh root
+        if the move was never searched
+    """
+    if root is not None:
+        for child in root.children:
+            if child.move == move:
+                child.make_root()
+                return child
+    return Node(state.copy())
+
+
+class Ponderer:
+    """
+    Searches a position in a background thread while the opponent thinks.
+
+    Methods
+    -------
+    start(root: Node) -> None
+        Start searching the tree in the background.
+    stop() -> Node
+        Stop searching and return the tree.
+    """
+
+    def __init__(self, engine: Optional[MonteCarlo_Single] = None, batch: int = config.PONDER_BATCH,
+                 limit: int = config.PONDER_LIMIT) -> None:
+        """
+        Create a ponderer.
+
+        Parameters
+        ----------
+        engine: the single-process engine used to search, it shares the tree
+            with the caller so it must not be a process pool engine
+        batch: the number of iterations run between checks of the stop flag
+        limit: stop pondering once the root has this many visits
+        """
+        self.engine = engine if engine is not None else MonteCarlo_Single()
+        self.batch = batch
+        self.limit = limit
+        self.root = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, root: Node) -> None:
+        """
+        Start searching the tree in the background.
+
+        Parameters
+        ----------
+        root: the tree of the position the opponent has to move in
+
+        Returns
+        -------
+        none
+        """
+        self.stop()
+        self.root = root
+        if root.is_terminal():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Optional[Node]:
+        """
+        Stop searching and return the tree.
+
+        Returns
+        -------
+        node: the searched tree, or None if pondering never started
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.root
+
+    def _run(self) -> None:
+        while not self._stop.is_set() and self.root.visits < self.limit:
+            self.engine.iterate(self.root, self.batch)
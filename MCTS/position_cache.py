@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import time
+from typing import Dict, Optional, Tuple
+
+import utils.config as config
+
+from MCTS.MCTS_optimized import MonteCarlo
+from MCTS.node import Node
+
+_MOVES = range(config.COLUMN)
+_VISIT_COLUMNS = [f"visits{move}" for move in _MOVES]
+_REWARD_COLUMNS = [f"reward{move}" for move in _MOVES]
+
+
+class PositionCache:
+    """
+    A persistent cache of the root statistics of past searches, keyed by position.
+
+    Every finished search adds the visits and rewards it gave each root move
+    to the entry of its position, so a position searched again, in this game
+    or in a later one, starts from everything learned about it before.
+
+    The cache is an SQLite database in WAL mode, so several processes can
+    read and add to it at once; statistics are added inside the database,
+    so concurrent writers never overwrite each other. It keeps at most
+    max_entries positions, dropping the least recently searched ones.
+
+    Methods
+    -------
+    lookup(key: bytes) -> dict
+        Return the stored {move: (reward, visits)} of a position.
+    warm_start(root: Node) -> dict
+        Seed a new root with the stored statistics of its position.
+    record(root: Node, baseline: dict) -> None
+        Add the statistics a search gave the root moves to the cache.
+    prune() -> int
+        Drop the least recently searched positions above max_entries.
+    close() -> None
+        Close the database connection.
+    """
+
+    def __init__(self, path: str = config.POSITION_CACHE_PATH, max_entries: int = config.POSITION_CACHE_SIZE,
+                 max_prior: int = config.POSITION_CACHE_PRIOR) -> None:
+        """
+        Open or create a cache.
+
+        Parameters
+        ----------
+        path: the database file
+        max_entries: the maximum number of positions kept
+        max_prior: the maximum number of stored visits a warm start adds,
+            larger entries are scaled down so old statistics do not freeze
+            the search
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_prior = max_prior
+        self.writes = 0
+        self._connection = None
+        self._pid = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        columns = ", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in _VISIT_COLUMNS)
+        columns += ", " + ", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in _REWARD_COLUMNS)
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS positions (key BLOB PRIMARY KEY, {columns}, "
+                                    f"last_used REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS positions_last_used ON positions (last_used)")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # A connection must not cross a fork, so each process opens its own
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def lookup(self, key: bytes) -> Dict[int, Tuple[float, int]]:
+        """
+        Return the stored statistics of a position.
+
+        Parameters
+        ----------
+        key: the position key, from ConnectFour.key
+
+        Returns
+        -------
+        dict: {move: (reward, visits)} for every move searched before, empty if unknown
+        """
+        row = self.connection.execute(
+            f"SELECT {', '.join(_VISIT_COLUMNS + _REWARD_COLUMNS)} FROM positions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return {}
+        return {move: (row[config.COLUMN + move], row[move]) for move in _MOVES if row[move] > 0}
+
+    def warm_start(self, root: Node) -> Dict[int, Tuple[float, int]]:
+        """
+        Seed a new root with the stored statistics of its position.
+
+        A root that already has children, reused from an earlier search, is
+        left as it is.
+
+        Parameters
+        ----------
+        root: the root node of the search tree
+
+        Returns
+        -------
+        dict: the {move: (reward, visits)} of the root children before the
+            search, to pass to record
+        """
+        if not root.children:
+            stored = self.lookup(root.state.key())
+            total = sum(visits for _, visits in stored.values())
+            seed = {}
+            for move, (reward, visits) in stored.items():
+                seed_visits = min(visits, visits * self.max_prior // total)
+                if seed_visits > 0:
+                    seed[move] = (reward * seed_visits / visits, seed_visits)
+            if seed:
+                MonteCarlo.merge(root, [(seed, None)])
+        return {child.move: (child.reward, child.visits) for child in root.children}
+
+    def record(self, root: Node, baseline: Optional[Dict[int, Tuple[float, int]]] = None) -> None:
+        """
+        Add the statistics a search gave the root moves to the cache.
+
+        Parameters
+        ----------
+        root: the root node of the searched tree
+        baseline: the root statistics before the search, as returned by
+            warm_start, which are not counted again
+
+        Returns
+        -------
+        none
+        """
+        baseline = baseline or {}
+        visits = [0] * config.COLUMN
+        rewards = [0.0] * config.COLUMN
+        for child in root.children:
+            base_reward, base_visits = baseline.get(child.move, (0.0, 0))
+            visits[child.move] = child.visits - base_visits
+            rewards[child.move] = child.reward - base_reward
+        if not any(visits):
+            return
+        updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in _VISIT_COLUMNS + _REWARD_COLUMNS)
+        placeholders = ", ".join("?" * (2 * config.COLUMN + 2))
+        with self.connection:
+            self.connection.execute(
+                f"INSERT INTO positions (key, {', '.join(_VISIT_COLUMNS + _REWARD_COLUMNS)}, last_used) "
+                f"VALUES ({placeholders}) ON CONFLICT(key) DO UPDATE SET {updates}, last_used = excluded.last_used",
+                [root.state.key()] + visits + rewards + [time.time()])
+        self.writes += 1
+        if self.writes % config.POSITION_CACHE_PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Drop the least recently searched positions above max_entries.
+
+        Returns
+        -------
+        int: the number of positions dropped
+        """
+        with self.connection:
+            excess = len(self) - self.max_entries
+            if excess <= 0:
+                return 0
+            self.connection.execute("DELETE FROM positions WHERE key IN "
+                                    "(SELECT key FROM positions ORDER BY last_used LIMIT ?)", (excess,))
+        return excess
+
+    def close(self) -> None:
+        """
+        Close the database connection.
+        """
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
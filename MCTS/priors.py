@@ -0,0 +1,130 @@
+import contextlib
+import sys
+from collections import OrderedDict, defaultdict
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from utils.model_input import load_dt_model, model_row
+
+# Models loaded in this process, so worker processes load each one once
+_models = {}
+
+
+def _load(dt_type: str, models_dir: str):
+    if (dt_type, models_dir) not in _models:
+        # The model loaders print to stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            _models[dt_type, models_dir] = load_dt_model(dt_type, models_dir)
+    return _models[dt_type, models_dir]
+
+
+class DTPrior:
+    """
+    Move priors for PUCT selection from a pretrained decision-tree model.
+
+    The model sees the board from the side to move, as in its training data,
+    and its prediction is mixed with a uniform share over the legal moves so
+    no move is ruled out. A Bagging model spreads the prior over the votes of
+    its classifiers. Priors are cached by position key.
+
+    Pickling keeps only the model name, so a prior sent to worker processes
+    reloads the model once per process.
+
+    Methods
+    -------
+    priors(state: ConnectFour) -> list
+        Return the prior of every column in a position.
+    distribution(row: list) -> dict
+        Return the model's {column: weight} for a model input row.
+    """
+
+    def __init__(self, dt_type: str, models_dir: str = "models", uniform: float = config.PRIOR_UNIFORM,
+                 cache_size: int = config.PRIOR_CACHE_SIZE) -> None:
+        """
+        Load a model to take priors from.
+
+        Parameters
+        ----------
+        dt_type: "id3", "ruleset" or "bagging"
+        models_dir: the folder holding the pickled models
+        uniform: the share of the prior spread evenly over the legal moves
+        cache_size: the number of positions whose priors are kept
+        """
+        self.dt_type = dt_type
+        self.models_dir = models_dir
+        self.uniform = uniform
+        self.cache_size = cache_size
+        self.model, self.rules = _load(dt_type, models_dir)
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> dict:
+        return {"dt_type": self.dt_type, "models_dir": self.models_dir, "uniform": self.uniform,
+                "cache_size": self.cache_size}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    def distribution(self, row: list) -> dict:
+        """
+        Return the model's weight on each column for a model input row.
+
+        Parameters
+        ----------
+        row: the model input row
+
+        Returns
+        -------
+        dict: {column: weight}, empty if the model has no opinion
+        """
+        if self.rules is not None:
+            for rule in self.rules:
+                prediction = rule.predict(row)
+                if prediction is not None:
+                    return {prediction: 1.0}
+            return {}
+        if hasattr(self.model, "classifiers"):
+            votes = defaultdict(float)
+            for classifier in self.model.classifiers:
+                prediction, confidence = classifier.predict(row)
+                if confidence > 0:
+                    votes[prediction] += confidence
+            return dict(votes)
+        prediction, confidence = self.model.predict(row)
+        return {prediction: 1.0} if confidence > 0 else {}
+
+    def priors(self, state: ConnectFour) -> list:
+        """
+        Return the prior of every column in a position.
+
+        Parameters
+        ----------
+        state: the position
+
+        Returns
+        -------
+        list: one prior per column, 0 for full columns, summing to 1
+        """
+        key = state.key()
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return cached
+        self.misses += 1
+
+        legal = state.legal_moves()
+        weights = {move: weight for move, weight in self.distribution(model_row(state.board * state.turn)).items()
+                   if move in legal}
+        total = sum(weights.values())
+        share = self.uniform if total > 0 else 1.0
+        priors = [0.0] * config.COLUMN
+        for move in legal:
+            priors[move] = share / len(legal) + ((1.0 - share) * weights.get(move, 0.0) / total if total > 0 else 0.0)
+
+        self.cache[key] = priors
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return priors
@@ -0,0 +1,466 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS import MonteCarlo_Single
+from MCTS.node import Node
+from MCTS.server import read_message, send_message
+
+# Columns of the self-play dataset, as written by GameMain.run_ava
+HEADER = [f"cel{i}" for i in range(1, config.ROW * config.COLUMN + 1)] + ["pieces", "turn", "played"]
+
+
+def dataset_row(game: ConnectFour, move: int) -> List[int]:
+    """
+    Return the dataset row of a move: the board before it, the pieces, the turn and the move.
+    """
+    return [int(cell) for cell in game.board.ravel()] + [game.pieces, game.turn, move]
+
+
+def job_rows(job: dict) -> Iterator[List[int]]:
+    """
+    Run a job, yielding a dataset row after every searched move.
+
+    A "game" job plays random_plies random moves from its start position,
+    then self-plays the game to the end with MCTS. A "position" job searches
+    its position once.
+
+    Parameters
+    ----------
+    job: the job, as sent by the coordinator
+
+    Returns
+    -------
+    iterator: the dataset rows
+    """
+    rng = random.Random(job["seed"])
+    board = job.get("board")
+    game = ConnectFour.from_board(board, job.get("turn")) if board is not None else ConnectFour()
+    engine = MonteCarlo_Single(iteration=job["iterations"], seed=job["seed"])
+    if job["kind"] == "position":
+        move, _ = engine.search(Node(game.copy()))
+        yield dataset_row(game, move)
+        return
+    for _ in range(job.get("random_plies", 0)):
+        if game.is_over():
+            return
+        game.play(rng.choice(game.legal_moves()))
+    while not game.is_over():
+        move, _ = engine.search(Node(game.copy()))
+        yield dataset_row(game, move)
+        game.play(move)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        coordinator = self.server
+        self.connection.settimeout(coordinator.timeout)
+        worker = f"{self.client_address[0]}:{self.client_address[1]}"
+        # Rows of the jobs leased to this worker, kept until the job is done
+        leased = {}
+        try:
+            while True:
+                message = read_message(self.rfile)
+                if message is None:
+                    return
+                kind = message.get("type")
+                if kind == "hello":
+                    worker = message.get("worker", worker)
+                elif kind == "get":
+                    job = coordinator.lease(worker)
+                    if job is None:
+                        reply = {"type": "stop"} if coordinator.stopping else {"type": "wait",
+                                                                               "delay": config.SELFPLAY_POLL}
+                    else:
+                        leased[job["id"]] = []
+                        reply = dict(job, type="job")
+                    send_message(self.wfile, reply)
+                elif kind == "rows":
+                    leased[message["id"]].extend(message["rows"])
+                elif kind == "done":
+                    coordinator.complete(message["id"], leased.pop(message["id"]))
+                elif kind == "error":
+                    leased.pop(message["id"])
+                    coordinator.requeue(message["id"], message.get("error"))
+        except (OSError, ValueError, KeyError) as exc:
+            coordinator.log(f"Lost worker {worker}: {exc}")
+        finally:
+            # A worker gone before finishing its jobs: they go back in the queue
+            for job_id in leased:
+                coordinator.requeue(job_id, f"worker {worker} disconnected")
+
+
+class Coordinator(socketserver.ThreadingTCPServer):
+    """
+    Hands self-play jobs to workers over TCP and collects their dataset rows.
+
+    Workers, on this host or others, connect and ask for jobs one at a time.
+    A job's rows are streamed back in batches while it runs and kept only
+    once the job is done, so the job of a worker that crashes, disconnects
+    or stays silent for timeout seconds is put back in the queue and its
+    partial rows dropped. A job failing max_attempts times is given up.
+
+    Finished rows are appended to output in the format of
+    datasets/monte_carlo_AI_VS_AI.csv.
+
+    The protocol is one JSON object per line. Workers send
+    {"type": "hello", "worker": name}, {"type": "get"},
+    {"type": "rows", "id": job, "rows": [...]}, {"type": "done", "id": job}
+    and {"type": "error", "id": job, "error": "..."}; the coordinator answers
+    a get with {"type": "job", "id": ..., "kind": "game" or "position", ...},
+    {"type": "wait", "delay": seconds} or {"type": "stop"}.
+
+    Methods
+    -------
+    add_games(count: int, iterations: int, random_plies: int = 0, seed: int = 0) -> list
+        Queue self-play games.
+    add_positions(states: list, iterations: int, seed: int = 0) -> list
+        Queue single-position searches.
+    wait(timeout: float = None) -> bool
+        Wait until every queued job is finished or given up.
+    start() -> None
+        Serve in a background thread.
+    close() -> None
+        Tell the workers to stop and stop serving.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = config.SERVER_HOST, port: int = config.SELFPLAY_PORT, output: Optional[str] = None,
+                 timeout: float = config.SELFPLAY_TIMEOUT, max_attempts: int = config.SELFPLAY_MAX_ATTEMPTS,
+                 debug: bool = False) -> None:
+        """
+        Create a coordinator.
+
+        Parameters
+        ----------
+        host: the address to listen on, "0.0.0.0" to accept remote workers
+        port: the port to listen on, 0 for any free port
+        output: the CSV file finished rows are appended to, None to only keep them in results
+        timeout: the seconds of silence after which a worker is presumed dead
+        max_attempts: the attempts of a job before it is given up
+        debug: print job events
+        """
+        self.output = output
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.debug = debug
+        self.jobs = {}
+        self.pending = deque()
+        self.attempts = {}
+        self.results = {}
+        self.failed = {}
+        self.stopping = False
+        self.ids = itertools.count()
+        self.cond = threading.Condition()
+        self._thread = None
+        super().__init__((host, port), _Handler)
+
+    def log(self, message: str) -> None:
+        if self.debug:
+            print(message)
+
+    def _add(self, job: dict) -> int:
+        with self.cond:
+            job["id"] = next(self.ids)
+            self.jobs[job["id"]] = job
+            self.attempts[job["id"]] = 0
+            self.pending.append(job["id"])
+        return job["id"]
+
+    def add_games(self, count: int, iterations: int = config.ITERATION, random_plies: int = 0,
+                  seed: int = 0) -> List[int]:
+        """
+        Queue self-play games from the empty board.
+
+        Parameters
+        ----------
+        count: the number of games
+        iterations: the search iterations per move
+        random_plies: the random opening moves played before the search takes over
+        seed: the seed of the first game, the others following on
+
+        Returns
+        -------
+        list: the job ids
+        """
+        return [self._add({"kind": "game", "iterations": iterations, "random_plies": random_plies, "seed": seed + i})
+                for i in range(count)]
+
+    def add_positions(self, states: List[ConnectFour], iterations: int = config.ITERATION,
+                      seed: int = 0) -> List[int]:
+        """
+        Queue one search of each position.
+
+        Parameters
+        ----------
+        states: the positions
+        iterations: the search iterations
+        seed: the seed of the first search, the others following on
+
+        Returns
+        -------
+        list: the job ids
+        """
+        return [self._add({"kind": "position", "iterations": iterations, "seed": seed + i,
+                           "board": [int(cell) for cell in state.board.ravel()], "turn": state.turn})
+                for i, state in enumerate(states)]
+
+    def lease(self, worker: str) -> Optional[dict]:
+        """
+        Take the next queued job for a worker, None if the queue is empty.
+        """
+        with self.cond:
+            # A re-queued job may have been finished since by its first worker
+            while self.pending and self.pending[0] in self.results:
+                self.pending.popleft()
+            if self.stopping or not self.pending:
+                return None
+            job_id = self.pending.popleft()
+            self.attempts[job_id] += 1
+        self.log(f"Job {job_id} -> {worker} (attempt {self.attempts[job_id]})")
+        return self.jobs[job_id]
+
+    def requeue(self, job_id: int, reason: Optional[str] = None) -> None:
+        """
+        Put a job that did not finish back in the queue, or give it up after max_attempts.
+        """
+        with self.cond:
+            if job_id in self.results or job_id in self.failed:
+                return
+            if self.attempts[job_id] >= self.max_attempts:
+                self.failed[job_id] = reason
+                self.cond.notify_all()
+            else:
+                self.pending.appendleft(job_id)
+        self.log(f"Job {job_id} re-queued: {reason}")
+
+    def complete(self, job_id: int, rows: List[List[int]]) -> None:
+        """
+        Keep the rows of a finished job and append them to the output.
+        """
+        with self.cond:
+            # A job re-queued after a timeout may be finished twice
+            if job_id in self.results:
+                return
+            self.results[job_id] = rows
+            self.failed.pop(job_id, None)
+            if self.output is not None:
+                new = not os.path.exists(self.output) or os.path.getsize(self.output) == 0
+                with open(self.output, "a") as f:
+                    if new:
+                        f.write(";".join(HEADER) + "\n")
+                    for row in rows:
+                        f.write(";".join(str(x) for x in row) + "\n")
+            self.cond.notify_all()
+        self.log(f"Job {job_id} done: {len(rows)} rows")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued job is finished or given up.
+
+        Parameters
+        ----------
+        timeout: the maximum wait in seconds, None to wait for ever
+
+        Returns
+        -------
+        bool: True if every job is finished or given up
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: len(self.results) + len(self.failed) == len(self.jobs), timeout)
+
+    def start(self) -> None:
+        """
+        Serve in a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """
+        Tell the workers to stop and stop serving.
+        """
+        with self.cond:
+            self.stopping = True
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+        self.server_close()
+
+
+def run_worker(host: str = config.SERVER_HOST, port: int = config.SELFPLAY_PORT, name: Optional[str] = None,
+               batch: int = config.SELFPLAY_BATCH) -> int:
+    """
+    Run self-play jobs from a coordinator until it tells the worker to stop.
+
+    A lost connection, such as one the coordinator closed after timing the
+    worker out, is opened again after a wait that doubles from SELFPLAY_POLL
+    up to SELFPLAY_MAX_BACKOFF. The job in progress is dropped, the
+    coordinator has re-queued it. After SELFPLAY_RECONNECTS connections in a
+    row are lost without finishing a job, the worker gives up.
+
+    Parameters
+    ----------
+    host: the coordinator address
+    port: the coordinator port
+    name: the worker name reported to the coordinator
+    batch: the rows sent per message
+
+    Returns
+    -------
+    int: the number of jobs done
+    """
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    done = [0]
+    failures = 0
+    while True:
+        before = done[0]
+        try:
+            _worker_session(host, port, name, batch, done)
+            return done[0]
+        except OSError as exc:
+            # A connection that finished a job before it was lost starts the count again
+            failures = failures + 1 if done[0] == before else 1
+            if failures > config.SELFPLAY_RECONNECTS:
+                print(f"Self-play worker {name} giving up on {host}:{port} after {failures} lost connections: {exc}",
+                      file=sys.stderr)
+                return done[0]
+            time.sleep(min(config.SELFPLAY_POLL * 2 ** (failures - 1), config.SELFPLAY_MAX_BACKOFF))
+
+
+def _worker_session(host: str, port: int, name: str, batch: int, done: list) -> None:
+    # One connection of run_worker, returning when told to stop; done[0] counts the jobs done
+    with socket.create_connection((host, port)) as sock:
+        stream = sock.makefile("rwb")
+        send_message(stream, {"type": "hello", "worker": name})
+        while True:
+            send_message(stream, {"type": "get"})
+            message = read_message(stream)
+            if message is None:
+                raise ConnectionError("the coordinator closed the connection")
+            if message["type"] == "stop":
+                return
+            if message["type"] == "wait":
+                time.sleep(message["delay"])
+                continue
+            rows = []
+            try:
+                for row in job_rows(message):
+                    rows.append(row)
+                    if len(rows) >= batch:
+                        send_message(stream, {"type": "rows", "id": message["id"], "rows": rows})
+                        rows = []
+            except OSError:
+                raise
+            except Exception as exc:
+                send_message(stream, {"type": "error", "id": message["id"], "error": repr(exc)})
+                continue
+            if rows:
+                send_message(stream, {"type": "rows", "id": message["id"], "rows": rows})
+            send_message(stream, {"type": "done", "id": message["id"]})
+            done[0] += 1
+
+
+def start_workers(host: str = config.SERVER_HOST, port: int = config.SELFPLAY_PORT,
+                  processes: Optional[int] = None) -> List[multiprocessing.Process]:
+    """
+    Start worker processes on this host.
+
+    Parameters
+    ----------
+    host: the coordinator address
+    port: the coordinator port
+    processes: the number of workers, defaults to the number of cores
+
+    Returns
+    -------
+    list: the started processes
+    """
+    processes = processes if processes is not None else max(1, os.cpu_count() or 1)
+    workers = [multiprocessing.Process(target=run_worker, args=(host, port), daemon=True) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def self_play(games: int, iterations: int = config.ITERATION, processes: Optional[int] = None,
+              output: Optional[str] = None, random_plies: int = 0, seed: int = 0,
+              debug: bool = False) -> Dict[int, List[List[int]]]:
+    """
+    Self-play games with a coordinator and workers all on this host.
+
+    Parameters
+    ----------
+    games: the number of games
+    iterations: the search iterations per move
+    processes: the number of workers, defaults to the number of cores
+    output: the CSV file the rows are appended to, None to only return them
+    random_plies: the random opening moves of every game
+    seed: the seed of the first game
+    debug: print job events
+
+    Returns
+    -------
+    dict: {job id: dataset rows} of the finished games
+    """
+    coordinator = Coordinator(port=0, output=output, debug=debug)
+    coordinator.add_games(games, iterations, random_plies, seed)
+    coordinator.start()
+    workers = start_workers(config.SERVER_HOST, coordinator.server_address[1], processes)
+    try:
+        coordinator.wait()
+    finally:
+        coordinator.close()
+        for worker in workers:
+            worker.join()
+    return coordinator.results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed MCTS self-play")
+    parser.add_argument("mode", choices=["coordinator", "worker", "local"])
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SELFPLAY_PORT)
+    parser.add_argument("--processes", type=int, default=None, help="worker processes on this host")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=config.ITERATION)
+    parser.add_argument("--random-plies", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=config.SELFPLAY_OUTPUT, help="CSV file the rows are appended to")
+    args = parser.parse_args()
+
+    if args.mode == "worker":
+        workers = start_workers(args.host, args.port, args.processes)
+        for worker in workers:
+            worker.join()
+    elif args.mode == "local":
+        results = self_play(args.games, args.iterations, args.processes, args.output, args.random_plies, args.seed,
+                            debug=True)
+        print(f"{len(results)} games, {sum(len(rows) for rows in results.values())} rows saved to {args.output}")
+    else:
+        coordinator = Coordinator(args.host, args.port, args.output, debug=True)
+        coordinator.add_games(args.games, args.iterations, args.random_plies, args.seed)
+        print(f"Coordinator listening on {coordinator.server_address[0]}:{coordinator.server_address[1]}")
+        coordinator.start()
+        try:
+            coordinator.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            coordinator.close()
+        print(f"{len(coordinator.results)} games done, {len(coordinator.failed)} given up")
@@ -0,0 +1,365 @@
+import argparse
+import contextlib
+import os
+import struct
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS import MonteCarlo_Single
+from MCTS.MCTS_optimized import MonteCarlo
+from MCTS.node import Node
+
+MAGIC = b"C4MCTREE"
+FORMAT_VERSION = 1
+
+# magic, version, node count, root board cells, root turn
+_HEADER = struct.Struct(f"<8sIQ{config.ROW * config.COLUMN}sb")
+_ALIGN = 8
+
+# The arrays follow the header in this order, widest first so each one stays aligned
+_FIELDS = (
+    ("visits", np.int64),
+    ("reward", np.float64),
+    ("parent", np.int32),
+    ("first_child", np.int32),
+    ("move", np.int8),
+    ("n_children", np.int8),
+    ("terminal", np.int8),
+    ("n_legal", np.int8),
+)
+
+
+def _header_size() -> int:
+    return -(-_HEADER.size // _ALIGN) * _ALIGN
+
+
+def save_tree(root: Node, path: str) -> int:
+    """
+    Save a search tree in the compact binary format.
+
+    Nodes are written in breadth-first order, so the children of a node are
+    contiguous. Only the root board is stored, every other position is
+    implied by the moves. The file is written next to path and renamed over
+    it, so an interrupted save never leaves a broken checkpoint.
+
+    Parameters
+    ----------
+    root: the root node of the tree
+    path: the file to write
+
+    Returns
+    -------
+    int: the number of nodes saved
+    """
+    nodes = [root]
+    parent = [-1]
+    first_child = []
+    i = 0
+    while i < len(nodes):
+        first_child.append(len(nodes))
+        nodes.extend(nodes[i].children)
+        parent.extend([i] * len(nodes[i].children))
+        i += 1
+
+    count = len(nodes)
+    arrays = {
+        "visits": np.fromiter((n.visits for n in nodes), np.int64, count),
+        "reward": np.fromiter((n.reward for n in nodes), np.float64, count),
+        "parent": np.asarray(parent, dtype=np.int32),
+        "first_child": np.asarray(first_child, dtype=np.int32),
+        "move": np.fromiter((-1 if n.move is None else n.move for n in nodes), np.int8, count),
+        "n_children": np.fromiter((len(n.children) for n in nodes), np.int8, count),
+        "terminal": np.fromiter((n.terminal for n in nodes), np.int8, count),
+        "n_legal": np.fromiter((n.n_legal for n in nodes), np.int8, count),
+    }
+    state = root.state
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, count, state.board.astype(np.int8).tobytes(), state.turn)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(_header_size(), b"\0"))
+        for name, _ in _FIELDS:
+            f.write(arrays[name].tobytes())
+            f.write(b"\0" * (-f.tell() % _ALIGN))
+    os.replace(tmp_path, path)
+    return count
+
+
+class TreeFile:
+    """
+    A saved search tree, read in place from its file.
+
+    With mmap the arrays are memory mapped, so opening a large tree is
+    instant and only the pages that are read are loaded.
+
+    Attributes
+    ----------
+    visits, reward, parent, first_child, move, n_children, terminal, n_legal:
+        one entry per node, node 0 being the root
+
+    Methods
+    -------
+    root_state() -> ConnectFour
+        Return the position at the root.
+    children(index: int) -> range
+        Return the indices of the children of a node.
+    find(moves) -> int
+        Return the index of the node reached by a sequence of moves.
+    best_move(index: int = 0) -> tuple
+        Return the most visited move of a node and the visit share of its children.
+    path(index: int) -> list
+        Return the moves leading from the root to a node.
+    to_node(index: int = 0) -> Node
+        Rebuild the subtree of a node as Node objects, ready to resume the search.
+    """
+
+    def __init__(self, path: str, mmap: bool = True) -> None:
+        """
+        Open a saved tree.
+
+        Parameters
+        ----------
+        path: the tree file
+        mmap: memory map the arrays instead of reading them into memory
+        """
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"{path} is not an MCTS tree file")
+        magic, version, count, board, turn = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an MCTS tree file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+
+        self.filename = path
+        self.count = count
+        self.board = np.frombuffer(board, dtype=np.int8).reshape(config.ROW, config.COLUMN)
+        self.turn = turn
+        offset = _header_size()
+        for name, dtype in _FIELDS:
+            if mmap:
+                array = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+            else:
+                array = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+            setattr(self, name, array)
+            offset += -(-count * np.dtype(dtype).itemsize // _ALIGN) * _ALIGN
+
+    def __len__(self) -> int:
+        return self.count
+
+    def root_state(self) -> ConnectFour:
+        """
+        Return the position at the root.
+
+        Returns
+        -------
+        game: a new game in the root position
+        """
+        return ConnectFour.from_board(self.board.copy(), self.turn)
+
+    def children(self, index: int) -> range:
+        """
+        Return the indices of the children of a node.
+
+        Parameters
+        ----------
+        index: the node index
+
+        Returns
+        -------
+        range: the children indices
+        """
+        start = int(self.first_child[index])
+        return range(start, start + int(self.n_children[index]))
+
+    def find(self, moves: Sequence[int]) -> Optional[int]:
+        """
+        Return the index of the node reached by playing moves from the root.
+
+        Parameters
+        ----------
+        moves: the columns played from the root position
+
+        Returns
+        -------
+        int: the node index, or None if the tree does not contain that line
+        """
+        index = 0
+        for move in moves:
+            for child in self.children(index):
+                if self.move[child] == move:
+                    index = child
+                    break
+            else:
+                return None
+        return index
+
+    def best_move(self, index: int = 0) -> tuple:
+        """
+        Return the most visited move of a node and the visit share of its children.
+
+        Parameters
+        ----------
+        index: the node index
+
+        Returns
+        -------
+        int: the most visited move
+        list: the visit share of every child, in child order
+        """
+        children = self.children(index)
+        if not children:
+            raise ValueError("node has no children")
+        visits = self.visits[children.start:children.stop]
+        total = int(self.visits[index])
+        return int(self.move[children.start + int(np.argmax(visits))]), [int(v) / total for v in visits]
+
+    def path(self, index: int) -> list:
+        """
+        Return the moves leading from the root to a node.
+
+        Parameters
+        ----------
+        index: the node index
+
+        Returns
+        -------
+        list: the moves, in the order they are played
+        """
+        moves = []
+        while index > 0:
+            moves.append(int(self.move[index]))
+            index = int(self.parent[index])
+        moves.reverse()
+        return moves
+
+    def to_node(self, index: int = 0) -> Node:
+        """
+        Rebuild the subtree of a node as Node objects, ready to resume the search.
+
+        Parameters
+        ----------
+        index: the node index, 0 for the whole tree
+
+        Returns
+        -------
+        node: the root of the rebuilt tree, holding the position of that node
+        """
+        state = self.root_state()
+        for move in self.path(index):
+            state.play(move)
+        visits = self.visits
+        reward = self.reward
+        move = self.move
+        first_child = self.first_child
+        n_children = self.n_children
+        terminal = self.terminal
+        n_legal = self.n_legal
+
+        root = Node(state)
+        root.visits = int(visits[index])
+        root.reward = float(reward[index])
+        queue = [(index, root)]
+        while queue:
+            i, node = queue.pop()
+            start = int(first_child[i])
+            for j in range(start, start + int(n_children[i])):
+                child = Node.restore(node, int(move[j]), int(visits[j]), float(reward[j]), bool(terminal[j]),
+                                     int(n_legal[j]))
+                if n_children[j]:
+                    queue.append((j, child))
+        return root
+
+
+def load_tree(path: str, moves: Sequence[int] = (), mmap: bool = True) -> Optional[Node]:
+    """
+    Load a saved tree, or the subtree of a position inside it.
+
+    Parameters
+    ----------
+    path: the tree file
+    moves: the columns played from the saved root to the wanted position
+    mmap: memory map the file while reading it
+
+    Returns
+    -------
+    node: the root of the loaded tree, or None if the tree does not contain that line
+    """
+    tree = TreeFile(path, mmap)
+    index = tree.find(moves)
+    return None if index is None else tree.to_node(index)
+
+
+def checkpoint_search(engine: Union[MonteCarlo_Single, MonteCarlo], root: Node, path: str,
+                      iterations: Optional[int] = None, every: int = config.CHECKPOINT_EVERY) -> tuple:
+    """
+    Search while saving the tree every few iterations, so a long analysis
+    can be restarted from its last checkpoint with load_tree.
+    A MonteCarlo engine without an executor gets one process pool for the
+    whole search, and its workers go on growing their trees from one
+    checkpoint to the next, unless the engine is seeded.
+
+    Parameters
+    ----------
+    engine: the engine to search with
+    root: the root node of the search tree, possibly loaded from a checkpoint
+    path: the checkpoint file
+    iterations: the iterations to add to the tree, defaults to engine.iteration
+    every: the iterations between two saves
+
+    Returns
+    -------
+    int: the best move
+    list: the visit share of every root child
+    """
+    total = engine.iteration if iterations is None else iterations
+    if not isinstance(engine, MonteCarlo):
+        done = 0
+        while done < total:
+            step = min(every, total - done)
+            engine.iterate(root, step)
+            done += step
+            save_tree(root, path)
+        return MonteCarlo.best_move(root)
+
+    # Kept worker trees depend on which process takes each task, a seeded search starts fresh ones
+    tree_key = uuid.uuid4().hex if engine.seed is None else None
+    executor = engine.executor
+    with contextlib.ExitStack() as stack:
+        if executor is None:
+            engine.executor = stack.enter_context(ProcessPoolExecutor(max_workers=engine.cpu_cores))
+            stack.callback(setattr, engine, "executor", None)
+        done = 0
+        while done < total:
+            step = min(every, total - done)
+            engine.search(root, step, tree_key)
+            done += step
+            save_tree(root, path)
+    return MonteCarlo.best_move(root)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or extend a saved MCTS tree")
+    parser.add_argument("path", help="the tree file, resumed if it exists")
+    parser.add_argument("--iterations", type=int, default=config.ITERATION)
+    parser.add_argument("--every", type=int, default=config.CHECKPOINT_EVERY)
+    parser.add_argument("--workers", type=int, default=None, help="use the multi-process engine")
+    args = parser.parse_args()
+
+    root = load_tree(args.path) if os.path.exists(args.path) else Node(ConnectFour())
+    if args.workers:
+        engine = MonteCarlo(iteration=args.iterations, workers=args.workers)
+    else:
+        engine = MonteCarlo_Single(iteration=args.iterations)
+    move, _ = checkpoint_search(engine, root, args.path, args.iterations, args.every)
+    print(f"Saved {args.path}: {root.visits} visits, best move {move}")
@@ -0,0 +1,365 @@
+import argparse
+import itertools
+import json
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS_optimized import MonteCarlo, worker_batch
+from MCTS.node import Node
+
+
+def send_message(stream, message: dict) -> None:
+    """
+    Write one JSON message followed by a newline and flush it.
+
+    Parameters
+    ----------
+    stream: a binary file object, usually made with socket.makefile
+    message: the message to send
+    """
+    stream.write(json.dumps(message).encode() + b"\n")
+    stream.flush()
+
+
+def read_message(stream) -> Any:
+    """
+    Read one JSON message from a newline-delimited stream.
+
+    Parameters
+    ----------
+    stream: a binary file object, usually made with socket.makefile
+
+    Returns
+    -------
+    object: the decoded message, or None at end of stream
+    """
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def parse_position(message: dict) -> ConnectFour:
+    """
+    Build the position of a request and check that it can be searched.
+
+    Parameters
+    ----------
+    message: a request with a "board" (42 cells or 6 rows of 7) and an optional "turn"
+
+    Returns
+    -------
+    game: the position
+    """
+    board = message.get("board")
+    if board is None:
+        raise ValueError("missing board")
+    if not isinstance(board, list):
+        raise ValueError("board must be a list")
+    cells = [cell for row in board for cell in row] if board and isinstance(board[0], list) else list(board)
+    if len(cells) != config.ROW * config.COLUMN or any(cell not in (-1, 0, 1) for cell in cells):
+        raise ValueError(f"board must have {config.ROW * config.COLUMN} cells with values -1, 0 or 1")
+    game = ConnectFour.from_board(cells, message.get("turn"))
+    if game.is_over():
+        raise ValueError("game is over")
+    return game
+
+
+class SearchJob:
+    """
+    One search request being served, split into slices that run on the pool.
+    """
+
+    def __init__(self, state: ConnectFour, iterations: int, exploration: float, callback: Callable[[dict], None],
+                 request_id=None) -> None:
+        self.state = state
+        self.root = Node(state.copy())
+        self.total = iterations
+        self.exploration = exploration
+        self.callback = callback
+        self.request_id = request_id
+        self.assigned = 0
+        self.completed = 0
+
+    def remaining(self) -> int:
+        return self.total - self.assigned
+
+    def response(self) -> dict:
+        """
+        Return the reply of a finished job: the move and the visit share of every column.
+        """
+        move, _ = MonteCarlo.best_move(self.root)
+        probs = [0.0] * config.COLUMN
+        # The root counts a visit of its own, the shares are of the children's visits
+        total = sum(child.visits for child in self.root.children)
+        for child in self.root.children:
+            probs[child.move] = child.visits / total
+        return {"id": self.request_id, "move": move, "probs": probs, "iterations": self.completed}
+
+
+class Scheduler:
+    """
+    Runs the jobs of every client on one shared process pool.
+
+    Clients are served round robin, one slice at a time, so a long search does
+    not starve the others. Jobs whose remaining work is smaller than a slice
+    are packed together into a single pool task.
+
+    Methods
+    -------
+    submit(client, job) -> None
+        Queue a job for a client.
+    close() -> None
+        Stop scheduling and shut the pool down.
+    """
+
+    def __init__(self, workers: Optional[int] = None, slice_iterations: int = config.SERVER_SLICE,
+                 batch: int = config.SERVER_BATCH) -> None:
+        self.workers = workers if workers is not None else max(1, os.cpu_count() or 1)
+        self.slice_iterations = slice_iterations
+        self.batch = batch
+        self.capacity = 2 * self.workers
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.queues = OrderedDict()
+        self.inflight = 0
+        self.running = True
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, client, job: SearchJob) -> None:
+        """
+        Queue a job for a client.
+
+        Parameters
+        ----------
+        client: any hashable identifying the client, used for fairness
+        job: the job to run
+        """
+        with self.cond:
+            self.queues.setdefault(client, deque()).append(job)
+            self.cond.notify()
+
+    def close(self) -> None:
+        """
+        Stop scheduling and shut the pool down.
+        """
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _next_batch(self) -> List[Tuple[SearchJob, int]]:
+        batch = []
+        budget = self.slice_iterations
+        for client in list(self.queues):
+            queue = self.queues[client]
+            while queue and queue[0].remaining() == 0:
+                queue.popleft()
+            if not queue:
+                del self.queues[client]
+                continue
+            job = queue[0]
+            iterations = min(self.slice_iterations, job.remaining())
+            if batch and (iterations > budget or iterations == self.slice_iterations):
+                continue
+            job.assigned += iterations
+            batch.append((job, iterations))
+            budget -= iterations
+            self.queues.move_to_end(client)
+            if iterations == self.slice_iterations or len(batch) >= self.batch or budget <= 0:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                batch = []
+                while self.running:
+                    if self.inflight < self.capacity:
+                        batch = self._next_batch()
+                        if batch:
+                            break
+                    self.cond.wait()
+                if not self.running:
+                    return
+                self.inflight += 1
+            tasks = [(job.state, iterations, job.exploration, None) for job, iterations in batch]
+            future = self.executor.submit(worker_batch, tasks)
+            future.add_done_callback(lambda f, batch=batch: self._complete(batch, f))
+
+    def _complete(self, batch: List[Tuple[SearchJob, int]], future) -> None:
+        finished = []
+        with self.cond:
+            self.inflight -= 1
+            self.cond.notify()
+            error = future.exception() if not future.cancelled() else RuntimeError("cancelled")
+            for i, (job, iterations) in enumerate(batch):
+                if error is None:
+                    MonteCarlo.merge(job.root, [(future.result()[i], None)])
+                job.completed += iterations
+                if job.completed >= job.total:
+                    finished.append(job)
+        for job in finished:
+            if error is None:
+                job.callback(job.response())
+            else:
+                job.callback({"id": job.request_id, "error": str(error)})
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        lock = threading.Lock()
+
+        def reply(message: dict) -> None:
+            with lock:
+                try:
+                    send_message(self.wfile, message)
+                except OSError:
+                    pass
+
+        client = next(self.server.client_ids)
+        while True:
+            try:
+                message = read_message(self.rfile)
+            except ValueError as exc:
+                reply({"error": f"invalid json: {exc}"})
+                continue
+            if message is None:
+                return
+            if not isinstance(message, dict):
+                reply({"error": "a request must be a JSON object"})
+                continue
+            try:
+                state = parse_position(message)
+                iterations = int(message.get("iterations", config.ITERATION))
+                if iterations < 1:
+                    raise ValueError("iterations must be positive")
+                exploration = float(message.get("exploration", config.EXPLORATION))
+            except (TypeError, ValueError) as exc:
+                reply({"id": message.get("id"), "error": str(exc)})
+                continue
+            self.server.scheduler.submit(client, SearchJob(state, iterations, exploration, reply, message.get("id")))
+
+
+class EngineServer(socketserver.ThreadingTCPServer):
+    """
+    A local engine server answering JSON search requests from many clients.
+
+    Each request is one line of JSON:
+        {"id": 1, "board": [42 cells], "turn": 1, "iterations": 5000}
+    and each reply is one line of JSON with the same id:
+        {"id": 1, "move": 3, "probs": [7 visit shares], "iterations": 5000}
+    or {"id": 1, "error": "..."}. A connection may send several requests
+    without waiting, replies then come back as searches finish.
+
+    Methods
+    -------
+    start() -> None
+        Serve in a background thread.
+    close() -> None
+        Stop serving and shut the worker pool down.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = config.SERVER_HOST, port: int = config.SERVER_PORT, workers: Optional[int] = None,
+                 slice_iterations: int = config.SERVER_SLICE, batch: int = config.SERVER_BATCH) -> None:
+        self.scheduler = Scheduler(workers, slice_iterations, batch)
+        self.client_ids = itertools.count()
+        self._thread = None
+        super().__init__((host, port), _Handler)
+
+    def start(self) -> None:
+        """
+        Serve in a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """
+        Stop serving and shut the worker pool down.
+        """
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+        self.server_close()
+        self.scheduler.close()
+
+
+class EngineClient:
+    """
+    A blocking client for EngineServer.
+
+    Methods
+    -------
+    search(board, iterations: int, turn: int = None) -> dict
+        Ask the server for a move.
+    close() -> None
+        Close the connection.
+    """
+
+    def __init__(self, host: str = config.SERVER_HOST, port: int = config.SERVER_PORT, timeout: Optional[float] = None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.stream = self.sock.makefile("rwb")
+        self.ids = itertools.count()
+
+    def search(self, board, iterations: int = config.ITERATION, turn: Optional[int] = None) -> dict:
+        """
+        Ask the server for a move.
+
+        Parameters
+        ----------
+        board: the 6x7 board or its 42 cells
+        iterations: the search budget
+        turn: the player to move, inferred by the server if None
+
+        Returns
+        -------
+        dict: the reply, with "move" and "probs" or with "error"
+        """
+        board = board.tolist() if hasattr(board, "tolist") else board
+        send_message(self.stream, {"id": next(self.ids), "board": board, "turn": turn, "iterations": iterations})
+        return read_message(self.stream)
+
+    def close(self) -> None:
+        """
+        Close the connection.
+        """
+        self.stream.close()
+        self.sock.close()
+
+    def __enter__(self) -> "EngineClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Connect Four MCTS engine server")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    server = EngineServer(args.host, args.port, args.workers)
+    print(f"Engine server listening on {server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.scheduler.close()
@@ -0,0 +1,343 @@
+import math
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS_optimized import MonteCarlo
+from MCTS.node import Node
+
+_COLUMNS = config.COLUMN
+
+
+class TreeArena:
+    """
+    An MCTS tree stored in shared memory, so several processes search one tree.
+
+    Nodes are indices into flat arrays of visits, rewards, virtual losses,
+    child indices (one slot per column, -1 for none) and expansion flags.
+    Node 0 is the root. As in Node, a node's reward is its value for the
+    player who moved into it, and states are not stored but replayed from
+    the root. New nodes are taken from a shared counter.
+
+    Updates to a node are made under one of a small set of striped locks,
+    chosen by the node index; reads are not locked. The node counter has a
+    lock of its own, as it is taken while a node's lock is held.
+    """
+
+    _META = 1
+
+    def __init__(self, capacity: int = config.SHARED_TREE_NODES, name: Optional[str] = None,
+                 locks: Optional[list] = None, alloc_lock=None) -> None:
+        """
+        Create an arena, or attach to an existing one by name.
+
+        Parameters
+        ----------
+        capacity: the maximum number of nodes
+        name: the shared memory block of an existing arena, None to create one
+        locks: the striped locks, created if None
+        alloc_lock: the lock of the node counter, created if None
+        """
+        self.capacity = capacity
+        sizes = [("meta", "q", 8, self._META), ("visits", "q", 8, capacity), ("reward", "d", 8, capacity),
+                 ("virtual", "i", 4, capacity), ("children", "i", 4, capacity * _COLUMNS),
+                 ("expanded", "b", 1, capacity)]
+        total = sum(-(-size * count // 8) * 8 for _, _, size, count in sizes)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=total)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        offset = 0
+        for field, code, size, count in sizes:
+            length = -(-size * count // 8) * 8
+            setattr(self, field, self.shm.buf[offset:offset + size * count].cast(code))
+            offset += length
+        self.locks = locks if locks is not None else [multiprocessing.Lock()
+                                                      for _ in range(config.SHARED_TREE_LOCKS)]
+        self.alloc_lock = alloc_lock if alloc_lock is not None else multiprocessing.Lock()
+        if self.owner:
+            self.reset()
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def nodes(self) -> int:
+        return self.meta[0]
+
+    def reset(self) -> None:
+        """
+        Empty the tree, leaving an unexpanded root.
+        """
+        self.meta[0] = 1
+        self._init_node(0)
+
+    def _init_node(self, index: int) -> None:
+        self.visits[index] = 0
+        self.reward[index] = 0.0
+        self.virtual[index] = 0
+        self.expanded[index] = 0
+        base = index * _COLUMNS
+        for col in range(_COLUMNS):
+            self.children[base + col] = -1
+
+    def allocate(self, count: int) -> int:
+        """
+        Take count consecutive new nodes.
+
+        Returns
+        -------
+        int: the index of the first node, -1 if the arena is full
+        """
+        with self.alloc_lock:
+            first = self.meta[0]
+            if first + count > self.capacity:
+                return -1
+            self.meta[0] = first + count
+        for index in range(first, first + count):
+            self._init_node(index)
+        return first
+
+    def root_stats(self) -> Dict[int, Tuple[float, int]]:
+        """
+        Return the {move: (reward, visits)} of the searched root children.
+        """
+        stats = {}
+        for move in range(_COLUMNS):
+            child = self.children[move]
+            if child >= 0 and self.visits[child] > 0:
+                stats[move] = (self.reward[child], self.visits[child])
+        return stats
+
+    def close(self) -> None:
+        """
+        Release the arena, freeing the shared memory if this process created it.
+        """
+        for field in ("meta", "visits", "reward", "virtual", "children", "expanded"):
+            getattr(self, field).release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# The arena of this worker process, attached by the pool initializer
+_arena = None
+
+
+def _attach(name: str, capacity: int, locks: list, alloc_lock) -> None:
+    global _arena
+    _arena = TreeArena(capacity, name, locks, alloc_lock)
+
+
+def shared_worker(state: ConnectFour, iterations: int, exploration: float,
+                  virtual_loss: float = config.VIRTUAL_LOSS, seed: Optional[int] = None) -> int:
+    """
+    Run search iterations on the shared tree of this worker process.
+
+    Every child chosen on the way down takes a virtual loss until its
+    rollout is backpropagated, so concurrent workers spread over different
+    lines instead of all descending the same one.
+
+    Parameters
+    ----------
+    state: the root position
+    iterations: the number of iterations to run
+    exploration: the UCT exploration constant
+    virtual_loss: the reward taken off a node per worker inside it
+    seed: the seed of the worker's random stream, None for fresh entropy
+
+    Returns
+    -------
+    int: the iterations run
+    """
+    arena = _arena
+    rng = random.Random(seed)
+    visits, reward, virtual, children, expanded = (arena.visits, arena.reward, arena.virtual, arena.children,
+                                                   arena.expanded)
+    locks = arena.locks
+    stripes = len(locks)
+    for _ in range(iterations):
+        game = state.copy()
+        node = 0
+        path = []
+        while not game.is_over():
+            if not expanded[node]:
+                with locks[node % stripes]:
+                    if not expanded[node]:
+                        legal = game.legal_moves()
+                        first = arena.allocate(len(legal))
+                        if first >= 0:
+                            for i, move in enumerate(legal):
+                                children[node * _COLUMNS + move] = first + i
+                            expanded[node] = 1
+                if not expanded[node]:
+                    # The arena is full, the rollout starts here
+                    break
+
+            base = node * _COLUMNS
+            log_visits = math.log(visits[node] + virtual[node] + 1)
+            best_score = -float("inf")
+            best = best_move = -1
+            unvisited = []
+            for move in range(_COLUMNS):
+                child = children[base + move]
+                if child < 0:
+                    continue
+                n = visits[child] + virtual[child]
+                if n == 0:
+                    unvisited.append((child, move))
+                    continue
+                score = (reward[child] - virtual_loss * virtual[child]) / n + \
+                    exploration * math.sqrt(log_visits / n)
+                if score > best_score:
+                    best_score = score
+                    best = child
+                    best_move = move
+            if unvisited:
+                # Unvisited children come first, in random order
+                best, best_move = rng.choice(unvisited)
+            with locks[best % stripes]:
+                virtual[best] += 1
+                fresh = visits[best] == 0
+            path.append((best, game.turn))
+            game.play(best_move)
+            node = best
+            if fresh:
+                break
+
+        while not game.is_over():
+            game.play(rng.choice(game.legal_moves()))
+        winner = game.win
+
+        with locks[0]:
+            visits[0] += 1
+        for index, mover in path:
+            with locks[index % stripes]:
+                visits[index] += 1
+                virtual[index] -= 1
+                if winner == mover:
+                    reward[index] += 1.0
+                elif winner == -mover:
+                    reward[index] -= 1.0
+    return iterations
+
+
+class SharedTreeMCTS:
+    """
+    Tree-parallel MCTS: worker processes search one tree held in shared memory.
+
+    Where MonteCarlo grows a separate shallow tree per worker and merges
+    only their root statistics, here every worker descends, expands and
+    updates the same tree (see TreeArena and shared_worker), so all cores
+    build one deeper tree. The tree is kept between calls on the same root,
+    so iterate can run a search in rounds.
+
+    Methods
+    -------
+    search(root: Node, iterations: Optional[int] = None) -> (int, list)
+        Search the best move from the root node.
+    iterate(root: Node, iterations: int) -> None
+        Run search iterations and copy the root statistics to root.
+    close() -> None
+        Shut the workers down and free the shared memory.
+    """
+
+    def __init__(self, iteration: int = config.ITERATION, exploration: float = config.EXPLORATION,
+                 workers: Optional[int] = None, capacity: int = config.SHARED_TREE_NODES,
+                 virtual_loss: float = config.VIRTUAL_LOSS, seed: Optional[int] = config.MCTS_SEED) -> None:
+        """
+        Create the shared tree and its worker processes.
+
+        Parameters
+        ----------
+        iteration: the default search budget
+        exploration: the UCT exploration constant
+        workers: the number of worker processes, defaults to the number of cores
+        capacity: the maximum number of tree nodes
+        virtual_loss: the reward taken off a node per worker inside it
+        seed: the engine seed; worker streams are drawn from it
+        """
+        self.iteration = iteration
+        self.exploration = exploration
+        self.cpu_cores = workers if workers is not None else max(1, os.cpu_count() or 1)
+        self.virtual_loss = virtual_loss
+        self.rng = random.Random(seed) if seed is not None else None
+        # Attributes the background search and the callers of the other engines expect
+        self.collect_stats = False
+        self.stats = None
+        self.cache = None
+        self.root_policy = "ucb"
+        self.arena = TreeArena(capacity)
+        self.executor = ProcessPoolExecutor(max_workers=self.cpu_cores, initializer=_attach,
+                                            initargs=(self.arena.name, capacity, self.arena.locks,
+                                                      self.arena.alloc_lock))
+        self._root = None
+
+    def iterate(self, root: Node, iterations: int) -> None:
+        """
+        Run search iterations and copy the root statistics to root.
+
+        Parameters
+        ----------
+        root: the root node, the shared tree is reset when it changes
+        iterations: the number of iterations, split over the workers
+
+        Returns
+        -------
+        none
+        """
+        if root is not self._root:
+            self.arena.reset()
+            self._root = root
+        per_worker = max(1, iterations // self.cpu_cores)
+        futures = [self.executor.submit(shared_worker, root.state, per_worker, self.exploration, self.virtual_loss,
+                                        self.rng.getrandbits(64) if self.rng is not None else None)
+                   for _ in range(self.cpu_cores)]
+        for future in futures:
+            future.result()
+        stats = self.arena.root_stats()
+        for child in root.children:
+            if child.move in stats:
+                child.reward, child.visits = stats.pop(child.move)
+        if stats:
+            MonteCarlo.merge(root, [(stats, None)])
+        root.visits = self.arena.visits[0] + 1
+
+    def search(self, root: Node, iterations: Optional[int] = None) -> tuple[Any, list[Any]]:
+        """
+        Search the best move from the root node.
+
+        Parameters
+        ----------
+        root: the root node of the search tree
+        iterations: the number of iterations to run, defaults to self.iteration
+
+        Returns
+        -------
+        int: the best move
+        list: the visit share of every root child
+        """
+        self.iterate(root, self.iteration if iterations is None else iterations)
+        return MonteCarlo.best_move(root)
+
+    def close(self) -> None:
+        """
+        Shut the workers down and free the shared memory.
+        """
+        self.executor.shutdown(wait=True)
+        self.arena.close()
+
+    def __enter__(self) -> "SharedTreeMCTS":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,176 @@
+from time import perf_counter
+from typing import Optional
+
+
+class SearchStats:
+    """
+    Statistics collected by an MCTS engine during one search.
+
+    Phase times are accumulated with time.perf_counter, so collecting them
+    costs a handful of clock reads per iteration.
+
+    Methods
+    -------
+    record_iteration(depth: int, rollout_length: int) -> None
+        Record the depth reached and the rollout length of one iteration.
+    add_worker(worker: dict) -> None
+        Merge the statistics returned by a worker process.
+    iterations_per_second() -> float
+        Return the search throughput.
+    as_dict() -> dict
+        Return the statistics as a plain dictionary.
+    """
+
+    def __init__(self) -> None:
+        """
+        Create an empty statistics object.
+        """
+        self.selection_time = 0.0
+        self.expansion_time = 0.0
+        self.simulation_time = 0.0
+        self.backprop_time = 0.0
+        self.total_time = 0.0
+        self.overhead_time = 0.0
+        self.iterations = 0
+        self.nodes_allocated = 0
+        self.max_depth = 0
+        self.depth_sum = 0
+        self.rollout_sum = 0
+        self.evictions = 0
+        self.evicted_nodes = 0
+        self.workers = []
+
+    def record_iteration(self, depth: int, rollout_length: int) -> None:
+        """
+        Record the depth reached and the rollout length of one iteration.
+
+        Parameters
+        ----------
+        depth: the depth of the node the rollout started from
+        rollout_length: the number of moves played in the rollout
+
+        Returns
+        -------
+        none
+        """
+        self.iterations += 1
+        self.depth_sum += depth
+        self.rollout_sum += rollout_length
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def add_worker(self, worker: dict) -> None:
+        """
+        Merge the statistics returned by a worker process.
+
+        Parameters
+        ----------
+        worker: the dictionary returned by SearchStats.as_dict in the worker
+
+        Returns
+        -------
+        none
+        """
+        self.selection_time += worker["selection_time"]
+        self.expansion_time += worker["expansion_time"]
+        self.simulation_time += worker["simulation_time"]
+        self.backprop_time += worker["backprop_time"]
+        self.iterations += worker["iterations"]
+        self.nodes_allocated += worker["nodes_allocated"]
+        self.depth_sum += worker["depth_sum"]
+        self.rollout_sum += worker["rollout_sum"]
+        self.evictions += worker["evictions"]
+        self.evicted_nodes += worker["evicted_nodes"]
+        self.max_depth = max(self.max_depth, worker["max_depth"])
+        self.workers.append({
+            "iterations": worker["iterations"],
+            "time": worker["total_time"],
+            "iterations_per_second": worker["iterations_per_second"],
+        })
+
+    def iterations_per_second(self) -> float:
+        """
+        Return the search throughput.
+
+        Returns
+        -------
+        float: iterations per second of wall time
+        """
+        if self.total_time <= 0:
+            return 0.0
+        return self.iterations / self.total_time
+
+    @property
+    def avg_depth(self) -> float:
+        return self.depth_sum / self.iterations if self.iterations else 0.0
+
+    @property
+    def avg_rollout_length(self) -> float:
+        return self.rollout_sum / self.iterations if self.iterations else 0.0
+
+    def as_dict(self) -> dict:
+        """
+        Return the statistics as a plain dictionary.
+
+        Returns
+        -------
+        dict: every counter plus the derived averages and throughput
+        """
+        return {
+            "selection_time": self.selection_time,
+            "expansion_time": self.expansion_time,
+            "simulation_time": self.simulation_time,
+            "backprop_time": self.backprop_time,
+            "total_time": self.total_time,
+            "overhead_time": self.overhead_time,
+            "iterations": self.iterations,
+            "iterations_per_second": self.iterations_per_second(),
+            "nodes_allocated": self.nodes_allocated,
+            "max_depth": self.max_depth,
+            "avg_depth": self.avg_depth,
+            "depth_sum": self.depth_sum,
+            "avg_rollout_length": self.avg_rollout_length,
+            "rollout_sum": self.rollout_sum,
+            "evictions": self.evictions,
+            "evicted_nodes": self.evicted_nodes,
+            "workers": list(self.workers),
+        }
+
+    def __repr__(self) -> str:
+        text = (f"SearchStats(iterations={self.iterations}, time={self.total_time:.3f}s, "
+                f"it/s={self.iterations_per_second():.0f}, selection={self.selection_time:.3f}s, "
+                f"expansion={self.expansion_time:.3f}s, simulation={self.simulation_time:.3f}s, "
+                f"backprop={self.backprop_time:.3f}s, nodes={self.nodes_allocated}, "
+                f"max_depth={self.max_depth}, avg_depth={self.avg_depth:.2f}, "
+                f"avg_rollout={self.avg_rollout_length:.2f}")
+        if self.evictions:
+            text += f", evictions={self.evictions}, evicted_nodes={self.evicted_nodes}"
+        if self.workers:
+            text += f", overhead={self.overhead_time:.3f}s"
+            rates = ", ".join(f"{w['iterations_per_second']:.0f}" for w in self.workers)
+            text += f", worker_it/s=[{rates}]"
+        return text + ")"
+
+
+def timed_expansion(expansion, stats: Optional[SearchStats], node, state):
+    """
+    Run an expansion step, charging its time to stats when given.
+
+    Parameters
+    ----------
+    expansion: the expansion function of the engine
+    stats: the statistics being collected, or None
+    node: the node to expand
+    state: the scratch state of the node
+
+    Returns
+    -------
+    node: the new child
+    """
+    if stats is None:
+        return expansion(node, state)
+    start = perf_counter()
+    child = expansion(node, state)
+    stats.expansion_time += perf_counter() - start
+    stats.nodes_allocated += 1
+    return child
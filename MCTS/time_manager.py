@@ -0,0 +1,169 @@
+import math
+import threading
+from concurrent.futures import Future
+from time import perf_counter
+from typing import Union
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS import MonteCarlo_Single
+from MCTS.MCTS_optimized import MonteCarlo
+from MCTS.async_search import SearchProgress, search_in_background
+from MCTS.node import Node
+
+
+def complexity(state: ConnectFour) -> float:
+    """
+    Estimate how much thinking a position deserves, 1 for an average one.
+
+    The opening and the last moves are easier than the middlegame, and
+    positions with fewer legal moves need less search.
+
+    Parameters
+    ----------
+    state: the position
+
+    Returns
+    -------
+    float: the weight of the position
+    """
+    pieces = state.pieces
+    if pieces < config.TM_OPENING_PIECES:
+        phase = config.TM_OPENING_WEIGHT
+    elif pieces >= config.TM_ENDGAME_PIECES:
+        phase = config.TM_ENDGAME_WEIGHT
+    else:
+        phase = config.TM_MIDDLEGAME_WEIGHT
+    return phase * len(state.legal_moves()) / config.COLUMN
+
+
+class TimeManager:
+    """
+    Splits a game clock into per-move search times.
+
+    Each move gets the remaining clock divided by the moves still expected,
+    weighted by the complexity of the position. A forced move is played at
+    once. While the search runs, a move that stays clearly best ends it at
+    half its time, and each change of the best move extends it, up to
+    TM_EXTEND times the target. Time saved on easy moves stays on the clock
+    for the harder ones.
+
+    Methods
+    -------
+    allocate(state: ConnectFour) -> (float, float)
+        Return the target and maximum search time of a move.
+    think(engine, root: Node) -> Future
+        Search a move under the clock in the background.
+    new_game() -> None
+        Reset the clock.
+    """
+
+    def __init__(self, game_time: float = config.GAME_TIME, increment: float = 0.0,
+                 min_time: float = config.TM_MIN_MOVE_TIME) -> None:
+        """
+        Create a clock.
+
+        Parameters
+        ----------
+        game_time: the thinking time of one side for the whole game, in seconds
+        increment: the seconds added to the clock after every move
+        min_time: the shortest search of a move that is not forced
+        """
+        self.game_time = game_time
+        self.increment = increment
+        self.min_time = min_time
+        self.remaining = game_time
+        self.used = []
+        self.flips = 0
+
+    def new_game(self) -> None:
+        """
+        Reset the clock.
+        """
+        self.remaining = self.game_time
+        self.used = []
+        self.flips = 0
+
+    def allocate(self, state: ConnectFour) -> tuple:
+        """
+        Return the target and maximum search time of a move.
+
+        Parameters
+        ----------
+        state: the position to move in
+
+        Returns
+        -------
+        float: the target time, 0 for a forced move
+        float: the longest the search may take
+        """
+        if len(state.legal_moves()) <= 1:
+            return 0.0, 0.0
+        # The side to move plays at most half of the empty cells, fewer as games rarely fill the board
+        moves_left = max(config.TM_MIN_MOVES_LEFT,
+                         math.ceil((config.ROW * config.COLUMN - state.pieces) / 2) * config.TM_MOVES_LEFT_SHARE)
+        ceiling = max(self.min_time, self.remaining * config.TM_MAX_SHARE)
+        target = min(ceiling, max(self.min_time, self.remaining / moves_left * complexity(state)))
+        return target, min(ceiling, target * config.TM_EXTEND)
+
+    def think(self, engine: Union[MonteCarlo_Single, MonteCarlo], root: Node) -> Future:
+        """
+        Search a move under the clock in the background.
+
+        The engine searches without an iteration limit until the time
+        manager stops it; the time taken is charged to the clock when the
+        search ends, also when it is cancelled or fails.
+
+        Parameters
+        ----------
+        engine: the engine to search with
+        root: the root node of the search tree
+
+        Returns
+        -------
+        future: resolves to the (move, prob) pair of the search
+        """
+        state = root.state
+        target, maximum = self.allocate(state)
+        start = perf_counter()
+        if target == 0.0:
+            future = Future()
+            future.set_result((state.legal_moves()[0], [1.0]))
+            self._charge(start)
+            return future
+
+        stop = threading.Event()
+        deadline = [target]
+        best = [None]
+        charged = threading.Lock()
+
+        def charge(*_) -> None:
+            # Once per search, whichever of the last snapshot and the end of the future comes first
+            if charged.acquire(blocking=False):
+                self._charge(start)
+
+        def progress(snapshot: SearchProgress) -> None:
+            if snapshot.done:
+                # Charged before the future resolves, so the next move sees the updated clock
+                charge()
+                return
+            elapsed = perf_counter() - start
+            if best[0] is not None and snapshot.move != best[0] and elapsed >= config.TM_SETTLE * target:
+                # The search changed its mind: give it longer to settle
+                self.flips += 1
+                deadline[0] = min(maximum, deadline[0] + config.TM_INSTABILITY * target)
+            best[0] = snapshot.move
+            easy = elapsed >= target / 2 and max(snapshot.prob) >= config.TM_EASY_SHARE
+            if easy or elapsed >= deadline[0]:
+                stop.set()
+
+        future = search_in_background(engine, root, progress, stop=stop, time_limit=maximum, iterations=0)
+        # A cancelled or failed search sends no last snapshot
+        future.add_done_callback(charge)
+        return future
+
+    def _charge(self, start: float) -> None:
+        used = perf_counter() - start
+        self.used.append(used)
+        self.remaining = max(0.0, self.remaining - used) + self.increment
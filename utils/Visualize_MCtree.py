@@ -15,7 +15,7 @@ class Drawer:
             return graph
 
         node_id = id(node)
-        label = f"M:{node.state.last_move[1] if node.state.last_move else '?'}\nV:{node.visits}\nR:{round(node.reward, 1)}"
+        label = f"M:{node.move if node.move is not None else '?'}\nV:{node.visits}\nR:{round(node.reward, 1)}"
         graph.add_node(node_id, label=label)
 
         if parent_id is not None:
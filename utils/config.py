@@ -1,3 +1,5 @@
+import os
+
 # Game configuration
 ROW = 6 
 COLUMN = 7
@@ -18,3 +20,116 @@ HARDLEVEL = 10000
 # MCTS configuration for AI vs AI
 ITERATION = HARDLEVEL
 EXPLORATION = 1.414
+# Seed of every MCTS engine, None for unseeded searches; set it for a
+# deterministic mode where the same position and budget give the same move
+MCTS_SEED = None
+# Root move allocation: "ucb" as below the root, or "halving" for sequential halving
+ROOT_POLICY = "ucb"
+
+# Learned value function scoring rollouts cut after EVAL_ROLLOUT_DEPTH moves
+VALUE_MODEL_PATH = os.path.join("models", "value_linear.npz")
+EVAL_ROLLOUT_DEPTH = 4
+
+# PUCT selection with decision-tree priors
+PUCT_C = 2.0
+PRIOR_UNIFORM = 0.25
+PRIOR_CACHE_SIZE = 100000
+
+# Positions sampled from datasets/monte_carlo_data.csv by utils/mcts_benchmarks.py
+BENCHMARK_POSITIONS = 20
+
+# Moves played by the "capped" playout policy before the rollout is scored
+PLAYOUT_DEPTH_CAP = 10
+# Probability of a random move in a decision-tree playout
+DT_PLAYOUT_EPSILON = 0.2
+
+# Pondering during the human's turn in Player vs AI
+PONDER = True
+PONDER_BATCH = 100
+PONDER_LIMIT = 10 * HARDLEVEL
+
+# Engine auto-tuning
+CALIBRATION_PATH = os.path.join(os.path.expanduser("~"), ".cache", "connect_four", "mcts_calibration.json")
+CALIBRATION_ITERATIONS = 400
+
+# Background searches report progress and check for cancellation this many times
+SEARCH_ROUNDS = 10
+# Iterations per round of a search bounded by time or by a stop request
+SEARCH_CHUNK = 200
+# Trees of searches run in rounds that each worker process keeps, the oldest dropped first
+WORKER_TREES = 2
+
+# Positions' slices packed into one pool task by MonteCarlo.search_many
+BULK_BATCH = 4
+
+# Time management: the thinking time of each side for a whole game in seconds,
+# None to search a fixed number of iterations per move
+GAME_TIME = None
+TM_MIN_MOVE_TIME = 0.05
+# A move never takes more than this share of the remaining clock
+TM_MAX_SHARE = 0.25
+# Share of the half of the empty cells expected to be played, and its floor
+TM_MOVES_LEFT_SHARE = 0.7
+TM_MIN_MOVES_LEFT = 2
+# Position weights by game phase, in pieces on the board
+TM_OPENING_PIECES = 6
+TM_ENDGAME_PIECES = 28
+TM_OPENING_WEIGHT = 0.6
+TM_MIDDLEGAME_WEIGHT = 1.3
+TM_ENDGAME_WEIGHT = 0.9
+# A best move holding this visit share at half the target time ends the search
+TM_EASY_SHARE = 0.75
+# A best move change after TM_SETTLE of the target adds TM_INSTABILITY of the
+# target, the search never exceeding TM_EXTEND times the target
+TM_SETTLE = 0.25
+TM_INSTABILITY = 0.5
+TM_EXTEND = 2.5
+
+# Tree memory cap, None for unbounded; an eviction brings the tree down to
+# EVICTION_TARGET of the cap, dropping the least "visits" or least "recent" subtrees
+MCTS_MAX_NODES = None
+MCTS_MAX_BYTES = None
+EVICTION_POLICY = "visits"
+EVICTION_TARGET = 0.9
+
+# Persistent cache of root statistics shared by searches across games and processes
+POSITION_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "connect_four", "positions.sqlite")
+POSITION_CACHE_SIZE = 1000000
+POSITION_CACHE_PRIOR = HARDLEVEL
+POSITION_CACHE_PRUNE_EVERY = 1000
+
+# Infinite analysis: tree size cap, seconds between two reports, PV length
+ANALYSIS_MAX_NODES = 500000
+ANALYSIS_INTERVAL = 1.0
+ANALYSIS_PV_LENGTH = 12
+
+# Iterations between two saves of a checkpointed search
+CHECKPOINT_EVERY = 1000
+
+# Engine server
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_SLICE = 1000
+SERVER_BATCH = 8
+
+# Self-play coordinator and workers
+SELFPLAY_PORT = 8766
+# Dataset rows a worker sends per message
+SELFPLAY_BATCH = 8
+# Seconds without a message after which a worker is presumed dead and its jobs re-queued
+SELFPLAY_TIMEOUT = 600
+# Attempts of a job before it is given up
+SELFPLAY_MAX_ATTEMPTS = 3
+# Seconds an idle worker waits before asking for work again
+SELFPLAY_POLL = 1.0
+# Lost connections in a row after which a worker gives up, and the longest wait between two attempts
+SELFPLAY_RECONNECTS = 5
+SELFPLAY_MAX_BACKOFF = 30.0
+# CSV the self-play command line appends its rows to, kept out of version control
+SELFPLAY_OUTPUT = os.path.join("datasets", "selfplay_AI_VS_AI.csv")
+
+# Shared-memory tree: node capacity of the arena, number of striped locks,
+# and the reward taken off a node per worker still searching below it
+SHARED_TREE_NODES = 1000000
+SHARED_TREE_LOCKS = 64
+VIRTUAL_LOSS = 1.0
@@ -0,0 +1,391 @@
+import argparse
+import random
+from time import perf_counter
+from typing import List, Optional
+
+import numpy as np
+
+import utils.config as config
+
+from Game.ConnectFour import ConnectFour
+from MCTS.MCTS import MonteCarlo_Single
+from MCTS.MCTS_optimized import MonteCarlo
+from MCTS.node import Node
+from MCTS.playouts import get_playout, playout_depth, uniform_playout
+
+
+def benchmark_positions(count: int = config.BENCHMARK_POSITIONS, seed: int = 0,
+                        path: str = "datasets/monte_carlo_data.csv") -> List[ConnectFour]:
+    """
+    Sample a fixed set of unfinished positions from the MCTS dataset.
+
+    Parameters
+    ----------
+    count: the number of positions
+    seed: the sampling seed, the same seed gives the same positions
+    path: the position dataset
+
+    Returns
+    -------
+    list: the positions
+    """
+    data = np.loadtxt(path, delimiter=";", skiprows=1)
+    rng = random.Random(seed)
+    positions = []
+    for i in rng.sample(range(len(data)), len(data)):
+        state = ConnectFour.from_board(data[i, :42], int(data[i, 43]))
+        if not state.is_over():
+            positions.append(state)
+            if len(positions) == count:
+                break
+    return positions
+
+
+def iterations_to_move(engine: MonteCarlo_Single, state: ConnectFour, target: int, step: int = 50,
+                       max_iterations: int = 2000) -> Optional[int]:
+    """
+    Count the iterations an engine needs to settle on a move.
+
+    The search runs in steps; the result is the budget from which the most
+    visited move is the target at every later step.
+
+    Parameters
+    ----------
+    engine: the engine to search with
+    state: the position
+    target: the move to reach
+    step: the iterations between two checks
+    max_iterations: the largest budget tried
+
+    Returns
+    -------
+    int: the iterations needed, None if the engine did not settle on target
+    """
+    root = Node(state.copy())
+    settled = None
+    done = 0
+    while done < max_iterations:
+        engine.iterate(root, step)
+        done += step
+        move, _ = MonteCarlo.best_move(root)
+        if move != target:
+            settled = None
+        elif settled is None:
+            settled = done
+    return settled
+
+
+def rollouts_per_second(playout, positions: List[ConnectFour], rollouts: int = 20, seed: int = 0) -> float:
+    """
+    Measure how many playouts a policy plays per second, up to its depth cap.
+
+    Parameters
+    ----------
+    playout: the playout policy, called as playout(state, rng)
+    positions: the start positions
+    rollouts: the playouts from each position
+    seed: the random seed
+
+    Returns
+    -------
+    float: playouts per second
+    """
+    rng = random.Random(seed)
+    max_depth = playout_depth(playout)
+    start = perf_counter()
+    for state in positions:
+        for _ in range(rollouts):
+            game = state.copy()
+            depth = 0
+            while not game.is_over() and (max_depth is None or depth < max_depth):
+                game.play(playout(game, rng))
+                depth += 1
+    return len(positions) * rollouts / (perf_counter() - start)
+
+
+def play_match(engine_a, engine_b, games: int = 10, seed: int = 0) -> tuple:
+    """
+    Play games between two engines from the empty board, alternating who starts.
+
+    Parameters
+    ----------
+    engine_a: the first engine
+    engine_b: the second engine
+    games: the number of games
+    seed: the random seed
+
+    Returns
+    -------
+    tuple: the wins, losses and draws of engine_a
+    """
+    random.seed(seed)
+    wins = losses = draws = 0
+    for game_index in range(games):
+        players = (engine_a, engine_b) if game_index % 2 == 0 else (engine_b, engine_a)
+        game = ConnectFour()
+        ply = 0
+        while not game.is_over():
+            move, _ = players[ply % 2].search(Node(game.copy()))
+            game.play(move)
+            ply += 1
+        if game.win == 0:
+            draws += 1
+        elif players[(ply - 1) % 2] is engine_a:
+            wins += 1
+        else:
+            losses += 1
+    return wins, losses, draws
+
+
+def ab_test(make_a, make_b, count: int = config.BENCHMARK_POSITIONS, iterations: int = 1000,
+            seed: int = 0) -> dict:
+    """
+    Time two engine builds on the same seeded searches.
+
+    Each position is searched by a fresh engine of each build, both made
+    with the same seed, so an optimization that keeps the search unchanged
+    must give identical moves and statistics, and any time difference is
+    not sampling noise.
+
+    Parameters
+    ----------
+    make_a: called as make_a(iterations, seed) to build the first engine
+    make_b: called as make_b(iterations, seed) to build the second engine
+    count: the number of benchmark positions
+    iterations: the budget of every search
+    seed: the position and search seed
+
+    Returns
+    -------
+    dict: {"a": seconds, "b": seconds, "same_move": fraction, "same_stats": fraction}
+    """
+    positions = benchmark_positions(count, seed)
+    times = {"a": 0.0, "b": 0.0}
+    same_move = same_stats = 0
+    for index, state in enumerate(positions):
+        outcomes = {}
+        for name, make in (("a", make_a), ("b", make_b)):
+            engine = make(iterations, seed + index)
+            root = Node(state.copy())
+            start = perf_counter()
+            move, _ = engine.search(root)
+            times[name] += perf_counter() - start
+            outcomes[name] = (move, sorted((c.move, c.visits, c.reward) for c in root.children))
+        same_move += outcomes["a"][0] == outcomes["b"][0]
+        same_stats += outcomes["a"] == outcomes["b"]
+    result = {"a": times["a"], "b": times["b"], "same_move": same_move / len(positions),
+              "same_stats": same_stats / len(positions)}
+    print(f"a {result['a']:.2f}s  b {result['b']:.2f}s  speedup {result['a'] / result['b']:.2f}x  "
+          f"same move {result['same_move']:.0%}  same statistics {result['same_stats']:.0%}")
+    return result
+
+
+def compare_root_policies(budgets=(config.EASYLEVEL, config.MEDIUMLEVEL), count: int = config.BENCHMARK_POSITIONS,
+                          reference: int = 4 * config.HARDLEVEL, seed: int = 0) -> dict:
+    """
+    Compare the simple regret of UCB and sequential halving at the root.
+
+    The value of every move is its mean reward in a long UCB reference
+    search; the simple regret of a search is the value of the best move
+    minus the value of the move it picked.
+
+    Parameters
+    ----------
+    budgets: the iteration budgets compared
+    count: the number of benchmark positions
+    reference: the iterations of the reference search
+    seed: the position and search seed
+
+    Returns
+    -------
+    dict: {(policy, budget): (mean simple regret, fraction of best moves found)}
+    """
+    positions = benchmark_positions(count, seed)
+    values = []
+    for index, state in enumerate(positions):
+        root = Node(state.copy())
+        # A seed apart from the compared searches, which would otherwise replay its first rollouts
+        MonteCarlo_Single(iteration=reference, seed=seed + 1000000 + index).search(root)
+        values.append({child.move: child.reward / child.visits for child in root.children})
+
+    results = {}
+    for budget in budgets:
+        for policy in ("ucb", "halving"):
+            regrets = []
+            for index, state in enumerate(positions):
+                engine = MonteCarlo_Single(iteration=budget, seed=seed + index, root_policy=policy)
+                move, _ = engine.search(Node(state.copy()))
+                regrets.append(max(values[index].values()) - values[index][move])
+            found = sum(regret == 0 for regret in regrets) / len(regrets)
+            results[policy, budget] = (sum(regrets) / len(regrets), found)
+            print(f"{policy:8s} {budget:6d} iterations: simple regret {results[policy, budget][0]:.4f}  "
+                  f"best move {found:.0%}")
+    return results
+
+
+def compare_time_manager(iterations: int = config.EASYLEVEL, share: float = 0.7, games: int = 10,
+                         seed: int = 0) -> dict:
+    """
+    Play a fixed iteration budget per move against a TimeManager whose game
+    clock is a share of the time the fixed budget takes for a whole game.
+
+    Parameters
+    ----------
+    iterations: the fixed budget per move
+    share: the clock of the managed side, as a share of the fixed side's game time
+    games: the number of games, the managed side moving first in every other one
+    seed: the random seed
+
+    Returns
+    -------
+    dict: {"fixed_time": seconds per game, "managed_time": seconds per game,
+        "result": (wins, losses, draws) of the managed side}
+    """
+    from MCTS.time_manager import TimeManager
+
+    random.seed(seed)
+    # One fixed game against itself measures the time of a side
+    game = ConnectFour()
+    start = perf_counter()
+    while not game.is_over():
+        move, _ = MonteCarlo_Single(iteration=iterations).search(Node(game.copy()))
+        game.play(move)
+    clock = TimeManager(share * (perf_counter() - start) / 2)
+
+    wins = losses = draws = 0
+    fixed_time = managed_time = 0.0
+    for game_index in range(games):
+        managed_side = 1 if game_index % 2 == 0 else -1
+        clock.new_game()
+        game = ConnectFour()
+        while not game.is_over():
+            root = Node(game.copy())
+            start = perf_counter()
+            if game.turn == managed_side:
+                move, _ = clock.think(MonteCarlo_Single(), root).result()
+                managed_time += perf_counter() - start
+            else:
+                move, _ = MonteCarlo_Single(iteration=iterations).search(root)
+                fixed_time += perf_counter() - start
+            game.play(move)
+        if game.win == 0:
+            draws += 1
+        elif game.win == managed_side:
+            wins += 1
+        else:
+            losses += 1
+    result = {"fixed_time": fixed_time / games, "managed_time": managed_time / games,
+              "result": (wins, losses, draws)}
+    print(f"fixed {iterations} it/move: {result['fixed_time']:.1f}s/game  managed clock "
+          f"{clock.game_time:.1f}s: {result['managed_time']:.1f}s/game  managed {wins}W {losses}L {draws}D")
+    return result
+
+
+def compare_playouts(playouts: dict, count: int = config.BENCHMARK_POSITIONS, iterations: int = 300,
+                     games: int = 10, seed: int = 0) -> dict:
+    """
+    Report the speed of each playout policy and how MCTS with it fares
+    against MCTS with uniform playouts at the same iteration budget.
+
+    Parameters
+    ----------
+    playouts: {name: playout policy}
+    count: the number of benchmark positions timed
+    iterations: the iterations per move in the matches
+    games: the games per match, 0 to skip the matches
+    seed: the position and game seed
+
+    Returns
+    -------
+    dict: {name: (playouts per second, (wins, losses, draws) or None)}
+    """
+    positions = benchmark_positions(count, seed)
+    baseline = MonteCarlo_Single(iteration=iterations)
+    results = {}
+    for name, playout in playouts.items():
+        rate = rollouts_per_second(playout, positions, seed=seed)
+        match = None
+        if games and playout is not uniform_playout:
+            match = play_match(MonteCarlo_Single(iteration=iterations, playout=playout), baseline, games, seed)
+        results[name] = (rate, match)
+        text = f"{name:16s} {rate:8.0f} playouts/s"
+        if match is not None:
+            text += f"  vs uniform at {iterations} it/move: {match[0]}W {match[1]}L {match[2]}D"
+        if hasattr(playout, "misses"):
+            text += f"  memo hit rate {playout.hits / max(1, playout.hits + playout.misses):.2f}"
+        print(text)
+    return results
+
+
+def compare_priors(dt_types=("ruleset",), count: int = config.BENCHMARK_POSITIONS, reference: int = 4000,
+                   step: int = 50, max_iterations: int = 2000, seed: int = 0) -> dict:
+    """
+    Compare the iterations plain UCT and PUCT with decision-tree priors need
+    to reach the move of a long reference search.
+
+    Parameters
+    ----------
+    dt_types: the decision-tree models to take priors from
+    count: the number of benchmark positions
+    reference: the iterations of the plain reference search
+    step: the iterations between two checks
+    max_iterations: the largest budget tried, counted for positions that never settle
+    seed: the position and search seed
+
+    Returns
+    -------
+    dict: {engine name: (mean iterations, positions settled, milliseconds per iteration)}
+    """
+    from MCTS.priors import DTPrior
+
+    random.seed(seed)
+    positions = benchmark_positions(count, seed)
+    targets = [MonteCarlo_Single(iteration=reference).search(Node(state.copy()))[0] for state in positions]
+
+    engines = {"uct": MonteCarlo_Single()}
+    for dt_type in dt_types:
+        engines[f"puct-{dt_type}"] = MonteCarlo_Single(prior=DTPrior(dt_type))
+
+    results = {}
+    for name, engine in engines.items():
+        random.seed(seed)
+        needed = []
+        start = perf_counter()
+        for state, target in zip(positions, targets):
+            needed.append(iterations_to_move(engine, state, target, step, max_iterations))
+        elapsed = perf_counter() - start
+        settled = [n for n in needed if n is not None]
+        mean = sum(n if n is not None else max_iterations for n in needed) / len(needed)
+        results[name] = (mean, len(settled), 1000 * elapsed / (len(positions) * max_iterations))
+        print(f"{name:16s} iterations to reference move: {mean:7.1f}  settled {len(settled)}/{len(positions)}  "
+              f"{results[name][2]:.3f} ms/iteration")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCTS benchmarks on positions from the MCTS dataset")
+    parser.add_argument("--positions", type=int, default=config.BENCHMARK_POSITIONS)
+    parser.add_argument("--reference", type=int, default=4000)
+    parser.add_argument("--max-iterations", type=int, default=2000)
+    parser.add_argument("--models", nargs="+", default=["ruleset"])
+    parser.add_argument("--games", type=int, default=10, help="games per playout match")
+    parser.add_argument("--policies", nargs="+", default=["uniform", "center", "tactical", "capped", "column3"],
+                        help="playout policies, names from MCTS.playouts.PLAYOUTS or dt-<model>")
+    parser.add_argument("--iterations", type=int, default=1000, help="iterations per search of the repro benchmark")
+    parser.add_argument("--share", type=float, default=0.7, help="clock share of the time manager benchmark")
+    parser.add_argument("benchmark", nargs="?", choices=["priors", "playouts", "repro", "halving", "clock"],
+                        default="priors")
+    args = parser.parse_args()
+    if args.benchmark == "priors":
+        compare_priors(args.models, args.positions, args.reference, max_iterations=args.max_iterations)
+    elif args.benchmark == "clock":
+        compare_time_manager(args.iterations, args.share, args.games)
+    elif args.benchmark == "halving":
+        compare_root_policies(count=args.positions, reference=args.reference)
+    elif args.benchmark == "repro":
+        # The same seeded engine against itself: the statistics must match exactly
+        def make(iterations, seed):
+            return MonteCarlo_Single(iteration=iterations, seed=seed)
+        ab_test(make, make, args.positions, args.iterations)
+    else:
+        compare_playouts({name: get_playout(name) for name in args.policies}, args.positions, games=args.games)
@@ -0,0 +1,108 @@
+import os
+import random
+
+import numpy as np
+
+DT_MODELS = {
+    "id3": "id3_analize.pkl",
+    "ruleset": "ruleset_analize.pkl",
+    "bagging": "bagging_analize.pkl",
+}
+
+
+def model_row(board) -> list:
+    """
+    Encode a board as the input row of the decision-tree models.
+
+    The row holds the 42 cells of player 1, the 42 cells of player 2, the
+    number of pieces and a placeholder for the class, as in the datasets.
+
+    Parameters
+    ----------
+    board: the 6x7 board with 1, -1 and 0
+
+    Returns
+    -------
+    list: the model input row
+    """
+    row = np.asarray(board).flatten()
+    player_1 = (row == 1).astype(int)
+    player_2 = (row == -1).astype(int)
+    return np.concatenate([player_1, player_2, [np.count_nonzero(row), 0]]).tolist()
+
+
+def load_dt_model(dt_type: str, models_dir: str = "models"):
+    """
+    Load one of the pretrained decision-tree models.
+
+    Parameters
+    ----------
+    dt_type: "id3", "ruleset" or "bagging"
+    models_dir: the folder holding the pickled models
+
+    Returns
+    -------
+    model: the model
+    rules: the rules of an ID3 tree, None for the other models
+    """
+    from DecisionTree.ID3Tree import ID3Tree
+    from DecisionTree.Ruleset import Ruleset
+    from DecisionTree.Bootstrap_Aggregating import Bagging
+
+    dt_type = dt_type.lower()
+    if dt_type not in DT_MODELS:
+        raise ValueError(f"Unknown decision-tree model: {dt_type}")
+    path = os.path.join(models_dir, DT_MODELS[dt_type])
+    if dt_type == "id3":
+        model = ID3Tree.load_model(path)
+        return model, model.build_rules()
+    if dt_type == "ruleset":
+        return Ruleset.load_model(path), None
+    return Bagging.load_model(path), None
+
+
+def predict_column(model, rules, row: list) -> int:
+    """
+    Predict a column with a decision-tree model, -1 if no rule fires.
+
+    Parameters
+    ----------
+    model: the model
+    rules: the rules of an ID3 tree, or None to call model.predict
+    row: the model input row
+
+    Returns
+    -------
+    int: the predicted column
+    """
+    if rules is not None:
+        for rule in rules:
+            prediction = rule.predict(row)
+            if prediction is not None:
+                return prediction
+        return -1  # ERROR_CLASS
+    prediction, _ = model.predict(row)
+    return prediction
+
+
+def predict_move(model, rules, game) -> int:
+    """
+    Predict a legal move, falling back to a random legal column like the GUI does.
+
+    The board is seen from the side to move, as in the models' training data.
+
+    Parameters
+    ----------
+    model: the model
+    rules: the rules of an ID3 tree, or None to call model.predict
+    game: the ConnectFour position
+
+    Returns
+    -------
+    int: the column to play
+    """
+    prediction = predict_column(model, rules, model_row(game.board * game.turn))
+    legal_moves = game.legal_moves()
+    if prediction not in legal_moves:
+        prediction = random.choice(legal_moves)
+    return prediction